@@ -0,0 +1,191 @@
+# benchmarks/commands.py
+# Admin and leaderboard commands on one large guild, through the real handlers
+# and the fakes: the bulk commands (/exportpoints, /importpoints with an
+# attachment, /decay, /seasonreset) with the longest event-loop stall while
+# they run, /leaderboard and its page buttons with and without cached pages,
+# and lean-mode name lookups against member queries that take a while.
+# Run from the repo root: python -m benchmarks.commands --members 100000 --backend sqlite
+#
+# The bot is imported inside a temporary data directory, as in loadtest.py.
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import FakeAttachment, FakeChannel, FakeGuild, FakeInteraction, FakeUser
+
+GUILD_ID = 10**17
+CHANNEL_ID = 2 * 10**17
+FIRST_USER = 3 * 10**17
+
+class SlowGuild(FakeGuild):
+    """Member queries answer after `delay` seconds, like a busy gateway"""
+
+    def __init__(self, guild_id, delay: float):
+        super().__init__(guild_id)
+        self.delay = delay
+
+    def get_member(self, user_id):
+        return None     # lean member mode: nothing is cached
+
+    async def query_members(self, user_ids=None, limit=5, cache=True, **kwargs):
+        await asyncio.sleep(self.delay)
+        return await super().query_members(user_ids=user_ids, limit=limit, cache=cache)
+
+class StallMeter:
+    """Longest gap between ticks of a task that wakes up every `interval`"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.longest = 0.0
+        self._task = None
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self._gap()
+
+    def _gap(self):
+        now = time.perf_counter()
+        self.longest = max(self.longest, now - self.last - self.interval)
+        self.last = now
+
+    def __enter__(self):
+        self.longest = 0.0
+        self.last = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        # the last stretch too: the handler may have blocked right up to its end
+        self._gap()
+        self._task.cancel()
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+def setup_guild(bot_module, guild, members: int):
+    channel = guild.add_channel(FakeChannel(CHANNEL_ID))
+    cfg = bot_module.get_guild_config(guild.id)
+    cfg["CHANNEL_ID"] = channel.id
+    cfg["CHANNEL_IDS"] = [channel.id]
+    bot_module.save_guild_config(guild.id, cfg)
+    users = [guild.add_member(FakeUser(FIRST_USER + u)) for u in range(members)]
+    bot_module.storage.apply_bulk(guild.id, [(u.id, (u.id * 7919) % 10000) for u in users], "benchmark")
+    return channel, users
+
+async def bench_bulk(bot_module, guild, channel, admin):
+    rows = []
+
+    async def run(name, handler, *args):
+        interaction = FakeInteraction(guild, channel, admin)
+        with StallMeter() as meter:
+            seconds = await timed(handler.callback(interaction, *args))
+        rows.append((name, seconds, meter.longest))
+        return interaction
+
+    await run("exportpoints", bot_module.exportpoints_cmd)
+    data = bot_module.render_csv([(uid, pts + 1) for uid, pts in bot_module.storage.guild_points(guild.id)])
+    await run("importpoints", bot_module.importpoints_cmd, FakeAttachment(data))
+    await run("decay 10%", bot_module.decay_cmd, 10)
+    await run("seasonreset", bot_module.seasonreset_cmd, "RESET")
+    await bot_module.storage.flush()
+    return rows
+
+async def bench_leaderboard(bot_module, guild, channel, user, pages: int):
+    rows = []
+    interaction = FakeInteraction(guild, channel, user)
+    rows.append(("first page, uncached", await timed(bot_module.leaderboard_cmd.callback(interaction, 25, None))))
+    view = interaction.response.view or interaction.followup.view
+    again = FakeInteraction(guild, channel, user)
+    rows.append(("first page, cached", await timed(bot_module.leaderboard_cmd.callback(again, 25, None))))
+    bot_module.change_user_points(guild.id, user.id, 1, "benchmark")
+    again = FakeInteraction(guild, channel, user)
+    rows.append(("after a points change", await timed(bot_module.leaderboard_cmd.callback(again, 25, None))))
+    turns = []
+    for _ in range(pages):
+        click = FakeInteraction(guild, channel, user)
+        turns.append(await timed(view.turn(click, 1)))
+    rows.append((f"page turn (mean of {pages})", sum(turns) / len(turns)))
+    return rows
+
+async def bench_names(bot_module, guild, channel, user, pages: int):
+    """Time to the first response versus the full reply, lean mode with slow member queries"""
+    bot_module.LEAN_MEMBERS = True
+    bot_module.member_names.names.clear()
+    bot_module.leaderboards.forget(guild.id)
+    answered = []
+    interaction = FakeInteraction(guild, channel, user)
+    defer = interaction.response.defer
+
+    async def record_defer(**kwargs):
+        answered.append(time.perf_counter())
+        await defer(**kwargs)
+
+    interaction.response.defer = record_defer
+    start = time.perf_counter()
+    await bot_module.leaderboard_cmd.callback(interaction, 25, None)
+    total = time.perf_counter() - start
+    first = (answered[0] - start) if answered else total
+    view = interaction.followup.view
+    turns = []
+    for _ in range(pages):
+        turns.append(await timed(view.turn(FakeInteraction(guild, channel, user), 1)))
+    ids = [uid for uid, _ in bot_module.leaderboards.get(guild.id).top(25)]
+    warm = await timed(bot_module.member_names.resolve(guild, ids))
+    return [("leaderboard, first response", first), ("leaderboard, full reply", total),
+            (f"page turn, cold names (mean of {pages})", sum(turns) / len(turns)),
+            ("resolve 25 cached names", warm)], bot_module.member_names.stats()
+
+async def main_async(args):
+    import bot as bot_module     # imported here, after chdir into the scratch directory
+    print(f"one guild of {args.members} members ({os.environ['STORAGE_BACKEND']} storage)")
+    guild = SlowGuild(GUILD_ID, args.query_ms / 1000)
+    channel, users = setup_guild(bot_module, guild, args.members)
+    await bot_module.storage.flush()
+    admin = FakeUser(1, administrator=True)
+
+    print(f"\n{'bulk command':<28} {'seconds':>9} {'longest stall ms':>17}")
+    for name, seconds, stall in await bench_bulk(bot_module, guild, channel, admin):
+        print(f"{name:<28} {seconds:>9.3f} {stall * 1000:>17.1f}")
+
+    # balances again after the season reset, so the board has every member
+    bot_module.storage.apply_bulk(guild.id, [(u.id, (u.id * 7919) % 10000) for u in users], "benchmark")
+    bot_module.leaderboards.forget(guild.id)
+    print(f"\n{'leaderboard, member cache':<40} {'us':>10}")
+    guild.get_member = guild.members.get
+    for name, seconds in await bench_leaderboard(bot_module, guild, channel, users[0], args.pages):
+        print(f"{name:<40} {seconds * 1e6:>10.0f}")
+    del guild.get_member
+
+    rows, stats = await bench_names(bot_module, guild, channel, users[0], args.pages)
+    print(f"\n{f'lean mode, member queries {args.query_ms:.0f}ms':<40} {'ms':>10}")
+    for name, seconds in rows:
+        print(f"{name:<40} {seconds * 1000:>10.1f}")
+    print(f"name cache: {stats}")
+    await bot_module.storage.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk, leaderboard and lean-mode name benchmarks for one large guild")
+    parser.add_argument("--members", type=int, default=100000)
+    parser.add_argument("--backend", choices=("json", "partitioned", "sqlite"), default="json")
+    parser.add_argument("--pages", type=int, default=20, help="leaderboard pages turned")
+    parser.add_argument("--query-ms", type=float, default=500, help="latency of one member query in lean mode")
+    args = parser.parse_args()
+
+    os.environ["STORAGE_BACKEND"] = args.backend
+    repo = os.getcwd()
+    sys.path.insert(0, repo)
+    with tempfile.TemporaryDirectory(prefix="bot-commands-") as scratch:
+        os.chdir(scratch)
+        try:
+            asyncio.run(main_async(args))
+        finally:
+            os.chdir(repo)
+
+if __name__ == "__main__":
+    main()
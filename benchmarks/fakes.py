@@ -0,0 +1,132 @@
+# benchmarks/fakes.py
+# Minimal stand-ins for the discord.py objects the handlers touch, so the
+# real handlers can run without a gateway connection.
+
+class FakePermissions:
+    def __init__(self, administrator=False):
+        self.administrator = administrator
+
+class FakeUser:
+    """Doubles as discord.Member: the handlers only read these attributes"""
+
+    def __init__(self, user_id, name=None, bot=False, administrator=False):
+        self.id = user_id
+        self.bot = bot
+        self.name = name or f"user{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.guild_permissions = FakePermissions(administrator)
+        self.dms = []
+
+    async def send(self, content=None, **kwargs):
+        self.dms.append(content)
+
+class FakeChannel:
+    def __init__(self, channel_id, guild=None):
+        self.id = channel_id
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.sent = 0
+        self.sent_chars = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+        self.sent_chars += len(content or "")
+
+class FakeGuild:
+    def __init__(self, guild_id, name=None):
+        self.id = guild_id
+        self.name = name or f"guild{guild_id}"
+        self.members = {}
+        self.channels = {}
+        self.queries = 0
+
+    def add_member(self, member):
+        self.members[member.id] = member
+        return member
+
+    def add_channel(self, channel):
+        channel.guild = self
+        self.channels[channel.id] = channel
+        return channel
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def query_members(self, user_ids=None, limit=5, cache=True, **kwargs):
+        # what a gateway member query returns, for lean member mode
+        self.queries += 1
+        return [self.members[uid] for uid in user_ids[:limit] if uid in self.members]
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+class FakeMessage:
+    def __init__(self, state, guild, channel, author, content):
+        self._state = state     # read by commands.Context when process_commands runs
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.id = 0
+        self.attachments = []
+
+class FakeResponse:
+    def __init__(self):
+        self.messages = []
+        self.view = None
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def send_message(self, content=None, *, embed=None, ephemeral=False, view=None, **kwargs):
+        self._done = True
+        self.messages.append((content, embed, ephemeral))
+        self.view = view
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def edit_message(self, *, content=None, embed=None, view=None, **kwargs):
+        self._done = True
+        self.messages.append((content, embed, False))
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+        self.view = None
+
+    async def send(self, content=None, *, embed=None, ephemeral=False, view=None, **kwargs):
+        self.messages.append((content, embed, ephemeral))
+        self.view = view
+
+class FakeInteraction:
+    def __init__(self, guild, channel, user):
+        self.guild = guild
+        self.channel = channel
+        self.channel_id = channel.id if channel is not None else None
+        self.guild_id = guild.id if guild is not None else None
+        self.user = user
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.edits = []
+
+    async def edit_original_response(self, content=None, *, embed=None, **kwargs):
+        self.edits.append((content, embed))
+
+class FakeAttachment:
+    def __init__(self, data: bytes, filename="file.csv"):
+        self.data = data
+        self.filename = filename
+        self.size = len(data)
+
+    async def read(self):
+        return self.data
+
+class FakeChoice:
+    """app_commands.Choice without the validation"""
+
+    def __init__(self, value):
+        self.name = value
+        self.value = value
@@ -0,0 +1,225 @@
+# benchmarks/loadtest.py
+# Drive the real bot handlers with a synthetic workload, no Discord needed.
+# Run from the repo root: python -m benchmarks.loadtest --guilds 5 --users 20000
+#
+# The bot is imported inside a temporary data directory, so the run never
+# touches the real config/points/daily files.
+#
+# bot.py is imported from the current directory, so the harness can also
+# drive the bot from before the storage layer (commit b4c9144), which is
+# what benchmarks/baseline.json was recorded on:
+#   git worktree add /tmp/pre b4c9144 && cd /tmp/pre
+#   PYTHONPATH=<repo> python -m benchmarks.loadtest --save <repo>/benchmarks/baseline.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import FakeChannel, FakeChoice, FakeGuild, FakeInteraction, FakeMessage, FakeUser
+
+HANDLERS = ("message", "points", "daily", "gamble", "leaderboard")
+
+def io_bytes_written() -> int:
+    """Bytes this process passed to write() so far (Linux), or -1 if unknown"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return -1
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def is_legacy(bot_module) -> bool:
+    """True for the bot from before the storage layer: module-level dicts
+    saved to disk on every change, and no writer or notifier to drain"""
+    return not hasattr(bot_module, "storage")
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in HANDLERS:
+            raise SystemExit(f"unknown handler in --mix: {name} (choose from {', '.join(HANDLERS)})")
+        mix[name] = float(weight)
+    return mix
+
+class World:
+    """Fake guilds/channels/members registered with the bot's storage"""
+
+    def __init__(self, bot_module, args, rng):
+        self.bot = bot_module
+        self.rng = rng
+        self.guilds = []
+        self.words = [f"w{i}" for i in range(2000)]
+        for g in range(args.guilds):
+            guild = FakeGuild(10**17 + g)
+            channel = guild.add_channel(FakeChannel(2 * 10**17 + g))
+            users = [guild.add_member(FakeUser(3 * 10**17 + g * args.users + u)) for u in range(args.users)]
+            triggers = [{"message": f"trig{t}x", "points": rng.randint(-3, 10)} for t in range(args.triggers)]
+            cfg = bot_module.get_guild_config(guild.id)
+            cfg["CHANNEL_ID"] = channel.id
+            cfg["CHANNEL_IDS"] = [channel.id]
+            cfg["TRIGGERS"] = triggers
+            if is_legacy(bot_module):
+                bot_module.save_guild_config(guild.id)
+                # every set_user_points rewrites points.json: fill it in one write instead
+                bot_module.points_data[str(guild.id)] = {str(user.id): rng.randint(0, 500) for user in users}
+                bot_module.save_json(bot_module.POINTS_FILE, bot_module.points_data)
+            else:
+                bot_module.save_guild_config(guild.id, cfg)
+                for user in users:
+                    bot_module.set_user_points(guild.id, user.id, rng.randint(0, 500), "loadtest")
+            self.guilds.append((guild, channel, users, triggers))
+
+    def message(self, hit_rate):
+        guild, channel, users, triggers = self.rng.choice(self.guilds)
+        words = self.rng.choices(self.words, k=self.rng.randint(3, 20))
+        if triggers and self.rng.random() < hit_rate:
+            words.insert(self.rng.randrange(len(words) + 1), self.rng.choice(triggers)["message"])
+        author = self.rng.choice(users)
+        return FakeMessage(self.bot.bot._connection, guild, channel, author, " ".join(words))
+
+    def interaction(self):
+        guild, channel, users, _ = self.rng.choice(self.guilds)
+        return FakeInteraction(guild, channel, self.rng.choice(users))
+
+async def run_workload(bot_module, world, args, mix):
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    latencies = {name: [] for name in names}
+    rng = world.rng
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    start = time.perf_counter()
+    next_at = start
+    for name in rng.choices(names, weights, k=args.events):
+        if interval:
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if name == "message":
+            msg = world.message(args.hit_rate)
+            t0 = time.perf_counter()
+            await bot_module.on_message(msg)
+        else:
+            inter = world.interaction()
+            t0 = time.perf_counter()
+            if name == "points":
+                await bot_module.points_cmd.callback(inter)
+            elif name == "daily":
+                await bot_module.daily_cmd.callback(inter)
+            elif name == "gamble":
+                await bot_module.gamble_cmd.callback(inter, FakeChoice(rng.choice(("red", "black"))), rng.randint(1, 50))
+            else:
+                await bot_module.leaderboard_cmd.callback(inter, None)
+        latencies[name].append(time.perf_counter() - t0)
+        if not interval:
+            # let background tasks (write-behind, notifications) run, as the gateway would
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+def summarize(latencies, elapsed, written, events):
+    report = {"events": events, "seconds": round(elapsed, 3), "throughput": round(events / elapsed, 1),
+              "bytes_written": written, "handlers": {}}
+    for name, values in latencies.items():
+        report["handlers"][name] = {
+            "count": len(values),
+            "p50_ms": round(statistics.median(values) * 1000, 4) if values else 0.0,
+            "p99_ms": round(percentile(values, 99) * 1000, 4),
+        }
+    return report
+
+def print_report(report, baseline=None):
+    def cmp(key, value, base, higher_is_better=False):
+        if base is None or not base.get(key) or not value:
+            return ""
+        # how many times better (or worse) than the baseline, whichever way is better
+        gain = value / base[key] if higher_is_better else base[key] / value
+        if gain == 1:
+            return " (same)"
+        return f" ({gain:.2f}x better)" if gain > 1 else f" ({1 / gain:.2f}x worse)"
+    print(f"events: {report['events']} in {report['seconds']}s -> {report['throughput']} events/s"
+          + cmp("throughput", report["throughput"], baseline, higher_is_better=True))
+    print(f"bytes written: {report['bytes_written']}" + cmp("bytes_written", report["bytes_written"], baseline))
+    print(f"{'handler':<12} {'count':>7} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, h in report["handlers"].items():
+        base = baseline["handlers"].get(name) if baseline else None
+        print(f"{name:<12} {h['count']:>7} {h['p50_ms']:>10.4f} {h['p99_ms']:>10.4f}"
+              + cmp("p50_ms", h["p50_ms"], base) + cmp("p99_ms", h["p99_ms"], base))
+
+async def main_async(args):
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    import bot as bot_module     # imported here, after chdir into the scratch directory
+    print(f"setting up {args.guilds} guilds x {args.users} users, {args.triggers} triggers ({os.environ.get('STORAGE_BACKEND', 'json')} storage)...")
+    # process_commands compares message authors with the logged-in user
+    bot_module.bot._connection.user = FakeUser(1, name="bot", bot=True)
+    world = World(bot_module, args, rng)
+    if is_legacy(bot_module):
+        before = io_bytes_written()
+        latencies, elapsed = await run_workload(bot_module, world, args, mix)
+        return summarize(latencies, elapsed, io_bytes_written() - before, args.events)
+    await bot_module.storage.flush()
+    if hasattr(bot_module.storage, "economy"):
+        await bot_module.storage.economy.compact()
+    bot_module.writer.start()
+    before = io_bytes_written()
+    latencies, elapsed = await run_workload(bot_module, world, args, mix)
+    await bot_module.notifier.close()
+    await bot_module.writer.close()
+    after = io_bytes_written()
+    if before < 0:
+        written = sum(getattr(s, "bytes_written", 0) for s in bot_module.storage.stores)
+    else:
+        written = after - before
+    await bot_module.storage.close()
+    return summarize(latencies, elapsed, written, args.events)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the bot handlers")
+    parser.add_argument("--guilds", type=int, default=3)
+    parser.add_argument("--users", type=int, default=5000, help="users per guild")
+    parser.add_argument("--triggers", type=int, default=50, help="triggers per guild")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="events per second (0 = as fast as possible)")
+    parser.add_argument("--hit-rate", type=float, default=0.3, help="share of messages containing a trigger")
+    parser.add_argument("--mix", default="message=80,points=5,daily=5,gamble=5,leaderboard=5")
+    parser.add_argument("--backend", choices=("json", "partitioned", "sqlite"), default="json")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", help="compare against a report saved with --save")
+    parser.add_argument("--save", help="write the report as JSON (e.g. to record a baseline)")
+    args = parser.parse_args()
+
+    os.environ["STORAGE_BACKEND"] = args.backend
+    repo = os.getcwd()
+    sys.path.insert(0, repo)
+    with tempfile.TemporaryDirectory(prefix="bot-loadtest-") as scratch:
+        os.chdir(scratch)
+        try:
+            report = asyncio.run(main_async(args))
+        finally:
+            os.chdir(repo)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
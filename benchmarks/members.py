@@ -0,0 +1,94 @@
+# benchmarks/members.py
+# Memory of discord.py's member cache versus lean member mode (LEAN_MEMBERS=1)
+# for a large guild: the default mode chunks every member at startup, lean
+# mode only keeps the display names the leaderboard has asked for.
+# Run from the repo root: python -m benchmarks.members --members 200000
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# run in a fresh interpreter per mode so RSS only covers that mode; the
+# gateway payloads go through discord.py's own parsers
+PROBE = """
+import asyncio, json, sys, time
+import discord
+from discord.state import ChunkRequest
+import bot
+
+def rss_kb(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field + ":"))
+
+def member(uid):
+    return {"user": {"id": str(uid), "username": f"user{uid}", "discriminator": "0", "global_name": f"User {uid}",
+                     "avatar": "a" * 32}, "nick": None, "roles": [str(10**17 + uid % 5)],
+            "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+
+async def main(members, names):
+    state = bot.bot._connection
+    gid = 10**17
+    roles = [{"id": str(gid + i), "name": f"role{i}", "permissions": "0", "position": i, "color": 0, "hoist": False,
+              "managed": False, "mentionable": False} for i in range(5)]
+    state.parse_guild_create({"id": str(gid), "name": "big", "member_count": members, "large": True, "roles": roles,
+                              "channels": [], "members": []})
+    guild = bot.bot.get_guild(gid)
+    before = rss_kb("VmRSS")
+    chunked = 0.0
+    if state._guild_needs_chunking(guild):
+        # what the startup chunk request receives, 1000 members per chunk
+        request = state._chunk_requests[gid] = ChunkRequest(gid, None, asyncio.get_running_loop(), state._get_guild,
+                                                            cache=state.member_cache_flags.joined)
+        uids = range(3 * 10**17, 3 * 10**17 + members)
+        count = (members + 999) // 1000
+        for i in range(count):
+            data = {"guild_id": str(gid), "nonce": request.nonce, "chunk_index": i, "chunk_count": count,
+                    "members": [member(u) for u in uids[i * 1000:(i + 1) * 1000]]}
+            start = time.perf_counter()
+            state.parse_guild_members_chunk(data)
+            chunked += time.perf_counter() - start
+    # leaderboard pages browsed, 25 names a page, through the bot's own lookup: the
+    # member cache by default, member queries answered from the payloads in lean mode
+    async def query_members(self, user_ids=None, limit=5, cache=True, **kwargs):
+        return [discord.Member(data=member(uid), guild=self, state=state) for uid in user_ids[:limit]]
+
+    discord.Guild.query_members = query_members     # Guild has slots: patched on the class
+    uids = list(range(3 * 10**17, 3 * 10**17 + names))
+    start = time.perf_counter()
+    for i in range(0, len(uids), 25):
+        await bot.member_names.resolve(guild, uids[i:i + 25])
+    resolved = time.perf_counter() - start
+    print(json.dumps({"cached_members": len(guild.members), "names": len(bot.member_names), "chunk_seconds": chunked,
+                      "resolve_seconds": resolved, "rss_kb": rss_kb("VmRSS") - before}))
+
+asyncio.run(main(int(sys.argv[1]), int(sys.argv[2])))
+"""
+
+def probe(folder, lean, members, names):
+    env = dict(os.environ, LEAN_MEMBERS="1" if lean else "0",
+               PYTHONPATH=os.pathsep.join(filter(None, (os.getcwd(), os.environ.get("PYTHONPATH")))))
+    out = subprocess.run([sys.executable, "-c", PROBE, str(members), str(names)], cwd=folder, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Member cache memory: default versus LEAN_MEMBERS=1")
+    parser.add_argument("--members", type=int, default=200000, help="members of the simulated guild")
+    parser.add_argument("--names", type=int, default=2500, help="leaderboard names looked up (100 pages of 25)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bot-members-") as scratch:
+        full = probe(scratch, False, args.members, args.names)
+        lean = probe(scratch, True, args.members, args.names)
+
+    print(f"one guild of {args.members} members, {args.names} leaderboard names")
+    print(f"{'mode':<8} {'cached members':>15} {'cached names':>13} {'chunking s':>11} {'names s':>8} {'RSS MB':>8}")
+    for name, r in (("default", full), ("lean", lean)):
+        print(f"{name:<8} {r['cached_members']:>15} {r['names']:>13} {r['chunk_seconds']:>11.2f} "
+              f"{r['resolve_seconds']:>8.3f} {r['rss_kb'] / 1024:>8.1f}")
+    print(f"lean mode saves {(full['rss_kb'] - lean['rss_kb']) / 1024:.1f} MB")
+
+if __name__ == "__main__":
+    main()
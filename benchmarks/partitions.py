@@ -0,0 +1,86 @@
+# benchmarks/partitions.py
+# Startup time and memory of the single-file JSON backend versus per-guild
+# partitions, for a bot that has joined many guilds but hears from few.
+# Run from the repo root: python -m benchmarks.partitions --guilds 2000 --users 500
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from tables import epoch_to_iso
+
+# run in a fresh interpreter per backend so RSS only covers that backend
+PROBE = """
+import json, os, resource, sys, time
+start = time.perf_counter()
+import bot
+loaded = time.perf_counter() - start
+active = json.loads(sys.argv[1])
+start = time.perf_counter()
+for gid, uid in active:
+    bot.get_guild_runtime(gid)
+    bot.get_user_points(gid, uid)
+first = time.perf_counter() - start
+# VmHWM is per address space; ru_maxrss would include the parent's size at fork
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if os.path.exists("/proc/self/status"):
+    with open("/proc/self/status") as f:
+        rss = next((int(line.split()[1]) for line in f if line.startswith("VmHWM:")), rss)
+print(json.dumps({"startup": loaded, "first_access": first, "rss_kb": rss}))
+"""
+
+def make_data(rng, guilds, users):
+    now = int(time.time())
+    config, points, daily = {}, {}, {}
+    ids = []
+    for g in range(guilds):
+        gid = 10**17 + g
+        config[str(gid)] = {"CHANNEL_ID": gid + 1, "CHANNEL_IDS": [gid + 1], "DAILY_REWARD": 10,
+                            "DAILY_COOLDOWN_HOURS": 24, "GAMBLE_WIN_CHANCE": 50, "LEADERBOARD_TOP": 10,
+                            "NOTIFY_ON_TRIGGER": True,
+                            "TRIGGERS": [{"message": f"trig{t}", "points": rng.randint(1, 5)} for t in range(10)]}
+        uids = [3 * 10**17 + g * users + u for u in range(users)]
+        points[str(gid)] = {str(uid): rng.randint(0, 5000) for uid in uids}
+        daily[str(gid)] = {str(uid): epoch_to_iso(now - rng.randint(0, 3 * 86400)) for uid in uids if rng.random() < 0.5}
+        ids.append((gid, uids[0]))
+    return config, points, daily, ids
+
+def probe(folder, backend, active):
+    env = dict(os.environ, STORAGE_BACKEND=backend,
+               PYTHONPATH=os.pathsep.join(filter(None, (os.getcwd(), os.environ.get("PYTHONPATH")))))
+    out = subprocess.run([sys.executable, "-c", PROBE, json.dumps(active)], cwd=folder, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup cost of the json and partitioned backends")
+    parser.add_argument("--guilds", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500, help="users per guild")
+    parser.add_argument("--active", type=int, default=20, help="guilds touched after startup")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    config, points, daily, ids = make_data(rng, args.guilds, args.users)
+    active = rng.sample(ids, min(args.active, len(ids)))
+    with tempfile.TemporaryDirectory(prefix="bot-partitions-") as scratch:
+        for name, data in (("config.json", config), ("points.json", points), ("daily.json", daily)):
+            with open(os.path.join(scratch, name), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        del config, points, daily
+        single = probe(scratch, "json", active)
+        subprocess.run([sys.executable, os.path.join(os.getcwd(), "storage.py"), "migrate-partitions"],
+                       cwd=scratch, check=True, capture_output=True)
+        split = probe(scratch, "partitioned", active)
+
+    print(f"{args.guilds} guilds x {args.users} users, {len(active)} guilds used after startup")
+    print(f"{'backend':<12} {'startup s':>10} {'first use s':>12} {'max RSS MB':>11}")
+    for name, r in (("json", single), ("partitioned", split)):
+        print(f"{name:<12} {r['startup']:>10.3f} {r['first_access']:>12.4f} {r['rss_kb'] / 1024:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/tables.py
+# Memory and lookup cost of GuildTable versus the original nested dicts.
+# Run from the repo root: python -m benchmarks.tables
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from tables import GuildTable, epoch_to_iso
+
+def make_json_layout(rng, users):
+    """{user_id: points} and {user_id: iso_datetime}, as stored in points.json/daily.json"""
+    now = int(time.time())
+    ids = rng.sample(range(10**17, 10**18), users)
+    points = {str(uid): rng.randint(0, 5000) for uid in ids}
+    daily = {str(uid): epoch_to_iso(now - rng.randint(0, 3 * 86400)) for uid in ids if rng.random() < 0.7}
+    return ids, points, daily
+
+def measure(build):
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+def dict_can_claim(daily, uid, cooldown):
+    """The original can_claim_daily lookup: string key, ISO parse per check"""
+    last_iso = daily.get(str(uid))
+    if not last_iso:
+        return True
+    return datetime.fromisoformat(last_iso) + timedelta(hours=cooldown) <= datetime.utcnow()
+
+def table_can_claim(table, uid, cooldown):
+    last = table.get_claim(uid)
+    return not last or last + cooldown * 3600 <= time.time()
+
+def per_op(fn, keys):
+    start = time.perf_counter()
+    for k in keys:
+        fn(k)
+    return (time.perf_counter() - start) / len(keys) * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'dict MB':>8} {'table MB':>9} {'B/user':>13} {'points ns':>15} {'can_claim ns':>15}")
+    for users in args.users:
+        rng = random.Random(args.seed)
+        ids, points_json, daily_json = make_json_layout(rng, users)
+        # both sides are built from the file contents, so all keys/values are counted
+        points_text, daily_text = json.dumps(points_json), json.dumps(daily_json)
+        dicts, dict_bytes = measure(lambda: (json.loads(points_text), json.loads(daily_text)))
+        table, table_bytes = measure(lambda: GuildTable.from_json(json.loads(points_text), json.loads(daily_text)))
+        keys = [rng.choice(ids) for _ in range(args.lookups)]
+        points_dict, daily_dict = dicts
+        dict_points = per_op(lambda uid: int(points_dict.get(str(uid), 0)), keys)
+        table_points = per_op(table.get_points, keys)
+        dict_claim = per_op(lambda uid: dict_can_claim(daily_dict, uid, 24), keys)
+        table_claim = per_op(lambda uid: table_can_claim(table, uid, 24), keys)
+        print(f"{users:>8} {dict_bytes / 2**20:>8.1f} {table_bytes / 2**20:>9.1f} "
+              f"{dict_bytes // users:>6} -> {table_bytes // users:<4} "
+              f"{dict_points:>6.0f} -> {table_points:<6.0f} {dict_claim:>6.0f} -> {table_claim:<6.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/triggers.py
+# Compare the compiled TriggerMatcher with the original linear scan.
+# Run from the repo root: python -m benchmarks.triggers
+import argparse
+import random
+import string
+import time
+
+from triggers import TriggerMatcher
+
+def linear_find(cfg_triggers: list, message_text: str):
+    """The original find_trigger_for_message from bot.py"""
+    low = message_text.lower()
+    for trig in cfg_triggers:
+        if "message" in trig and trig["message"].lower() in low:
+            return trig
+    return None
+
+def random_word(rng, lo=3, hi=9):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(lo, hi)))
+
+def make_workload(rng, trigger_count, message_count, hit_rate):
+    triggers = [{"message": random_word(rng, 4, 12), "points": rng.randint(-5, 10)} for _ in range(trigger_count)]
+    messages = []
+    for _ in range(message_count):
+        words = [random_word(rng) for _ in range(rng.randint(3, 25))]
+        if triggers and rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(triggers)["message"].upper())
+        messages.append(" ".join(words))
+    return triggers, messages
+
+def time_per_message(fn, messages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in messages:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--triggers", type=int, nargs="+", default=[5, 25, 100, 500, 2000])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--hit-rate", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'triggers':>8} {'linear us/msg':>14} {'matcher us/msg':>15} {'speedup':>8} {'compile ms':>11}")
+    for count in args.triggers:
+        rng = random.Random(args.seed)
+        triggers, messages = make_workload(rng, count, args.messages, args.hit_rate)
+        start = time.perf_counter()
+        matcher = TriggerMatcher(triggers)
+        compile_ms = (time.perf_counter() - start) * 1000
+        for text in messages:
+            assert matcher.match(text) is linear_find(triggers, text), text
+        linear = time_per_message(lambda t: linear_find(triggers, t), messages, args.repeat)
+        compiled = time_per_message(matcher.match, messages, args.repeat)
+        print(f"{count:>8} {linear:>14.2f} {compiled:>15.2f} {linear / compiled:>7.1f}x {compile_ms:>11.2f}")
+
+if __name__ == "__main__":
+    main()
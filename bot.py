@@ -1,485 +1,1005 @@
-# bot.py
-import discord
-from discord.ext import commands
-from discord import app_commands
-import json
-import os
-import random
-from datetime import datetime, timedelta
-from typing import Optional
-
-# ---------- SETTINGS ----------
-CONFIG_FILE = "config.json"
-POINTS_FILE = "points.json"
-DAILY_FILE = "daily.json"
-
-# ---------- UTIL: JSON LOAD/SAVE ----------
-def load_json(path):
-    if not os.path.exists(path):
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump({}, f)
-    with open(path, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except:
-            return {}
-
-def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
-
-# ---------- DEFAULTS ----------
-DEFAULT_GUILD_CONFIG = {
-    "CHANNEL_ID": None,                # int or None: only channel where bot works
-    "DAILY_REWARD": 10,                # int points
-    "DAILY_COOLDOWN_HOURS": 24,        # cooldown hours
-    "GAMBLE_WIN_CHANCE": 50,           # percent (kept for reference; default 50%)
-    "LEADERBOARD_TOP": 10,             # top N users
-    "NOTIFY_ON_TRIGGER": True,         # whether to send chat messages on triggers
-    "TRIGGERS": []                     # list of {"message": "...", "points": int}
-}
-
-# ---------- BOT / INTENTS ----------
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
-
-bot = commands.Bot(command_prefix="/", intents=intents)
-
-# ---------- LOAD DATA ----------
-config_data = load_json(CONFIG_FILE)   # per-guild config
-points_data = load_json(POINTS_FILE)   # { guild_id: { user_id: points } }
-daily_data = load_json(DAILY_FILE)     # { guild_id: { user_id: iso_datetime } }
-
-# ---------- HELPERS ----------
-def get_guild_config(guild_id: int) -> dict:
-    gid = str(guild_id)
-    if gid not in config_data:
-        config_data[gid] = DEFAULT_GUILD_CONFIG.copy()
-        # ensure we have mutable list/copy
-        config_data[gid]["TRIGGERS"] = []
-        save_json(CONFIG_FILE, config_data)
-    # fill missing keys if older config present
-    for k, v in DEFAULT_GUILD_CONFIG.items():
-        if k not in config_data[gid]:
-            config_data[gid][k] = v
-    return config_data[gid]
-
-def save_guild_config(guild_id: int):
-    save_json(CONFIG_FILE, config_data)
-
-def get_user_points(guild_id: int, user_id: int) -> int:
-    gid = str(guild_id)
-    uid = str(user_id)
-    if gid not in points_data:
-        points_data[gid] = {}
-    return int(points_data[gid].get(uid, 0))
-
-def set_user_points(guild_id: int, user_id: int, value: int):
-    gid = str(guild_id)
-    uid = str(user_id)
-    if gid not in points_data:
-        points_data[gid] = {}
-    points_data[gid][uid] = int(max(0, value))
-    save_json(POINTS_FILE, points_data)
-
-def change_user_points(guild_id: int, user_id: int, delta: int) -> int:
-    cur = get_user_points(guild_id, user_id)
-    new = cur + int(delta)
-    set_user_points(guild_id, user_id, new)
-    return new
-
-def can_claim_daily(guild_id: int, user_id: int):
-    gid = str(guild_id)
-    uid = str(user_id)
-    cfg = get_guild_config(guild_id)
-    cooldown = int(cfg.get("DAILY_COOLDOWN_HOURS", 24))
-    if gid not in daily_data:
-        daily_data[gid] = {}
-    last_iso = daily_data[gid].get(uid)
-    if not last_iso:
-        return True, None
-    try:
-        last_dt = datetime.fromisoformat(last_iso)
-    except:
-        return True, None
-    next_dt = last_dt + timedelta(hours=cooldown)
-    remain = next_dt - datetime.utcnow()
-    if remain.total_seconds() <= 0:
-        return True, None
-    return False, remain
-
-def set_daily_claim(guild_id: int, user_id: int):
-    gid = str(guild_id)
-    uid = str(user_id)
-    if gid not in daily_data:
-        daily_data[gid] = {}
-    daily_data[gid][uid] = datetime.utcnow().isoformat()
-    save_json(DAILY_FILE, daily_data)
-
-def find_trigger_for_message(cfg_triggers: list, message_text: str):
-    """Return the first trigger dict that is a substring of message_text (case-insensitive)"""
-    low = message_text.lower()
-    for trig in cfg_triggers:
-        if "message" in trig and trig["message"].lower() in low:
-            return trig
-    return None
-
-def is_admin(interaction: discord.Interaction) -> bool:
-    if not interaction.guild:
-        return False
-    return interaction.user.guild_permissions.administrator
-
-# ---------- EVENT: ready ----------
-@bot.event
-async def on_ready():
-    # register global commands (sync)
-    try:
-        await bot.tree.sync()
-    except Exception as e:
-        print("Warning: command sync:", e)
-    print(f"Bot logged in as {bot.user} ({bot.user.id})")
-
-# ---------- EVENT: on_message (triggers) ----------
-@bot.event
-async def on_message(message: discord.Message):
-    # ignore bots & DMs
-    if message.author.bot:
-        return
-    if message.guild is None:
-        # ignore DMs silently (user requested commands not to work in DMs)
-        return
-
-    guild_id = message.guild.id
-    cfg = get_guild_config(guild_id)
-    allowed_channel = cfg.get("CHANNEL_ID")
-    if not allowed_channel:
-        # no channel set -> silent ignore
-        return
-    if message.channel.id != allowed_channel:
-        return  # silent outside designated channel
-
-    # triggers: unified list
-    triggers = cfg.get("TRIGGERS", [])
-    trig = find_trigger_for_message(triggers, message.content)
-    if trig:
-        pts = int(trig.get("points", 0))
-        new_total = change_user_points(guild_id, message.author.id, pts)
-        if cfg.get("NOTIFY_ON_TRIGGER", True):
-            # positive/negative wording
-            if pts >= 0:
-                await message.channel.send(f"{message.author.mention} gained {pts} point{'s' if pts!=1 else ''}! Total: **{new_total}**")
-            else:
-                await message.channel.send(f"{message.author.mention} lost {abs(pts)} point{'s' if pts!=-1 else ''}! Total: **{new_total}**")
-        return
-
-    # allow commands processing afterwards
-    await bot.process_commands(message)
-
-# ---------- UTIL: ensure command in guild & channel ----------
-async def ensure_guild_and_channel(interaction: discord.Interaction) -> bool:
-    # returns True if command should proceed
-    if interaction.guild is None:
-        # silently ignore commands in DMs
-        return False
-    cfg = get_guild_config(interaction.guild.id)
-    allowed = cfg.get("CHANNEL_ID")
-    if not allowed:
-        # no channel set => silent ignore
-        return False
-    if interaction.channel is None or interaction.channel.id != allowed:
-        # command used outside designated channel -> silent ignore
-        return False
-    return True
-
-# ---------- SLASH COMMANDS ----------
-# /points
-@bot.tree.command(name="points", description="Check your points (server-specific)")
-async def points_cmd(interaction: discord.Interaction):
-    ok = await ensure_guild_and_channel(interaction)
-    if not ok:
-        return
-    pts = get_user_points(interaction.guild.id, interaction.user.id)
-    await interaction.response.send_message(f"{interaction.user.mention}, you have **{pts}** point{'s' if pts!=1 else ''}.", ephemeral=True)
-
-# /daily
-@bot.tree.command(name="daily", description="Claim your daily reward")
-async def daily_cmd(interaction: discord.Interaction):
-    ok = await ensure_guild_and_channel(interaction)
-    if not ok:
-        return
-    guild_id = interaction.guild.id
-    user_id = interaction.user.id
-    cfg = get_guild_config(guild_id)
-    can_claim, remain = can_claim_daily(guild_id, user_id)
-    if not can_claim:
-        # send ephemeral remaining time
-        hours = int(remain.total_seconds() // 3600)
-        minutes = int((remain.total_seconds() % 3600) // 60)
-        await interaction.response.send_message(f"You must wait {hours}h {minutes}m to claim daily again.", ephemeral=True)
-        return
-    reward = int(cfg.get("DAILY_REWARD", 10))
-    total = change_user_points(guild_id, user_id, reward)
-    set_daily_claim(guild_id, user_id)
-    await interaction.response.send_message(f"🎉 {interaction.user.mention}, you claimed your daily reward of **{reward}** points! Total: **{total}**")
-
-# /gamble <color> <amount>
-@bot.tree.command(name="gamble", description="Gamble on red or black. Subtracts bet first, win doubles the bet.")
-@app_commands.choices(color=[
-    app_commands.Choice(name="red", value="red"),
-    app_commands.Choice(name="black", value="black"),
-])
-@app_commands.describe(color="Pick red or black", amount="Amount to gamble")
-async def gamble_cmd(interaction: discord.Interaction, color: app_commands.Choice[str], amount: int):
-    ok = await ensure_guild_and_channel(interaction)
-    if not ok:
-        return
-    if amount <= 0:
-        await interaction.response.send_message("Amount must be positive.", ephemeral=True)
-        return
-    guild_id = interaction.guild.id
-    user_id = interaction.user.id
-    current = get_user_points(guild_id, user_id)
-    if amount > current:
-        await interaction.response.send_message("You don't have enough points to gamble that amount.", ephemeral=True)
-        return
-
-    # subtract bet immediately
-    change_user_points(guild_id, user_id, -amount)
-
-    # 50% win chance (hardcoded)
-    win = random.choice([True, False])
-    if win:
-        payout = amount * 2
-        total = change_user_points(guild_id, user_id, payout)
-        await interaction.response.send_message(
-            f"🎉 **You won!** The color was **{color.value}**. You win **{payout}** points (net +{amount}). Total: **{total}**"
-        )
-    else:
-        total = get_user_points(guild_id, user_id)
-        await interaction.response.send_message(
-            f"💀 **You lost.** The color was **{color.value}**. You lost **{amount}** points. Total: **{total}**"
-        )
-
-# /leaderboard
-@bot.tree.command(name="leaderboard", description="Show server leaderboard (top N per config)")
-@app_commands.describe(top="How many users to show (default = config)")
-async def leaderboard_cmd(interaction: discord.Interaction, top: Optional[int] = None):
-    ok = await ensure_guild_and_channel(interaction)
-    if not ok:
-        return
-    gid = str(interaction.guild.id)
-    cfg = get_guild_config(interaction.guild.id)
-    top_n = int(top) if top and top > 0 else int(cfg.get("LEADERBOARD_TOP", 10))
-    guild_points = points_data.get(gid, {})
-    if not guild_points:
-        await interaction.response.send_message("No points yet on this server.", ephemeral=True)
-        return
-    sorted_list = sorted(guild_points.items(), key=lambda x: x[1], reverse=True)[:top_n]
-    embed = discord.Embed(title=f"🏆 Leaderboard (Top {len(sorted_list)})", color=discord.Color.gold())
-    for i, (uid, pts) in enumerate(sorted_list, start=1):
-        member = interaction.guild.get_member(int(uid))
-        name = member.display_name if member else f"User ID {uid}"
-        embed.add_field(name=f"{i}. {name}", value=f"{pts} points", inline=False)
-    await interaction.response.send_message(embed=embed)
-
-# /addtrigger (admin)
-@bot.tree.command(name="addtrigger", description="Add a trigger (admin only). Message is case-insensitive substring.")
-@app_commands.describe(message="Trigger text (substring)", points="Points to add (use negative for removing points)")
-async def addtrigger_cmd(interaction: discord.Interaction, message: str, points: int):
-    if interaction.guild is None:
-        return
-    if not is_admin(interaction):
-        await interaction.response.send_message("Administrator only.", ephemeral=True)
-        return
-    cfg = get_guild_config(interaction.guild.id)
-    cfg.setdefault("TRIGGERS", [])
-    cfg["TRIGGERS"].append({"message": message, "points": int(points)})
-    config_data[str(interaction.guild.id)] = cfg
-    save_json(CONFIG_FILE, config_data)
-    await interaction.response.send_message(f"Trigger added: '{message}' → {points} point{'s' if abs(points)!=1 else ''}.", ephemeral=True)
-
-# /removetrigger (admin) - exact message match (case-insensitive)
-@bot.tree.command(name="removetrigger", description="Remove a trigger (admin only) by exact message text.")
-@app_commands.describe(message="Exact trigger text to remove (case-insensitive)")
-async def removetrigger_cmd(interaction: discord.Interaction, message: str):
-    if interaction.guild is None:
-        return
-    if not is_admin(interaction):
-        await interaction.response.send_message("Administrator only.", ephemeral=True)
-        return
-    cfg = get_guild_config(interaction.guild.id)
-    before = len(cfg.get("TRIGGERS", []))
-    cfg["TRIGGERS"] = [t for t in cfg.get("TRIGGERS", []) if t.get("message", "").lower() != message.lower()]
-    config_data[str(interaction.guild.id)] = cfg
-    save_json(CONFIG_FILE, config_data)
-    after = len(cfg.get("TRIGGERS", []))
-    if before == after:
-        await interaction.response.send_message("No matching trigger found.", ephemeral=True)
-    else:
-        await interaction.response.send_message(f"Removed trigger matching '{message}'.", ephemeral=True)
-
-# /setchannel (admin)
-@bot.tree.command(name="setchannel", description="Set the channel where the bot will operate (admin only)")
-@app_commands.describe(channel_id="Enter the numeric ID of the channel")
-async def setchannel(interaction: discord.Interaction, channel_id: str):
-    if interaction.guild is None:
-        return
-    if not is_admin(interaction):
-        await interaction.response.send_message("❌ Only administrators can use this command.", ephemeral=True)
-        return
-
-    # Validate the channel ID
-    if not channel_id.isdigit():
-        await interaction.response.send_message("❌ Please enter a valid numeric channel ID.", ephemeral=True)
-        return
-
-    channel = interaction.guild.get_channel(int(channel_id))
-    if channel is None:
-        await interaction.response.send_message("❌ Channel not found. Make sure the ID is correct.", ephemeral=True)
-        return
-
-    cfg = get_guild_config(interaction.guild.id)
-    cfg["CHANNEL_ID"] = channel.id
-    config_data[str(interaction.guild.id)] = cfg
-    save_json(CONFIG_FILE, config_data)
-
-    await interaction.response.send_message(f"✅ Bot channel set to {channel.mention} for this server.", ephemeral=True)
-
-# /setconfig (admin) for numeric options
-@bot.tree.command(name="setconfig", description="Set numeric configuration option (admin only)")
-@app_commands.describe(option="Option name (DAILY_REWARD, DAILY_COOLDOWN_HOURS, GAMBLE_WIN_CHANCE, LEADERBOARD_TOP)", value="Integer value")
-async def setconfig_cmd(interaction: discord.Interaction, option: str, value: int):
-    if interaction.guild is None:
-        return
-    if not is_admin(interaction):
-        await interaction.response.send_message("Administrator only.", ephemeral=True)
-        return
-    opt = option.strip().upper()
-    allowed = ("DAILY_REWARD", "DAILY_COOLDOWN_HOURS", "GAMBLE_WIN_CHANCE", "LEADERBOARD_TOP")
-    if opt not in allowed:
-        await interaction.response.send_message(f"Allowed options: {', '.join(allowed)}", ephemeral=True)
-        return
-    cfg = get_guild_config(interaction.guild.id)
-    cfg[opt] = int(value)
-    config_data[str(interaction.guild.id)] = cfg
-    save_json(CONFIG_FILE, config_data)
-    await interaction.response.send_message(f"Set {opt} = {value} for this server.", ephemeral=True)
-
-# /currentconfig (admin)
-@bot.tree.command(name="currentconfig", description="Show current server configuration (admin only)")
-async def currentconfig_cmd(interaction: discord.Interaction):
-    if interaction.guild is None:
-        return
-    if not is_admin(interaction):
-        await interaction.response.send_message("Administrator only.", ephemeral=True)
-        return
-    cfg = get_guild_config(interaction.guild.id)
-    lines = [
-        f"CHANNEL_ID: {cfg.get('CHANNEL_ID')}",
-        f"DAILY_REWARD: {cfg.get('DAILY_REWARD')}",
-        f"DAILY_COOLDOWN_HOURS: {cfg.get('DAILY_COOLDOWN_HOURS')}",
-        f"GAMBLE_WIN_CHANCE (ref): {cfg.get('GAMBLE_WIN_CHANCE')}",
-        f"LEADERBOARD_TOP: {cfg.get('LEADERBOARD_TOP')}",
-        "TRIGGERS:"
-    ]
-    for t in cfg.get("TRIGGERS", []):
-        lines.append(f"  • '{t.get('message')}' -> {t.get('points')}")
-    await interaction.response.send_message("```\n" + "\n".join(lines) + "\n```", ephemeral=True)
-
-# /reset (admin)
-@bot.tree.command(name="reset", description="Reset a user's points for this server (admin only)")
-@app_commands.describe(member="Member to reset")
-async def reset_cmd(interaction: discord.Interaction, member: discord.Member):
-    if interaction.guild is None:
-        return
-    if not is_admin(interaction):
-        await interaction.response.send_message("Administrator only.", ephemeral=True)
-        return
-    set_user_points(interaction.guild.id, member.id, 0)
-    await interaction.response.send_message(f"{member.mention}'s points have been reset to 0.", ephemeral=True)
-
-# /selftest (admin) -> DM the results
-@bot.tree.command(name="selftest", description="Run a self-test (admin only). Results are sent via DM.")
-async def selftest_cmd(interaction: discord.Interaction):
-    if interaction.guild is None:
-        return
-    if not is_admin(interaction):
-        await interaction.response.send_message("Administrator only.", ephemeral=True)
-        return
-
-    # Prepare report
-    guild_id = interaction.guild.id
-    cfg = get_guild_config(guild_id)
-    report_lines = []
-    report_lines.append(f"Self-test for server: {interaction.guild.name} (ID: {guild_id})")
-    # 1) Channel set?
-    if not cfg.get("CHANNEL_ID"):
-        report_lines.append("❌ Channel not configured. Set a channel with /setchannel <channel_id> to enable bot features.")
-    else:
-        report_lines.append(f"✅ Channel set: <#{cfg['CHANNEL_ID']}>")
-    # 2) JSON files present
-    for p,file in (("config", CONFIG_FILE), ("points", POINTS_FILE), ("daily", DAILY_FILE)):
-        try:
-            _ = load_json(file)
-            report_lines.append(f"✅ {file} loaded OK")
-        except Exception as e:
-            report_lines.append(f"❌ {file} load error: {e}")
-    # 3) Triggers sanity
-    tcount = len(cfg.get("TRIGGERS", []))
-    report_lines.append(f"✅ Triggers count: {tcount}")
-    # 4) Points persistence test
-    uid = interaction.user.id
-    try:
-        prev = get_user_points(guild_id, uid)
-        change_user_points(guild_id, uid, 1)
-        if get_user_points(guild_id, uid) == prev + 1:
-            # revert
-            set_user_points(guild_id, uid, prev)
-            report_lines.append("✅ Points save/load test: OK")
-        else:
-            report_lines.append("❌ Points save/load test: mismatch")
-    except Exception as e:
-        report_lines.append(f"❌ Points test error: {e}")
-    # 5) Daily logic test (simulate)
-    try:
-        ok, rem = can_claim_daily(guild_id, uid)
-        report_lines.append(f"✅ Daily cooldown check ran (can_claim={ok})")
-    except Exception as e:
-        report_lines.append(f"❌ Daily test error: {e}")
-    # 6) Gamble logic test (simulate subtract/add)
-    try:
-        cur = get_user_points(guild_id, uid)
-        # Give test funds
-        set_user_points(guild_id, uid, max(cur, 5))
-        before = get_user_points(guild_id, uid)
-        # simulate gamble subtract-then-win
-        change_user_points(guild_id, uid, -1)
-        change_user_points(guild_id, uid, 2)  # payout double
-        after = get_user_points(guild_id, uid)
-        if after == before + 1:
-            report_lines.append("✅ Gamble logic simulation OK")
-        else:
-            report_lines.append("❌ Gamble logic simulation mismatch")
-        # revert to original
-        set_user_points(guild_id, uid, cur)
-    except Exception as e:
-        report_lines.append(f"❌ Gamble test error: {e}")
-
-    # Send report via DM to the admin who triggered the test
-    report = "\n".join(report_lines)
-    try:
-        await interaction.user.send(f"Self-test results:\n\n{report}")
-        await interaction.response.send_message("Self-test completed — report DM'd to you.", ephemeral=True)
-    except Exception as e:
-        # if DM blocked, inform ephemeral
-        await interaction.response.send_message(f"Self-test completed but I couldn't DM you (error: {e}).", ephemeral=True)
-
-# ---------- START ----------
-if __name__ == "__main__":
-    TOKEN = os.getenv("DISCORD_TOKEN")
-    if not TOKEN:
-        print("ERROR: DISCORD_TOKEN environment variable not set.")
-        raise SystemExit(1)
-    bot.run(TOKEN)
-
+# bot.py
+import discord
+from discord.ext import commands
+from discord import app_commands
+import asyncio
+import atexit
+import io
+import os
+import random
+import re
+import signal
+import time
+from datetime import datetime
+from typing import Optional
+
+from leaderboard import Leaderboards
+from metrics import Metrics, serve_metrics
+from guild_runtime import DEFAULT_GUILD_CONFIG, GuildRuntime, config_channels
+from notify import TriggerNotifier
+from stalls import StallWatchdog
+from bulk import BULK_CHUNK, Progress, parse_csv, render_csv
+from cluster import DEFAULT_ADDRESS, parse_address
+from command_sync import sync_commands
+from member_names import DisplayNameCache
+from storage import WriteBehind, open_storage
+from transactions import Transactions, daily_remaining
+from triggers import MODE_REGEX, MODE_SUBSTRING, TRIGGER_MODES, compile_trigger_regex
+
+PROCESS_STARTED = time.monotonic()   # for the startup timings in bot_startup_seconds
+
+# ---------- SETTINGS ----------
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")  # "json" (files below), "partitioned", "sqlite" or "remote" (cluster.py)
+STORAGE_ADDRESS = os.getenv("STORAGE_ADDRESS", DEFAULT_ADDRESS)  # storage owner for "remote": host:port
+STORAGE_AUTHKEY = os.getenv("STORAGE_AUTHKEY", "")                  # hex key shared with the storage owner
+STORAGE_TIMEOUT_SECONDS = float(os.getenv("STORAGE_TIMEOUT_SECONDS", "5"))  # "remote": give up on an unanswered read after this
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))                     # total shards, 0 = not sharded
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip()]  # shards run by this process
+SQLITE_FILE = "bot.db"
+CONFIG_FILE = "config.json"
+POINTS_FILE = "points.json"
+DAILY_FILE = "daily.json"
+LEDGER_FILE = "ledger.jsonl"  # append-only log of every points/daily change
+LEDGER_COMPACT_RECORDS = int(os.getenv("LEDGER_COMPACT_RECORDS", "50000"))  # rewrite snapshots after this many records
+LEDGER_ARCHIVE = os.getenv("LEDGER_ARCHIVE", "1") == "1"                    # keep compacted ledger segments for auditing
+PARTITIONS_DIR = "guilds"                                                  # "partitioned": one folder per guild
+PARTITION_CACHE_SIZE = int(os.getenv("PARTITION_CACHE_SIZE", "256"))       # guilds kept in memory at most
+PARTITION_IDLE_SECONDS = float(os.getenv("PARTITION_IDLE_SECONDS", "900")) # unused guilds are saved and dropped after this
+FLUSH_INTERVAL_SECONDS = float(os.getenv("FLUSH_INTERVAL_SECONDS", "1"))  # max delay before changes hit disk
+FLUSH_MAX_DIRTY = int(os.getenv("FLUSH_MAX_DIRTY", "1000"))                # flush early after this many changes
+NOTIFY_WINDOW_SECONDS = float(os.getenv("NOTIFY_WINDOW_SECONDS", "1.5"))  # trigger hits within this window share one message
+NOTIFY_BUDGET = int(os.getenv("NOTIFY_BUDGET", "4"))                       # max notification messages per channel ...
+NOTIFY_BUDGET_SECONDS = float(os.getenv("NOTIFY_BUDGET_SECONDS", "5"))    # ... per this many seconds
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))                         # Prometheus /metrics port, 0 = off
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+LEADERBOARD_PAGE_MAX = 25                                                  # Discord's limit on embed fields
+LEADERBOARD_CACHE_SECONDS = 60                                             # rendered pages (and member names) are reused this long
+LEADERBOARD_VIEW_SECONDS = 300                                             # prev/next buttons stop working after this
+LEADERBOARD_GUILDS = int(os.getenv("LEADERBOARD_GUILDS", "256"))           # guild boards kept in memory at most
+IMPORT_MAX_BYTES = 5_000_000                                               # largest CSV /importpoints accepts
+COMMAND_SYNC = os.getenv("COMMAND_SYNC", "auto")                           # "auto" (only when the commands changed), "always" or "off"
+COMMAND_SYNC_FILE = "command_sync.json"                                    # hash of the command tree last synced
+DEV_GUILD_ID = int(os.getenv("DEV_GUILD_ID", "0"))                         # sync commands to this guild only (shows up instantly)
+LEAN_MEMBERS = os.getenv("LEAN_MEMBERS", "0") == "1"                       # no member cache or startup chunking; names fetched on demand
+NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", "50000"))               # display names kept in lean member mode
+NAME_CACHE_SECONDS = float(os.getenv("NAME_CACHE_SECONDS", "600"))        # ... and for how long
+STALL_THRESHOLD_MS = float(os.getenv("STALL_THRESHOLD_MS", "0"))           # report event-loop stalls longer than this, 0 = off
+STALL_LOG_FILE = "stalls.log"                                              # each stall with the loop's stack at the time
+
+# ---------- BOT / INTENTS ----------
+intents = discord.Intents.default()
+intents.message_content = True
+intents.members = True
+
+# ---------- LOAD DATA ----------
+storage = open_storage(STORAGE_BACKEND, config_file=CONFIG_FILE, points_file=POINTS_FILE, daily_file=DAILY_FILE,
+                       ledger_file=LEDGER_FILE, sqlite_file=SQLITE_FILE, partitions_dir=PARTITIONS_DIR,
+                       cache_size=PARTITION_CACHE_SIZE, idle_seconds=PARTITION_IDLE_SECONDS,
+                       compact_after=LEDGER_COMPACT_RECORDS, archive=LEDGER_ARCHIVE,
+                       address=parse_address(STORAGE_ADDRESS), authkey=bytes.fromhex(STORAGE_AUTHKEY),
+                       timeout=STORAGE_TIMEOUT_SECONDS)
+# ranked balances per guild, built on first use and updated by set_user_points;
+# SQLite answers pages and ranks from its index instead of a copy in memory
+leaderboards = Leaderboards(storage, size=LEADERBOARD_GUILDS)
+# guild_id -> users whose balance changed while a bulk command was running there
+bulk_touched = {}
+BULK_BUSY = "Another bulk operation is already running on this server."
+
+def note_points_change(guild_id: int, user_id: int, points: int):
+    leaderboards.update(guild_id, user_id, points)
+    touched = bulk_touched.get(guild_id)
+    if touched is not None:
+        touched.add(user_id)
+
+# atomic multi-step balance/daily changes (gamble, daily), committed as one write
+transactions = Transactions(storage, on_commit=note_points_change)
+# batched, rate-limited trigger notifications
+notifier = TriggerNotifier(window=NOTIFY_WINDOW_SECONDS, budget=NOTIFY_BUDGET, budget_seconds=NOTIFY_BUDGET_SECONDS)
+
+metrics = Metrics()
+stall_watchdog = StallWatchdog(STALL_THRESHOLD_MS / 1000, log_path=STALL_LOG_FILE) if STALL_THRESHOLD_MS > 0 else None
+
+# changes are written back in the background instead of on every call
+writer = WriteBehind(storage.stores, interval=FLUSH_INTERVAL_SECONDS,
+                     max_dirty=FLUSH_MAX_DIRTY, on_flush=metrics.flushed)
+atexit.register(writer.flush_all_sync)
+
+# cluster workers run several shards each (see cluster.py)
+class PointsBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
+    async def setup_hook(self):
+        startup_seconds["login"] = time.monotonic() - PROCESS_STARTED
+        writer.start()
+        # docker stop / systemctl stop send SIGTERM, which would otherwise kill
+        # the process with the latest changes still waiting for the writer
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(self.close()))
+        except NotImplementedError:
+            pass    # no loop signal handlers on Windows
+        # once per process, not on every reconnect; in a cluster only the worker with shard 0
+        if COMMAND_SYNC != "off" and (not SHARD_COUNT or 0 in SHARD_IDS):
+            self.loop.create_task(sync_command_tree())
+        self.loop.create_task(metrics.watch_loop())
+        if stall_watchdog is not None:
+            stall_watchdog.start()
+        if METRICS_PORT:
+            serve_metrics(metrics, METRICS_HOST, METRICS_PORT)
+
+    async def close(self):
+        # make sure nothing is lost on shutdown
+        if stall_watchdog is not None:
+            stall_watchdog.stop()
+        await notifier.close()
+        await writer.close()
+        try:
+            await storage.close()
+        except Exception as e:
+            print("Warning: closing storage:", e)
+        await super().close()
+
+startup_seconds = {}   # phase -> seconds: "login" (start to logged in), "ready" (last gateway connect to ready), "command_sync"
+connect_started = None
+
+shard_options = {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS} if SHARD_COUNT else {}
+# the members intent stays on in lean mode: member queries by user id need it
+member_options = {"member_cache_flags": discord.MemberCacheFlags.none(), "chunk_guilds_at_startup": False} if LEAN_MEMBERS else {}
+bot = PointsBot(command_prefix="/", intents=intents, **shard_options, **member_options)
+member_names = DisplayNameCache(size=NAME_CACHE_SIZE, ttl=NAME_CACHE_SECONDS)
+
+def collect_gauges() -> dict:
+    gauges = {
+        "bot_gateway_latency_seconds": [("", bot.latency)],
+        "bot_guild_runtimes": [("", len(guild_runtimes))],
+        "bot_leaderboard_boards": [("", len(leaderboards.guilds))],
+        "bot_leaderboard_entries": [("", leaderboards.entries())],
+        "bot_leaderboard_evictions": [("", leaderboards.evictions)],
+        "bot_storage_dirty": [("", sum(s.dirty for s in storage.stores))],
+        "bot_transaction_lock_waits": [("", transactions.waits)],
+        "bot_startup_seconds": [(f'phase="{phase}"', seconds) for phase, seconds in startup_seconds.items()],
+    }
+    for key, value in storage.memory_stats().items():
+        gauges[f"bot_storage_{key}"] = [("", value)]
+    for key, value in notifier.stats().items():
+        gauges[f"bot_notify_{key}"] = [("", value)]
+    if stall_watchdog is not None:
+        gauges["bot_loop_stalls"] = [("", stall_watchdog.stalls)]
+        gauges["bot_loop_stalled_seconds"] = [("", stall_watchdog.stalled_seconds)]
+    if LEAN_MEMBERS:
+        for key, value in member_names.stats().items():
+            gauges[f"bot_member_names_{key}"] = [("", value)]
+    return gauges
+
+metrics.collectors.append(collect_gauges)
+
+# ---------- HELPERS ----------
+def get_guild_config(guild_id: int) -> dict:
+    cfg = storage.get_config(guild_id)
+    if cfg is None:
+        cfg = DEFAULT_GUILD_CONFIG.copy()
+        # ensure we have mutable list/copy
+        cfg["TRIGGERS"] = []
+        cfg["CHANNEL_IDS"] = []
+        save_guild_config(guild_id, cfg)
+    # fill missing keys if older config present
+    for k, v in DEFAULT_GUILD_CONFIG.items():
+        if k not in cfg:
+            cfg[k] = v
+    return cfg
+
+def save_guild_config(guild_id: int, cfg: dict):
+    storage.set_config(guild_id, cfg)
+    compile_guild_runtime(guild_id, cfg)
+
+# compiled, read-only config per guild; only rebuilt when a config is saved
+guild_runtimes = {}
+
+def compile_guild_runtime(guild_id: int, cfg: dict) -> GuildRuntime:
+    old = guild_runtimes.get(guild_id)
+    rt = GuildRuntime.from_config(guild_id, cfg, DEFAULT_GUILD_CONFIG, version=old.version + 1 if old else 1)
+    guild_runtimes[guild_id] = rt
+    return rt
+
+def get_guild_runtime(guild_id: int) -> GuildRuntime:
+    # compiled on first use; a guild without a stored config runs on the defaults
+    rt = guild_runtimes.get(guild_id)
+    if rt is None:
+        rt = compile_guild_runtime(guild_id, storage.get_config(guild_id) or DEFAULT_GUILD_CONFIG)
+    return rt
+
+def forget_guild(guild_id: int):
+    # the storage backend dropped the guild from memory; rebuild from storage when it returns
+    guild_runtimes.pop(guild_id, None)
+    leaderboards.forget(guild_id)
+
+storage.on_evict = forget_guild
+
+def get_user_points(guild_id: int, user_id: int) -> int:
+    return storage.get_points(guild_id, user_id)
+
+def set_user_points(guild_id: int, user_id: int, value: int, reason: str = "set"):
+    # reason is recorded in the ledger: trigger / daily / gamble / reset / selftest
+    value = int(max(0, value))
+    storage.set_points(guild_id, user_id, value, reason)
+    note_points_change(guild_id, user_id, value)
+
+def change_user_points(guild_id: int, user_id: int, delta: int, reason: str = "adjust") -> int:
+    # one storage call: in a cluster the owner applies the delta, so no update is lost
+    new = storage.change_points(guild_id, user_id, int(delta), reason)
+    note_points_change(guild_id, user_id, new)
+    return new
+
+async def run_bulk(guild_id: int, fn, reason: str, progress=None, include=()):
+    """Set every balance of the guild to fn(user_id, points), skipping None, as one
+    stored batch; `include` adds users without a balance yet.  Returns the count changed,
+    or None if another bulk operation is still running for the guild."""
+    if guild_id in bulk_touched:
+        return None
+    touched = bulk_touched[guild_id] = set()
+    try:
+        await storage.load_guild(guild_id)
+        items = storage.guild_points(guild_id)
+        known = {uid for uid, _ in items}
+        items += [(uid, 0) for uid in include if uid not in known]
+        changed = 0
+        async with storage.bulk(guild_id, reason) as batch:
+            for start in range(0, len(items), BULK_CHUNK):
+                rows = []
+                for uid, pts in items[start:start + BULK_CHUNK]:
+                    if uid in touched:
+                        # changed since the snapshot: work from the current balance
+                        pts = get_user_points(guild_id, uid)
+                    new = fn(uid, pts)
+                    if new is not None:
+                        rows.append((uid, max(0, int(new))))
+                batch.write(rows)
+                changed += len(rows)
+                if progress is not None:
+                    await progress(min(start + BULK_CHUNK, len(items)), len(items))
+                await asyncio.sleep(0)
+        return changed
+    finally:
+        del bulk_touched[guild_id]
+        # rebuilt from storage on next use, cheaper than one update per row
+        leaderboards.forget(guild_id)
+
+def can_claim_daily(guild_id: int, user_id: int):
+    cooldown = get_guild_runtime(guild_id).daily_cooldown_hours
+    remain = daily_remaining(storage.get_daily(guild_id, user_id), cooldown)
+    if remain is None:
+        return True, None
+    return False, remain
+
+def set_daily_claim(guild_id: int, user_id: int):
+    storage.set_daily(guild_id, user_id, int(time.time()))
+
+def find_trigger_for_message(rt: GuildRuntime, message_text: str):
+    """Return the first trigger dict (in list order) that matches message_text"""
+    return rt.matcher.match(message_text)
+
+def is_admin(interaction: discord.Interaction) -> bool:
+    if not interaction.guild:
+        return False
+    return interaction.user.guild_permissions.administrator
+
+# ---------- EVENT: ready ----------
+async def sync_command_tree():
+    guild = None
+    if DEV_GUILD_ID:
+        # development: the guild gets its own copy of every command, updated instantly
+        guild = discord.Object(id=DEV_GUILD_ID)
+        bot.tree.copy_global_to(guild=guild)
+    where = f"to guild {DEV_GUILD_ID}" if guild is not None else "globally"
+    try:
+        synced, seconds = await sync_commands(bot.tree, COMMAND_SYNC_FILE, bot.application_id, guild,
+                                              force=COMMAND_SYNC == "always")
+    except Exception as e:
+        print("Warning: command sync:", e)
+        return
+    if synced:
+        startup_seconds["command_sync"] = seconds
+        print(f"Commands synced {where} in {seconds:.2f}s")
+    else:
+        print(f"Commands unchanged since the last sync {where}, not syncing")
+
+@bot.event
+async def on_connect():
+    global connect_started
+    if connect_started is None:
+        connect_started = time.monotonic()
+
+@bot.event
+async def on_ready():
+    # fires again after a reconnect that could not resume; each time measures connect -> ready
+    global connect_started
+    if connect_started is not None:
+        startup_seconds["ready"] = time.monotonic() - connect_started
+        connect_started = None
+        print(f"Bot logged in as {bot.user} ({bot.user.id}), ready {startup_seconds['ready']:.2f}s after connecting")
+    else:
+        print(f"Bot logged in as {bot.user} ({bot.user.id})")
+
+# ---------- EVENT: on_message (triggers) ----------
+@bot.event
+@metrics.timed("on_message")
+async def on_message(message: discord.Message):
+    # ignore bots & DMs
+    if message.author.bot:
+        return
+    guild = message.guild
+    if guild is None:
+        # ignore DMs silently (user requested commands not to work in DMs)
+        return
+
+    if guild.id not in guild_runtimes:
+        # a guild seen for the first time (or again after eviction): its files are read off the loop
+        await storage.load_guild(guild.id, economy=False)
+    rt = get_guild_runtime(guild.id)
+    if message.channel.id not in rt.channels:
+        return  # no channel set, or silent outside designated channels
+
+    # triggers: unified list
+    guild_id = guild.id
+    trig = find_trigger_for_message(rt, message.content)
+    if trig:
+        await storage.load_guild(guild_id)
+        pts = int(trig.get("points", 0))
+        metrics.trigger_hit(guild_id)
+        new_total = change_user_points(guild_id, message.author.id, pts, "trigger")
+        if rt.notify_on_trigger:
+            # queued and merged with other hits; never waits on Discord here
+            notifier.push(message.channel, message.author.id, message.author.mention, pts, new_total)
+        return
+
+    # allow commands processing afterwards
+    await bot.process_commands(message)
+
+# ---------- UTIL: ensure command in guild & channel ----------
+async def ensure_guild_and_channel(interaction: discord.Interaction) -> bool:
+    # returns True if command should proceed
+    if interaction.guild is None:
+        # silently ignore commands in DMs
+        return False
+    guild_id = interaction.guild.id
+    if guild_id not in guild_runtimes:
+        await storage.load_guild(guild_id, economy=False)
+    # no channel set, or command used outside designated channels -> silent ignore
+    if interaction.channel_id not in get_guild_runtime(guild_id).channels:
+        return False
+    # the command reads points next: a cold guild's ledger is replayed off the loop
+    await storage.load_guild(guild_id)
+    return True
+
+# ---------- SLASH COMMANDS ----------
+# /points
+@bot.tree.command(name="points", description="Check your points (server-specific)")
+@metrics.timed("points")
+async def points_cmd(interaction: discord.Interaction):
+    ok = await ensure_guild_and_channel(interaction)
+    if not ok:
+        return
+    pts = get_user_points(interaction.guild.id, interaction.user.id)
+    await interaction.response.send_message(f"{interaction.user.mention}, you have **{pts}** point{'s' if pts!=1 else ''}.", ephemeral=True)
+
+# /daily
+@bot.tree.command(name="daily", description="Claim your daily reward")
+@metrics.timed("daily")
+async def daily_cmd(interaction: discord.Interaction):
+    ok = await ensure_guild_and_channel(interaction)
+    if not ok:
+        return
+    guild_id = interaction.guild.id
+    user_id = interaction.user.id
+    rt = get_guild_runtime(guild_id)
+    reward = rt.daily_reward
+    # check the cooldown, add the reward and record the claim in one step
+    async with transactions.user(guild_id, user_id, "daily") as txn:
+        remain = txn.claim_daily(rt.daily_cooldown_hours)
+        if remain is None:
+            txn.add(reward)
+    if remain is not None:
+        # send ephemeral remaining time
+        hours = int(remain.total_seconds() // 3600)
+        minutes = int((remain.total_seconds() % 3600) // 60)
+        await interaction.response.send_message(f"You must wait {hours}h {minutes}m to claim daily again.", ephemeral=True)
+        return
+    total = txn.balance
+    await interaction.response.send_message(f"🎉 {interaction.user.mention}, you claimed your daily reward of **{reward}** points! Total: **{total}**")
+
+# /gamble <color> <amount>
+@bot.tree.command(name="gamble", description="Gamble on red or black. Subtracts bet first, win doubles the bet.")
+@app_commands.choices(color=[
+    app_commands.Choice(name="red", value="red"),
+    app_commands.Choice(name="black", value="black"),
+])
+@app_commands.describe(color="Pick red or black", amount="Amount to gamble")
+@metrics.timed("gamble")
+async def gamble_cmd(interaction: discord.Interaction, color: app_commands.Choice[str], amount: int):
+    ok = await ensure_guild_and_channel(interaction)
+    if not ok:
+        return
+    if amount <= 0:
+        await interaction.response.send_message("Amount must be positive.", ephemeral=True)
+        return
+    guild_id = interaction.guild.id
+    user_id = interaction.user.id
+    rt = get_guild_runtime(guild_id)
+    # balance check, bet and payout are one transaction: no double-spending
+    async with transactions.user(guild_id, user_id, "gamble") as txn:
+        enough = amount <= txn.balance
+        if enough:
+            # subtract bet immediately
+            txn.add(-amount)
+            # GAMBLE_WIN_CHANCE percent; simulate.py shows what a change does to the economy
+            win = random.random() * 100 < rt.gamble_win_chance
+            payout = amount * 2
+            if win:
+                txn.add(payout)
+    if not enough:
+        await interaction.response.send_message("You don't have enough points to gamble that amount.", ephemeral=True)
+        return
+    total = txn.balance
+    if win:
+        await interaction.response.send_message(
+            f"🎉 **You won!** The color was **{color.value}**. You win **{payout}** points (net +{amount}). Total: **{total}**"
+        )
+    else:
+        await interaction.response.send_message(
+            f"💀 **You lost.** The color was **{color.value}**. You lost **{amount}** points. Total: **{total}**"
+        )
+
+async def display_names(guild, user_ids) -> dict:
+    """{user_id: name} with the `User ID {uid}` fallback for users the bot cannot name"""
+    if LEAN_MEMBERS:
+        found = await member_names.resolve(guild, user_ids)
+    else:
+        found = {uid: m.display_name for uid in user_ids if (m := guild.get_member(uid)) is not None}
+    return {uid: found.get(uid) or f"User ID {uid}" for uid in user_ids}
+
+# /leaderboard
+async def leaderboard_page(guild, page: int, size: int):
+    """(embed, page_count) for one page of the guild's leaderboard, or (None, 0) if it is empty.
+
+    Rendered pages are cached on the board until a balance changes (or the
+    cached member names are LEADERBOARD_CACHE_SECONDS old)."""
+    board = leaderboards.get(guild.id)
+    now = time.monotonic()
+    # checked before counting the members: the cached entry has the page count too
+    cached = board.cached_page((page, size))
+    if cached is not None and now - cached[1] < LEADERBOARD_CACHE_SECONDS:
+        return cached[0], cached[2]
+    total = len(board)
+    if not total:
+        return None, 0
+    pages = (total + size - 1) // size
+    page = min(max(page, 1), pages)
+    key = (page, size)
+    start = (page - 1) * size
+    rows = board.top(size, start)
+    version = board.version
+    names = await display_names(guild, [uid for uid, _ in rows])
+    embed = discord.Embed(title=f"🏆 Leaderboard (Top {len(rows)})" if pages == 1 else f"🏆 Leaderboard (#{start + 1}-{start + len(rows)})",
+                          color=discord.Color.gold())
+    for i, (uid, pts) in enumerate(rows, start=start + 1):
+        embed.add_field(name=f"{i}. {names[uid]}", value=f"{pts} points", inline=False)
+    if pages > 1:
+        embed.set_footer(text=f"Page {page}/{pages} · {total} members")
+    if board.version == version:
+        # not if balances changed while names were fetched: the rows may be stale already
+        board.cache_page(key, (embed, now, pages))
+    return embed, pages
+
+class LeaderboardView(discord.ui.View):
+    """Prev/next buttons under a /leaderboard message; only the member who ran the command can turn pages"""
+
+    def __init__(self, owner_id: int, page: int, size: int, pages: int):
+        super().__init__(timeout=LEADERBOARD_VIEW_SECONDS)
+        self.owner_id = owner_id
+        self.page = page
+        self.size = size
+        self.set_pages(pages)
+
+    def set_pages(self, pages: int):
+        self.pages = pages
+        self.page = min(max(self.page, 1), pages)
+        self.prev_page.disabled = self.page <= 1
+        self.next_page.disabled = self.page >= pages
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("Run /leaderboard to browse the leaderboard yourself.", ephemeral=True)
+            return False
+        return True
+
+    async def turn(self, interaction: discord.Interaction, step: int):
+        self.page += step
+        if LEAN_MEMBERS:
+            # acknowledge the click first: fetching names can outlast Discord's 3s deadline
+            await interaction.response.defer()
+        embed, pages = await leaderboard_page(interaction.guild, self.page, self.size)
+        edit = interaction.edit_original_response if interaction.response.is_done() else interaction.response.edit_message
+        if embed is None:
+            await edit(content="No points yet on this server.", embed=None, view=None)
+            return
+        self.set_pages(pages)
+        await edit(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn(interaction, -1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn(interaction, 1)
+
+@bot.tree.command(name="leaderboard", description="Show server leaderboard (top N per config)")
+@app_commands.describe(top="Users per page (default = config, max 25)", page="Page to open (default 1)")
+@metrics.timed("leaderboard")
+async def leaderboard_cmd(interaction: discord.Interaction, top: Optional[int] = None, page: Optional[int] = None):
+    ok = await ensure_guild_and_channel(interaction)
+    if not ok:
+        return
+    rt = get_guild_runtime(interaction.guild.id)
+    # an embed holds at most 25 fields
+    size = min(int(top) if top and top > 0 else rt.leaderboard_top, LEADERBOARD_PAGE_MAX)
+    if not len(leaderboards.get(interaction.guild.id)):
+        await interaction.response.send_message("No points yet on this server.", ephemeral=True)
+        return
+    if LEAN_MEMBERS:
+        # fetching names can outlast the 3s Discord allows before the first response
+        await interaction.response.defer(thinking=True)
+    embed, pages = await leaderboard_page(interaction.guild, page or 1, max(size, 1))
+    send = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+    if embed is None:
+        await send("No points yet on this server.")
+        return
+    if pages > 1:
+        view = LeaderboardView(interaction.user.id, page or 1, max(size, 1), pages)
+        await send(embed=embed, view=view)
+    else:
+        await send(embed=embed)
+
+# /rank
+@bot.tree.command(name="rank", description="Show your (or a member's) leaderboard position")
+@app_commands.describe(member="Member to look up (default = you)")
+@metrics.timed("rank")
+async def rank_cmd(interaction: discord.Interaction, member: Optional[discord.Member] = None):
+    ok = await ensure_guild_and_channel(interaction)
+    if not ok:
+        return
+    target = member or interaction.user
+    board = leaderboards.get(interaction.guild.id)
+    rows = board.around(target.id, radius=2)
+    if not rows:
+        await interaction.response.send_message(f"{target.mention} has no points yet.", ephemeral=True)
+        return
+    if LEAN_MEMBERS:
+        # fetching names can outlast the 3s Discord allows before the first response
+        await interaction.response.defer(ephemeral=True, thinking=True)
+    names = await display_names(interaction.guild, [uid for _, uid, _ in rows])
+    lines = []
+    for pos, uid, pts in rows:
+        marker = "➡️ " if uid == target.id else ""
+        lines.append(f"{marker}**{pos}.** {names[uid]} — {pts} points")
+    send = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+    await send(f"{target.mention} is ranked **#{board.rank(target.id)}** of {len(board)}.\n" + "\n".join(lines), ephemeral=True)
+
+# /addtrigger (admin)
+@bot.tree.command(name="addtrigger", description="Add a trigger (admin only). Message is case-insensitive substring.")
+@app_commands.choices(mode=[app_commands.Choice(name=m, value=m) for m in TRIGGER_MODES])
+@app_commands.describe(message="Trigger text (substring)", points="Points to add (use negative for removing points)",
+                       mode="substring (default), word = whole word only, regex = regular expression")
+@metrics.timed("addtrigger")
+async def addtrigger_cmd(interaction: discord.Interaction, message: str, points: int, mode: Optional[app_commands.Choice[str]] = None):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    trig = {"message": message, "points": int(points)}
+    if mode is not None and mode.value != MODE_SUBSTRING:
+        if mode.value == MODE_REGEX:
+            try:
+                compile_trigger_regex(message)
+            except re.error as e:
+                await interaction.response.send_message(f"Invalid regex: {e}", ephemeral=True)
+                return
+        trig["mode"] = mode.value
+    cfg = get_guild_config(interaction.guild.id)
+    # replace the list rather than appending, so a background flush never sees it change
+    cfg["TRIGGERS"] = cfg.get("TRIGGERS", []) + [trig]
+    save_guild_config(interaction.guild.id, cfg)
+    await interaction.response.send_message(f"Trigger added: '{message}' → {points} point{'s' if abs(points)!=1 else ''}.", ephemeral=True)
+
+# /removetrigger (admin) - exact message match (case-insensitive)
+@bot.tree.command(name="removetrigger", description="Remove a trigger (admin only) by exact message text.")
+@app_commands.describe(message="Exact trigger text to remove (case-insensitive)")
+@metrics.timed("removetrigger")
+async def removetrigger_cmd(interaction: discord.Interaction, message: str):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    cfg = get_guild_config(interaction.guild.id)
+    before = len(cfg.get("TRIGGERS", []))
+    cfg["TRIGGERS"] = [t for t in cfg.get("TRIGGERS", []) if t.get("message", "").lower() != message.lower()]
+    save_guild_config(interaction.guild.id, cfg)
+    after = len(cfg.get("TRIGGERS", []))
+    if before == after:
+        await interaction.response.send_message("No matching trigger found.", ephemeral=True)
+    else:
+        await interaction.response.send_message(f"Removed trigger matching '{message}'.", ephemeral=True)
+
+# /setchannel (admin)
+@bot.tree.command(name="setchannel", description="Set the channel where the bot will operate (admin only)")
+@app_commands.describe(channel_id="Enter the numeric ID of the channel")
+@metrics.timed("setchannel")
+async def setchannel(interaction: discord.Interaction, channel_id: str):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("❌ Only administrators can use this command.", ephemeral=True)
+        return
+
+    # Validate the channel ID
+    if not channel_id.isdigit():
+        await interaction.response.send_message("❌ Please enter a valid numeric channel ID.", ephemeral=True)
+        return
+
+    channel = interaction.guild.get_channel(int(channel_id))
+    if channel is None:
+        await interaction.response.send_message("❌ Channel not found. Make sure the ID is correct.", ephemeral=True)
+        return
+
+    cfg = get_guild_config(interaction.guild.id)
+    cfg["CHANNEL_ID"] = channel.id
+    cfg["CHANNEL_IDS"] = [channel.id]
+    save_guild_config(interaction.guild.id, cfg)
+
+    await interaction.response.send_message(f"✅ Bot channel set to {channel.mention} for this server.", ephemeral=True)
+
+# /addchannel (admin)
+@bot.tree.command(name="addchannel", description="Allow the bot in another channel (admin only)")
+@app_commands.describe(channel="Channel to add")
+@metrics.timed("addchannel")
+async def addchannel_cmd(interaction: discord.Interaction, channel: discord.TextChannel):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    cfg = get_guild_config(interaction.guild.id)
+    channels = sorted(config_channels(cfg) | {channel.id})
+    cfg["CHANNEL_IDS"] = channels
+    if not cfg.get("CHANNEL_ID"):
+        cfg["CHANNEL_ID"] = channel.id
+    save_guild_config(interaction.guild.id, cfg)
+    await interaction.response.send_message(f"✅ Bot now also works in {channel.mention} ({len(channels)} channel{'s' if len(channels)!=1 else ''}).", ephemeral=True)
+
+# /removechannel (admin)
+@bot.tree.command(name="removechannel", description="Stop the bot working in a channel (admin only)")
+@app_commands.describe(channel="Channel to remove")
+@metrics.timed("removechannel")
+async def removechannel_cmd(interaction: discord.Interaction, channel: discord.TextChannel):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    cfg = get_guild_config(interaction.guild.id)
+    current = config_channels(cfg)
+    if channel.id not in current:
+        await interaction.response.send_message("That channel is not enabled.", ephemeral=True)
+        return
+    channels = sorted(current - {channel.id})
+    cfg["CHANNEL_IDS"] = channels
+    cfg["CHANNEL_ID"] = channels[0] if channels else None
+    save_guild_config(interaction.guild.id, cfg)
+    await interaction.response.send_message(f"Removed {channel.mention} from the bot channels.", ephemeral=True)
+
+# /setconfig (admin) for numeric options
+@bot.tree.command(name="setconfig", description="Set numeric configuration option (admin only)")
+@app_commands.describe(option="Option name (DAILY_REWARD, DAILY_COOLDOWN_HOURS, GAMBLE_WIN_CHANCE, LEADERBOARD_TOP)", value="Integer value")
+@metrics.timed("setconfig")
+async def setconfig_cmd(interaction: discord.Interaction, option: str, value: int):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    opt = option.strip().upper()
+    allowed = ("DAILY_REWARD", "DAILY_COOLDOWN_HOURS", "GAMBLE_WIN_CHANCE", "LEADERBOARD_TOP")
+    if opt not in allowed:
+        await interaction.response.send_message(f"Allowed options: {', '.join(allowed)}", ephemeral=True)
+        return
+    if opt == "GAMBLE_WIN_CHANCE" and not 0 <= value <= 100:
+        await interaction.response.send_message("GAMBLE_WIN_CHANCE is a percentage (0-100).", ephemeral=True)
+        return
+    cfg = get_guild_config(interaction.guild.id)
+    cfg[opt] = int(value)
+    save_guild_config(interaction.guild.id, cfg)
+    await interaction.response.send_message(f"Set {opt} = {value} for this server.", ephemeral=True)
+
+# /currentconfig (admin)
+@bot.tree.command(name="currentconfig", description="Show current server configuration (admin only)")
+@metrics.timed("currentconfig")
+async def currentconfig_cmd(interaction: discord.Interaction):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    cfg = get_guild_config(interaction.guild.id)
+    lines = [
+        f"CHANNEL_IDS: {', '.join(str(c) for c in sorted(config_channels(cfg))) or None}",
+        f"DAILY_REWARD: {cfg.get('DAILY_REWARD')}",
+        f"DAILY_COOLDOWN_HOURS: {cfg.get('DAILY_COOLDOWN_HOURS')}",
+        f"GAMBLE_WIN_CHANCE: {cfg.get('GAMBLE_WIN_CHANCE')}",
+        f"LEADERBOARD_TOP: {cfg.get('LEADERBOARD_TOP')}",
+        "TRIGGERS:"
+    ]
+    for t in cfg.get("TRIGGERS", []):
+        mode = f" ({t['mode']})" if t.get("mode", MODE_SUBSTRING) != MODE_SUBSTRING else ""
+        lines.append(f"  • '{t.get('message')}'{mode} -> {t.get('points')}")
+    await interaction.response.send_message("```\n" + "\n".join(lines) + "\n```", ephemeral=True)
+
+# /reset (admin)
+@bot.tree.command(name="reset", description="Reset a user's points for this server (admin only)")
+@app_commands.describe(member="Member to reset")
+@metrics.timed("reset")
+async def reset_cmd(interaction: discord.Interaction, member: discord.Member):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    set_user_points(interaction.guild.id, member.id, 0, "reset")
+    await interaction.response.send_message(f"{member.mention}'s points have been reset to 0.", ephemeral=True)
+
+# /seasonreset (admin) - everyone back to 0, final standings attached as CSV
+@bot.tree.command(name="seasonreset", description="Reset every member's points on this server (admin only)")
+@app_commands.describe(confirm="Type RESET to confirm")
+@metrics.timed("seasonreset")
+async def seasonreset_cmd(interaction: discord.Interaction, confirm: str):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    if confirm != "RESET":
+        await interaction.response.send_message("Nothing changed. Type RESET in the confirm option to reset the season.", ephemeral=True)
+        return
+    guild_id = interaction.guild.id
+    if guild_id in bulk_touched:
+        await interaction.response.send_message(BULK_BUSY, ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    standings = await asyncio.to_thread(render_csv, storage.guild_points(guild_id))
+    progress = Progress(lambda text: interaction.edit_original_response(content=text), "Resetting season")
+    changed = await run_bulk(guild_id, lambda uid, pts: 0 if pts else None, "season", progress)
+    if changed is None:
+        await interaction.edit_original_response(content=BULK_BUSY)
+        return
+    await interaction.edit_original_response(
+        content=f"Season reset: {changed} balance{'s' if changed!=1 else ''} set to 0. Final standings attached.",
+        attachments=[discord.File(io.BytesIO(standings), filename=f"season-{guild_id}.csv")])
+
+# /decay (admin) - take a percentage off every balance
+@bot.tree.command(name="decay", description="Reduce every member's points by a percentage (admin only)")
+@app_commands.describe(percent="Percent to remove from each balance (1-100, rounded down)")
+@metrics.timed("decay")
+async def decay_cmd(interaction: discord.Interaction, percent: int):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    if not 1 <= percent <= 100:
+        await interaction.response.send_message("Percent must be between 1 and 100.", ephemeral=True)
+        return
+    guild_id = interaction.guild.id
+    if guild_id in bulk_touched:
+        await interaction.response.send_message(BULK_BUSY, ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    def decayed(uid, pts):
+        new = pts - pts * percent // 100
+        return new if new != pts else None
+
+    progress = Progress(lambda text: interaction.edit_original_response(content=text), f"Applying {percent}% decay")
+    changed = await run_bulk(guild_id, decayed, "decay", progress)
+    if changed is None:
+        await interaction.edit_original_response(content=BULK_BUSY)
+        return
+    await interaction.edit_original_response(content=f"Applied {percent}% decay to {changed} balance{'s' if changed!=1 else ''}.")
+
+# /exportpoints (admin)
+@bot.tree.command(name="exportpoints", description="Download this server's balances as CSV (admin only)")
+@metrics.timed("exportpoints")
+async def exportpoints_cmd(interaction: discord.Interaction):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    items = storage.guild_points(interaction.guild.id)
+    if not items:
+        await interaction.response.send_message("No points yet on this server.", ephemeral=True)
+        return
+    data = await asyncio.to_thread(render_csv, items)
+    await interaction.response.send_message(f"Balances for {len(items)} member{'s' if len(items)!=1 else ''}.",
+                                            file=discord.File(io.BytesIO(data), filename=f"points-{interaction.guild.id}.csv"), ephemeral=True)
+
+# /importpoints (admin) - set the balances listed in a CSV, all or nothing
+@bot.tree.command(name="importpoints", description="Set balances from a CSV of user_id,points (admin only)")
+@app_commands.describe(file="CSV with user_id,points rows, e.g. from /exportpoints. Unlisted members keep their points.")
+@metrics.timed("importpoints")
+async def importpoints_cmd(interaction: discord.Interaction, file: discord.Attachment):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    if file.size > IMPORT_MAX_BYTES:
+        await interaction.response.send_message(f"File too large (max {IMPORT_MAX_BYTES // 1_000_000} MB).", ephemeral=True)
+        return
+    guild_id = interaction.guild.id
+    if guild_id in bulk_touched:
+        await interaction.response.send_message(BULK_BUSY, ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        rows, errors = await asyncio.to_thread(parse_csv, await file.read())
+        if errors:
+            await interaction.edit_original_response(content="Import aborted, nothing changed:\n```\n" + "\n".join(errors) + "\n```")
+            return
+        if not rows:
+            await interaction.edit_original_response(content="The file has no balances to import.")
+            return
+        imported = dict(rows)
+        progress = Progress(lambda text: interaction.edit_original_response(content=text), "Importing")
+        changed = await run_bulk(guild_id, lambda uid, pts: imported.get(uid), "import", progress, include=imported)
+    except Exception as e:
+        # deferred already: without an edit the admin is left with "thinking..." for good
+        print("Warning: importpoints:", e)
+        await interaction.edit_original_response(content=f"Import failed, nothing changed: {e}")
+        return
+    if changed is None:
+        await interaction.edit_original_response(content=BULK_BUSY)
+        return
+    await interaction.edit_original_response(content=f"Imported {changed} balance{'s' if changed!=1 else ''}.")
+
+# /history (admin) - ledger audit trail for one member
+@bot.tree.command(name="history", description="Show a member's recent points changes (admin only)")
+@app_commands.describe(member="Member to inspect", limit="How many changes to show (default 15)")
+@metrics.timed("history")
+async def history_cmd(interaction: discord.Interaction, member: discord.Member, limit: Optional[int] = None):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    count = min(max(int(limit or 15), 1), 50)
+    await storage.flush()
+    records = await asyncio.to_thread(storage.history, interaction.guild.id, member.id, count)
+    if not records:
+        await interaction.response.send_message(f"No recorded changes for {member.mention}.", ephemeral=True)
+        return
+    lines = []
+    for rec in records:
+        when = datetime.utcfromtimestamp(rec["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+        if rec.get("op") == "points":
+            lines.append(f"{when}  {rec['r']:<8} {rec['d']:+d} -> {rec['v']}")
+        else:
+            lines.append(f"{when}  daily claim")
+    await interaction.response.send_message(f"Recent changes for {member.mention} (newest first):\n```\n" + "\n".join(lines) + "\n```", ephemeral=True)
+
+# /stalls (admin) - where the event loop got stuck (STALL_THRESHOLD_MS)
+@bot.tree.command(name="stalls", description="Show where the event loop stalled, by call site (admin only)")
+@app_commands.describe(stacks="Include the stack of each call site's worst stall", reset="Clear the report after showing it")
+@metrics.timed("stalls")
+async def stalls_cmd(interaction: discord.Interaction, stacks: Optional[bool] = None, reset: Optional[bool] = None):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+    if stall_watchdog is None:
+        await interaction.response.send_message("The stall watchdog is off. Start the bot with STALL_THRESHOLD_MS set (e.g. 100).", ephemeral=True)
+        return
+    report = stall_watchdog.report(stacks=bool(stacks))
+    if reset:
+        stall_watchdog.reset()
+    if len(report) > 1900:
+        await interaction.response.send_message("Stall report attached.", ephemeral=True,
+                                                file=discord.File(io.BytesIO(report.encode("utf-8")), filename="stalls.txt"))
+    else:
+        await interaction.response.send_message(f"```\n{report}\n```", ephemeral=True)
+
+# /selftest (admin) -> DM the results
+@bot.tree.command(name="selftest", description="Run a self-test (admin only). Results are sent via DM.")
+@metrics.timed("selftest")
+async def selftest_cmd(interaction: discord.Interaction):
+    if interaction.guild is None:
+        return
+    if not is_admin(interaction):
+        await interaction.response.send_message("Administrator only.", ephemeral=True)
+        return
+
+    # Prepare report
+    guild_id = interaction.guild.id
+    cfg = get_guild_config(guild_id)
+    report_lines = []
+    report_lines.append(f"Self-test for server: {interaction.guild.name} (ID: {guild_id})")
+    # 1) Channel set?
+    channels = sorted(config_channels(cfg))
+    if not channels:
+        report_lines.append("❌ Channel not configured. Set a channel with /setchannel <channel_id> to enable bot features.")
+    else:
+        report_lines.append(f"✅ Channel set: {', '.join(f'<#{c}>' for c in channels)}")
+    # 2) storage files readable
+    for name, err in await asyncio.to_thread(storage.selfcheck):
+        if err is None:
+            report_lines.append(f"✅ {name} loaded OK")
+        else:
+            report_lines.append(f"❌ {name} load error: {err}")
+    # 3) Triggers sanity
+    tcount = len(cfg.get("TRIGGERS", []))
+    report_lines.append(f"✅ Triggers count: {tcount}")
+    ns = notifier.stats()
+    report_lines.append(f"✅ Notification queue: depth {ns['depth']}, sent {ns['sent']}, merged {ns['merged']}, dropped {ns['dropped']}, send errors {ns['send_errors']}")
+    # 4) Points persistence test
+    uid = interaction.user.id
+    try:
+        prev = get_user_points(guild_id, uid)
+        change_user_points(guild_id, uid, 1, "selftest")
+        if get_user_points(guild_id, uid) == prev + 1:
+            # revert
+            set_user_points(guild_id, uid, prev, "selftest")
+            report_lines.append("✅ Points save/load test: OK")
+        else:
+            report_lines.append("❌ Points save/load test: mismatch")
+    except Exception as e:
+        report_lines.append(f"❌ Points test error: {e}")
+    # 5) Daily logic test (simulate)
+    try:
+        ok, rem = can_claim_daily(guild_id, uid)
+        report_lines.append(f"✅ Daily cooldown check ran (can_claim={ok})")
+    except Exception as e:
+        report_lines.append(f"❌ Daily test error: {e}")
+    # 6) Gamble logic test (simulate subtract/add)
+    try:
+        cur = get_user_points(guild_id, uid)
+        # Give test funds
+        set_user_points(guild_id, uid, max(cur, 5), "selftest")
+        before = get_user_points(guild_id, uid)
+        # simulate gamble subtract-then-win
+        change_user_points(guild_id, uid, -1, "selftest")
+        change_user_points(guild_id, uid, 2, "selftest")  # payout double
+        after = get_user_points(guild_id, uid)
+        if after == before + 1:
+            report_lines.append("✅ Gamble logic simulation OK")
+        else:
+            report_lines.append("❌ Gamble logic simulation mismatch")
+        # revert to original
+        set_user_points(guild_id, uid, cur, "selftest")
+    except Exception as e:
+        report_lines.append(f"❌ Gamble test error: {e}")
+
+    # Send report via DM to the admin who triggered the test
+    report = "\n".join(report_lines)
+    try:
+        await interaction.user.send(f"Self-test results:\n\n{report}")
+        await interaction.response.send_message("Self-test completed — report DM'd to you.", ephemeral=True)
+    except Exception as e:
+        # if DM blocked, inform ephemeral
+        await interaction.response.send_message(f"Self-test completed but I couldn't DM you (error: {e}).", ephemeral=True)
+
+# ---------- START ----------
+if __name__ == "__main__":
+    TOKEN = os.getenv("DISCORD_TOKEN")
+    if not TOKEN:
+        print("ERROR: DISCORD_TOKEN environment variable not set.")
+        raise SystemExit(1)
+    bot.run(TOKEN)
+
@@ -0,0 +1,78 @@
+# bulk.py
+# Helpers for the guild-wide admin commands (/seasonreset, /decay,
+# /exportpoints, /importpoints): chunked work that yields to the event loop,
+# throttled progress messages, and the CSV format.
+import csv
+import io
+import time
+
+BULK_CHUNK = 5000          # balances handled between yields to the event loop
+SQLITE_BULK_CHUNK = 500    # rows a closing SQLite bulk writes between yields (under SQLite's 999 parameters)
+PROGRESS_SECONDS = 1.5     # min delay between progress message edits
+CSV_HEADER = ("user_id", "points")
+INT64_MAX = 2**63 - 1      # largest value the array('q') tables and SQLite INTEGER hold
+
+class Progress:
+    """Calls `send(text)` with "label: done/total" at most every `seconds`"""
+
+    def __init__(self, send, label: str, seconds: float = PROGRESS_SECONDS):
+        self.send = send
+        self.label = label
+        self.seconds = seconds
+        self._last = time.monotonic()
+
+    async def __call__(self, done: int, total: int):
+        now = time.monotonic()
+        if now - self._last < self.seconds:
+            return
+        self._last = now
+        try:
+            await self.send(f"{self.label}: {done}/{total} ({done * 100 // max(total, 1)}%)")
+        except Exception as e:
+            # progress is cosmetic; never fail the operation over it
+            print("Warning: progress update:", e)
+
+def render_csv(items) -> bytes:
+    """CSV of (user_id, points) rows, highest balance first"""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(CSV_HEADER)
+    writer.writerows(sorted(items, key=lambda x: (-x[1], x[0])))
+    return out.getvalue().encode("utf-8")
+
+def parse_whole(text: str):
+    """The int for ASCII digits within int64, else None (str.isdigit() also takes "²")"""
+    if not text or not text.isascii() or not text.isdecimal():
+        return None
+    value = int(text)
+    return value if value <= INT64_MAX else None
+
+def parse_csv(data: bytes, max_errors: int = 10):
+    """([(user_id, points), ...], [error, ...]) from CSV text as written by render_csv.
+
+    A header line is optional; a user listed twice keeps the last value."""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return [], ["file is not UTF-8 text"]
+    rows = {}
+    errors = []
+    for line_no, fields in enumerate(csv.reader(io.StringIO(text)), start=1):
+        if not fields or not "".join(fields).strip():
+            continue
+        if line_no == 1 and not fields[0].strip().isdecimal():
+            continue  # header
+        if len(fields) < 2:
+            errors.append(f"line {line_no}: expected user_id,points")
+        else:
+            uid, pts = parse_whole(fields[0].strip()), parse_whole(fields[1].strip())
+            if uid is None:
+                errors.append(f"line {line_no}: bad user id {fields[0].strip()!r}")
+            elif pts is None:
+                errors.append(f"line {line_no}: points must be a whole number from 0 to {INT64_MAX}, got {fields[1].strip()!r}")
+            else:
+                rows[uid] = pts
+        if len(errors) >= max_errors:
+            errors.append("(stopped after too many errors)")
+            break
+    return list(rows.items()), errors
@@ -0,0 +1,627 @@
+# cluster.py
+# Clustered mode: one storage-owner process holds the real backend (JSON or
+# SQLite) and several worker processes each run a subset of the bot's shards,
+# talking to the owner over a local authenticated socket.
+#
+#   python cluster.py run --workers 2 --shards 4        (needs DISCORD_TOKEN)
+#   python cluster.py simulate --workers 2 --shards 4   (no Discord needed)
+#
+# A guild always lives on one shard ((guild_id >> 22) % shard_count), so its
+# leaderboard, compiled config and transaction locks stay local to one worker;
+# only storage calls cross the process boundary.
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing.connection import Client, Listener
+
+from storage import Storage, WriteBehind, open_storage
+
+DEFAULT_ADDRESS = "127.0.0.1:47600"
+
+def parse_address(text: str):
+    """("host", port) from "host:port" (a bare path is a Unix socket)"""
+    host, sep, port = text.rpartition(":")
+    if not sep:
+        return text
+    return host, int(port)
+
+def format_address(address) -> str:
+    if isinstance(address, tuple):
+        return f"{address[0]}:{address[1]}"
+    return address
+
+def no_delay(conn):
+    """Send small messages at once: writes are sent without waiting for a
+    reply, so Nagle's algorithm would hold the next request back until the
+    other side's delayed ACK"""
+    try:
+        sock = socket.socket(fileno=os.dup(conn.fileno()))
+    except OSError:
+        return
+    with sock:
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """The shard Discord delivers a guild's events on"""
+    return (guild_id >> 22) % shard_count
+
+def worker_shards(worker: int, workers: int, shard_count: int) -> list:
+    return [s for s in range(shard_count) if s % workers == worker]
+
+# ---------- STORAGE OWNER ----------
+class StorageServer:
+    """Serves a Storage to worker processes.
+
+    Each connection gets a thread that receives `("call", request_id, name,
+    args)` requests and schedules them on the owner's event loop without
+    waiting, so a worker can keep several calls in flight.  The backend is
+    only ever touched from the loop's thread (as in the single-process bot),
+    calls from one connection run in the order they were sent, and the
+    write-behind task keeps flushing.  A request id of None means the worker
+    does not wait for the result: only a failure is reported back."""
+
+    # Storage methods workers may call; blocking ones run in a thread
+    METHODS = frozenset(("get_config", "set_config", "configs", "get_points", "set_points", "get_daily",
+                         "set_daily", "commit_user", "change_points", "apply_bulk", "guild_points",
+                         "history", "selfcheck", "memory_stats", "flush"))
+    BLOCKING = frozenset(("history", "selfcheck"))
+
+    def __init__(self, storage: Storage, address, authkey: bytes):
+        self.storage = storage
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.calls = 0
+        self._loop = None
+        self._stopped = None
+
+    async def serve(self):
+        """Accept workers until one of them asks for a shutdown"""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        threading.Thread(target=self._accept, name="storage-accept", daemon=True).start()
+        await self._stopped.wait()
+        self.listener.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return  # listener closed
+            except Exception as e:
+                print("Warning: storage connection refused:", e)
+                continue
+            no_delay(conn)
+            threading.Thread(target=self._handle, args=(conn,), name="storage-conn", daemon=True).start()
+
+    def _handle(self, conn):
+        send_lock = threading.Lock()
+
+        def reply(request_id, future):
+            try:
+                message = (request_id, "ok", future.result())
+            except Exception as e:
+                message = (request_id, "error", f"{type(e).__name__}: {e}")
+            if request_id is None and message[1] == "ok":
+                return
+            with send_lock:
+                try:
+                    conn.send(message)
+                except OSError:
+                    pass  # the worker is gone
+
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if request[0] == "shutdown":
+                    # scheduled like a call, so everything sent before it has been applied
+                    future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+                    future.result()
+                    reply(request[1], future)
+                    return
+                _, request_id, name, args = request
+                future = asyncio.run_coroutine_threadsafe(self._call(name, args), self._loop)
+                future.add_done_callback(lambda f, rid=request_id: reply(rid, f))
+
+    async def _shutdown(self):
+        self._stopped.set()
+
+    async def _call(self, name: str, args: tuple):
+        if name not in self.METHODS:
+            raise ValueError(f"unknown storage call {name!r}")
+        self.calls += 1
+        if name == "flush":
+            await self.storage.flush()
+            return None
+        method = getattr(self.storage, name)
+        if name in self.BLOCKING:
+            return await asyncio.to_thread(method, *args)
+        result = method(*args)
+        return list(result) if name == "configs" else result
+
+def run_storage_owner(env: dict, ready):
+    """Process entry point: open the configured backend and serve it"""
+    os.environ.update(env)
+    backend = os.getenv("STORAGE_BACKEND", "json")
+    if backend == "remote":
+        raise SystemExit("the storage owner needs a local STORAGE_BACKEND (json, partitioned or sqlite)")
+    # the same settings and defaults as bot.py, without importing the bot
+    storage = open_storage(backend, cache_size=int(os.getenv("PARTITION_CACHE_SIZE", "256")),
+                           idle_seconds=float(os.getenv("PARTITION_IDLE_SECONDS", "900")),
+                           compact_after=int(os.getenv("LEDGER_COMPACT_RECORDS", "50000")),
+                           archive=os.getenv("LEDGER_ARCHIVE", "1") == "1")
+    writer = WriteBehind(storage.stores, interval=float(os.getenv("FLUSH_INTERVAL_SECONDS", "1")),
+                         max_dirty=int(os.getenv("FLUSH_MAX_DIRTY", "1000")))
+
+    async def main():
+        server = StorageServer(storage, parse_address(env["STORAGE_ADDRESS"]), bytes.fromhex(env["STORAGE_AUTHKEY"]))
+        ready.send(format_address(server.address))
+        writer.start()
+        try:
+            await server.serve()
+        finally:
+            await writer.close()
+            await storage.close()
+            print(f"storage owner: served {server.calls} calls")
+
+    asyncio.run(main())
+
+# ---------- WORKERS ----------
+class CachedGuild:
+    __slots__ = ("config", "points", "daily", "complete")
+
+    def __init__(self, config):
+        self.config = config
+        self.points = {}        # user_id -> balance, for users looked up or written here
+        self.daily = {}         # user_id -> last claim (None cached too)
+        self.complete = False   # points holds every user of the guild
+
+class RemoteStorage(Storage):
+    """Storage backed by a StorageServer in another process.
+
+    A guild only ever lives on one worker, so the worker keeps what it has
+    read of its guilds (config, balances, daily claims) and answers reads
+    from there; only the first read of a user is a round trip.  Writes update
+    that copy and are sent without waiting for the owner, in order, on the
+    one connection; the owner buffers and flushes them.  Balance changes are
+    sent as deltas (change_points) so the owner's total stays right even if
+    another client wrote in between.  At most `cache_size` guilds are kept,
+    least recently used first out, with on_evict as for the other lazy
+    backends.
+
+    Reads that miss the cache block the event loop until the owner answers,
+    so they give up after `timeout` seconds with a TimeoutError; until the
+    owner answers anything again, later reads fail at once instead of each
+    waiting out the timeout."""
+
+    def __init__(self, address, authkey: bytes, cache_size: int = 256, timeout: float = 5.0):
+        self.path = format_address(address)
+        self.conn = Client(address, authkey=authkey)
+        no_delay(self.conn)
+        self.cache_size = max(1, cache_size)
+        self.timeout = timeout
+        self.guilds = OrderedDict()     # guild_id -> CachedGuild
+        self.calls = 0                  # round trips waited for
+        self.posted = 0                 # writes sent without waiting
+        self.errors = 0                 # posted writes the owner failed
+        self.timeouts = 0               # round trips given up on
+        self.unresponsive = False       # a round trip timed out and nothing came back since
+        self.owner_stats = {}           # the owner's memory_stats, fetched in the background
+        self._stats = None              # Future of the memory_stats request in flight
+        self._send_lock = threading.Lock()
+        self._waiting = {}              # request id -> Future
+        self._ids = itertools.count(1)
+        self._reader = threading.Thread(target=self._read, name="storage-client", daemon=True)
+        self._reader.start()
+
+    # ----- protocol -----
+    def _send(self, name: str, args: tuple) -> Future:
+        future = Future()
+        with self._send_lock:
+            request_id = future.request_id = next(self._ids)
+            self._waiting[request_id] = future
+            self.calls += 1
+            self.conn.send(("call", request_id, name, args))
+        return future
+
+    def _call(self, name: str, *args):
+        if self.unresponsive:
+            raise TimeoutError(f"storage owner {self.path} is not answering")
+        future = self._send(name, args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # a late answer finds no future and is dropped
+            self._waiting.pop(future.request_id, None)
+            self.timeouts += 1
+            self.unresponsive = True
+            raise TimeoutError(f"storage owner {self.path} did not answer {name} within {self.timeout}s") from None
+
+    def _post(self, name: str, *args):
+        with self._send_lock:
+            self.posted += 1
+            self.conn.send(("call", None, name, args))
+
+    def _read(self):
+        while True:
+            try:
+                request_id, status, value = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            self.unresponsive = False
+            if request_id is None:
+                # a posted write failed; the owner's copy may now differ from ours
+                self.errors += 1
+                print("Warning: storage owner:", value)
+                continue
+            future = self._waiting.pop(request_id, None)
+            if future is None:
+                continue
+            if status == "ok":
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(f"storage owner: {value}"))
+        for future in list(self._waiting.values()):
+            future.set_exception(ConnectionError("storage owner connection closed"))
+        self._waiting.clear()
+
+    # ----- worker cache -----
+    def _guild(self, guild_id: int) -> CachedGuild:
+        guild = self.guilds.get(guild_id)
+        if guild is not None:
+            self.guilds.move_to_end(guild_id)
+            return guild
+        guild = self.guilds[guild_id] = CachedGuild(self._call("get_config", guild_id))
+        while len(self.guilds) > self.cache_size:
+            old_id, _ = self.guilds.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(old_id)
+        return guild
+
+    def get_config(self, guild_id: int):
+        return self._guild(guild_id).config
+
+    def set_config(self, guild_id: int, cfg: dict):
+        # waited for: config changes are rare and other clients should see them at once
+        self._call("set_config", guild_id, cfg)
+        self._guild(guild_id).config = cfg
+
+    def configs(self):
+        return self._call("configs")
+
+    def get_points(self, guild_id: int, user_id: int) -> int:
+        guild = self._guild(guild_id)
+        points = guild.points.get(user_id)
+        if points is None:
+            points = 0 if guild.complete else self._call("get_points", guild_id, user_id)
+            guild.points[user_id] = points
+        return points
+
+    def set_points(self, guild_id: int, user_id: int, value: int, reason: str):
+        self._guild(guild_id).points[user_id] = value
+        self._post("set_points", guild_id, user_id, value, reason)
+
+    def get_daily(self, guild_id: int, user_id: int):
+        guild = self._guild(guild_id)
+        if user_id not in guild.daily:
+            guild.daily[user_id] = self._call("get_daily", guild_id, user_id)
+        return guild.daily[user_id]
+
+    def set_daily(self, guild_id: int, user_id: int, epoch: int):
+        self._guild(guild_id).daily[user_id] = epoch
+        self._post("set_daily", guild_id, user_id, epoch)
+
+    def commit_user(self, guild_id: int, user_id: int, points, daily, reason: str):
+        guild = self._guild(guild_id)
+        if points is not None:
+            guild.points[user_id] = points
+        if daily is not None:
+            guild.daily[user_id] = daily
+        self._post("commit_user", guild_id, user_id, points, daily, reason)
+
+    def change_points(self, guild_id: int, user_id: int, delta: int, reason: str, claim=None) -> int:
+        guild = self._guild(guild_id)
+        if claim is not None:
+            guild.daily[user_id] = claim
+        points = guild.points.get(user_id)
+        if points is None and not guild.complete:
+            # first sight of this user: the owner applies the delta and returns the total
+            points = guild.points[user_id] = self._call("change_points", guild_id, user_id, delta, reason, claim)
+            return points
+        points = guild.points[user_id] = max(0, (points or 0) + int(delta))
+        self._post("change_points", guild_id, user_id, delta, reason, claim)
+        return points
+
+    def apply_bulk(self, guild_id: int, rows, reason: str):
+        rows = list(rows)
+        self._guild(guild_id).points.update(rows)
+        self._post("apply_bulk", guild_id, rows, reason)
+
+    def guild_points(self, guild_id: int) -> list:
+        guild = self._guild(guild_id)
+        if not guild.complete:
+            rows = self._call("guild_points", guild_id)
+            # writes made here are already on their way, so the owner's rows include them
+            guild.points.update(rows)
+            guild.complete = True
+        return list(guild.points.items())
+
+    def history(self, guild_id: int, user_id: int, limit: int) -> list:
+        return self._call("history", guild_id, user_id, limit)
+
+    def selfcheck(self) -> list:
+        checks = [("storage owner", None)]
+        try:
+            checks += self._call("selfcheck")
+        except Exception as e:
+            checks[0] = ("storage owner", str(e))
+        return checks
+
+    def memory_stats(self) -> dict:
+        # scraped from the event loop: report the owner's last answer and ask
+        # again in the background rather than wait for a round trip here
+        if self._stats is not None and self._stats.done():
+            if self._stats.exception() is None:
+                self.owner_stats = self._stats.result()
+            self._stats = None
+        if self._stats is None and not self.unresponsive:
+            self._stats = self._send("memory_stats", ())
+        stats = dict(self.owner_stats)
+        stats.update({"remote_guilds": len(self.guilds), "remote_calls": self.calls, "remote_posted": self.posted,
+                      "remote_errors": self.errors, "remote_timeouts": self.timeouts})
+        return stats
+
+    async def flush(self):
+        # writes already sit with the owner; this asks it to persist them now
+        await asyncio.wrap_future(self._send("flush", ()))
+
+    def flush_sync(self):
+        pass
+
+    async def close(self):
+        try:
+            await self.flush()
+        finally:
+            self.conn.close()
+
+    def shutdown_owner(self):
+        """Ask the owner process to flush, close its backend and exit"""
+        future = Future()
+        with self._send_lock:
+            request_id = next(self._ids)
+            self._waiting[request_id] = future
+            self.conn.send(("shutdown", request_id))
+        future.result()
+        self.conn.close()
+
+def run_worker(env: dict, gateway=None):
+    """Process entry point: run the bot for the shards listed in env["SHARD_IDS"]"""
+    os.environ.update(env)
+    import bot as bot_module
+    if gateway is None:
+        bot_module.bot.run(env["DISCORD_TOKEN"])
+    else:
+        asyncio.run(simulated_worker(bot_module, gateway))
+
+# ---------- SIMULATED GATEWAY ----------
+# The parent plays Discord: it routes each event to the worker running the
+# guild's shard, in batches over a pipe.  Workers feed the events to the real
+# handlers with the fakes from benchmarks/fakes.py.
+
+async def simulated_worker(bot_module, gateway):
+    from benchmarks.fakes import FakeChannel, FakeGuild, FakeInteraction, FakeMessage, FakeUser
+
+    bot_module.bot._connection.user = FakeUser(1, name="bot", bot=True)
+    bot_module.writer.start()
+    guilds = {}
+    handled = 0
+    busy = 0.0
+
+    def objects(guild_id, channel_id, user_id):
+        guild = guilds.get(guild_id)
+        if guild is None:
+            guild = guilds[guild_id] = FakeGuild(guild_id)
+        channel = guild.get_channel(channel_id) or guild.add_channel(FakeChannel(channel_id))
+        user = guild.get_member(user_id) or guild.add_member(FakeUser(user_id))
+        return guild, channel, user
+
+    while True:
+        batch = await asyncio.to_thread(gateway.recv)
+        if batch is None:
+            break
+        start = time.perf_counter()
+        for kind, guild_id, channel_id, user_id, content in batch:
+            guild, channel, user = objects(guild_id, channel_id, user_id)
+            if kind == "message":
+                await bot_module.on_message(FakeMessage(bot_module.bot._connection, guild, channel, user, content))
+            elif kind == "daily":
+                await bot_module.daily_cmd.callback(FakeInteraction(guild, channel, user))
+            else:
+                await bot_module.points_cmd.callback(FakeInteraction(guild, channel, user))
+            handled += 1
+            # let the notifier run, as the gateway would
+            await asyncio.sleep(0)
+        busy += time.perf_counter() - start
+    await bot_module.notifier.close()
+    await bot_module.writer.close()
+    await bot_module.storage.close()
+    gateway.send({"shards": os.environ["SHARD_IDS"], "events": handled, "guilds": len(guilds),
+                  "busy_seconds": round(busy, 3), "storage_calls": bot_module.storage.calls,
+                  "storage_posted": bot_module.storage.posted, "storage_errors": bot_module.storage.errors})
+
+def simulate(args, base_env: dict):
+    ctx = multiprocessing.get_context("spawn")
+    rng = random.Random(args.seed)
+    owner_env = dict(base_env, STORAGE_ADDRESS="127.0.0.1:0")
+    ready_recv, ready_send = ctx.Pipe(duplex=False)
+    owner = ctx.Process(target=run_storage_owner, args=(owner_env, ready_send), name="storage-owner")
+    owner.start()
+    address = ready_recv.recv()
+    authkey = bytes.fromhex(base_env["STORAGE_AUTHKEY"])
+    client = RemoteStorage(parse_address(address), authkey)
+    print(f"storage owner ({base_env['STORAGE_BACKEND']}) listening on {address}")
+
+    # guilds with snowflake-like ids, so they spread over the shards
+    daily_reward = 10
+    guilds = []
+    for g in range(args.guilds):
+        guild_id = (rng.getrandbits(41) << 22) | g
+        channel_id = guild_id + 1
+        triggers = [{"message": f"trig{t}x", "points": rng.randint(1, 10)} for t in range(args.triggers)]
+        client.set_config(guild_id, {"CHANNEL_ID": channel_id, "CHANNEL_IDS": [channel_id],
+                                     "DAILY_REWARD": daily_reward, "NOTIFY_ON_TRIGGER": True, "TRIGGERS": triggers})
+        users = [guild_id + 1000 + u for u in range(args.users)]
+        guilds.append((guild_id, channel_id, users, triggers))
+
+    workers = []
+    for w in range(args.workers):
+        shards = worker_shards(w, args.workers, args.shards)
+        env = dict(base_env, STORAGE_BACKEND="remote", STORAGE_ADDRESS=address,
+                   SHARD_COUNT=str(args.shards), SHARD_IDS=",".join(map(str, shards)))
+        parent_end, child_end = ctx.Pipe()
+        proc = ctx.Process(target=run_worker, args=(env, child_end), name=f"worker-{w}")
+        proc.start()
+        workers.append((proc, parent_end))
+    shard_owner = {s: w for w in range(args.workers) for s in worker_shards(w, args.workers, args.shards)}
+
+    # expected balances, checked against the owner afterwards
+    expected = {}
+    claimed = set()
+    batches = [[] for _ in workers]
+    start = time.perf_counter()
+    for _ in range(args.events):
+        guild_id, channel_id, users, triggers = rng.choice(guilds)
+        user_id = rng.choice(users)
+        key = (guild_id, user_id)
+        roll = rng.random()
+        if roll < 0.05:
+            event = ("daily", guild_id, channel_id, user_id, None)
+            if key not in claimed:
+                claimed.add(key)
+                expected[key] = expected.get(key, 0) + daily_reward
+        elif roll < 0.10:
+            event = ("points", guild_id, channel_id, user_id, None)
+        else:
+            words = [f"w{rng.randrange(2000)}" for _ in range(rng.randint(3, 12))]
+            if rng.random() < args.hit_rate:
+                trig = rng.choice(triggers)
+                words.insert(rng.randrange(len(words) + 1), trig["message"])
+                expected[key] = expected.get(key, 0) + trig["points"]
+            event = ("message", guild_id, channel_id, user_id, " ".join(words))
+        w = shard_owner[shard_for_guild(guild_id, args.shards)]
+        batches[w].append(event)
+        if len(batches[w]) >= args.batch:
+            workers[w][1].send(batches[w])
+            batches[w] = []
+    reports = []
+    for (proc, conn), batch in zip(workers, batches):
+        if batch:
+            conn.send(batch)
+        conn.send(None)
+    for proc, conn in workers:
+        reports.append(conn.recv())
+        proc.join()
+    elapsed = time.perf_counter() - start
+
+    wrong = sum(1 for (gid, uid), pts in expected.items() if client.get_points(gid, uid) != pts)
+    client.shutdown_owner()
+    owner.join()
+
+    print(f"{args.events} events over {args.shards} shards / {args.workers} workers in {elapsed:.2f}s "
+          f"-> {args.events / elapsed:.0f} events/s")
+    for w, report in enumerate(reports):
+        print(f"  worker {w}: shards {report['shards']}, {report['events']} events, {report['guilds']} guilds, "
+              f"busy {report['busy_seconds']}s, {report['storage_calls']} storage round trips, "
+              f"{report['storage_posted']} writes sent without waiting ({report['storage_errors']} failed)")
+    print(f"balances checked: {len(expected)}, wrong: {wrong}")
+    return 1 if wrong else 0
+
+def run(args, base_env: dict):
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        print("ERROR: DISCORD_TOKEN environment variable not set.")
+        return 1
+    ctx = multiprocessing.get_context("spawn")
+    ready_recv, ready_send = ctx.Pipe(duplex=False)
+    owner = ctx.Process(target=run_storage_owner, args=(base_env, ready_send), name="storage-owner")
+    owner.start()
+    address = ready_recv.recv()
+    print(f"storage owner ({base_env['STORAGE_BACKEND']}) listening on {address}")
+    workers = []
+    for w in range(args.workers):
+        shards = worker_shards(w, args.workers, args.shards)
+        env = dict(base_env, STORAGE_BACKEND="remote", STORAGE_ADDRESS=address, DISCORD_TOKEN=token,
+                   SHARD_COUNT=str(args.shards), SHARD_IDS=",".join(map(str, shards)))
+        proc = ctx.Process(target=run_worker, args=(env,), name=f"worker-{w}")
+        proc.start()
+        workers.append(proc)
+    try:
+        for proc in workers:
+            proc.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in workers:
+            proc.join()
+        client = RemoteStorage(parse_address(address), bytes.fromhex(base_env["STORAGE_AUTHKEY"]))
+        client.shutdown_owner()
+        owner.join()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as a storage owner plus sharded workers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("run", "connect to Discord"), ("simulate", "feed simulated gateway events")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--workers", type=int, default=2)
+        p.add_argument("--shards", type=int, default=4)
+        p.add_argument("--backend", choices=("json", "sqlite"), default=os.getenv("STORAGE_BACKEND", "json"))
+        p.add_argument("--address", default=os.getenv("STORAGE_ADDRESS", DEFAULT_ADDRESS))
+    sim = sub.choices["simulate"]
+    sim.add_argument("--guilds", type=int, default=16)
+    sim.add_argument("--users", type=int, default=200, help="users per guild")
+    sim.add_argument("--triggers", type=int, default=20, help="triggers per guild")
+    sim.add_argument("--events", type=int, default=20000)
+    sim.add_argument("--hit-rate", type=float, default=0.3)
+    sim.add_argument("--batch", type=int, default=100, help="events per gateway batch")
+    sim.add_argument("--seed", type=int, default=1)
+    sim.add_argument("--data-dir", help="keep the simulated data here instead of a temporary directory")
+    args = parser.parse_args()
+    if args.workers < 1 or args.shards < args.workers:
+        parser.error("need at least one worker and no more workers than shards")
+
+    base_env = {"STORAGE_BACKEND": args.backend, "STORAGE_ADDRESS": args.address,
+                "STORAGE_AUTHKEY": os.getenv("STORAGE_AUTHKEY") or os.urandom(16).hex()}
+    if args.command == "run":
+        return run(args, base_env)
+    # spawned children inherit sys.path, so they still import bot/benchmarks from the repo
+    repo = os.path.dirname(os.path.abspath(__file__))
+    if repo not in sys.path:
+        sys.path.insert(0, repo)
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        os.chdir(args.data_dir)
+        return simulate(args, base_env)
+    with tempfile.TemporaryDirectory(prefix="bot-cluster-") as scratch:
+        os.chdir(scratch)
+        try:
+            return simulate(args, base_env)
+        finally:
+            os.chdir(repo)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
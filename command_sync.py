@@ -0,0 +1,43 @@
+# command_sync.py
+# Slash command registration only when the command tree has changed.  A
+# sync is a rate-limited HTTP call that rewrites every command, so the hash
+# of what was last pushed is kept next to the data files and compared at
+# startup instead.
+import hashlib
+import json
+import time
+
+from storage import dump_json, write_atomic
+
+def tree_payload(tree, guild=None) -> list:
+    """The commands as tree.sync would send them, sorted by type and name"""
+    payload = [cmd.to_dict(tree) for cmd in tree.get_commands(guild=guild)]
+    return sorted(payload, key=lambda c: (c.get("type", 1), c["name"]))
+
+def tree_hash(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def read_hashes(path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+async def sync_commands(tree, path, application_id: int, guild=None, force: bool = False):
+    """Sync the tree (globally, or to one guild) unless the same tree was synced last time.
+
+    Returns (synced, seconds).  The hash is saved only after a sync succeeded,
+    so a failed one is retried on the next start."""
+    key = f"{application_id}:{guild.id if guild is not None else 'global'}"
+    digest = tree_hash(tree_payload(tree, guild))
+    hashes = read_hashes(path)
+    if not force and hashes.get(key) == digest:
+        return False, 0.0
+    start = time.perf_counter()
+    await tree.sync(guild=guild)
+    seconds = time.perf_counter() - start
+    hashes[key] = digest
+    write_atomic(path, dump_json(hashes))
+    return True, seconds
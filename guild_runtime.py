@@ -0,0 +1,68 @@
+# guild_runtime.py
+from triggers import TriggerMatcher
+
+# a guild's config before an admin changes anything; also fills keys missing from older configs
+DEFAULT_GUILD_CONFIG = {
+    "CHANNEL_ID": None,                # int or None: channel where bot works (first of CHANNEL_IDS)
+    "CHANNEL_IDS": [],                 # all channels where bot works
+    "DAILY_REWARD": 10,                # int points
+    "DAILY_COOLDOWN_HOURS": 24,        # cooldown hours
+    "GAMBLE_WIN_CHANCE": 50,           # percent chance to win /gamble
+    "LEADERBOARD_TOP": 10,             # top N users
+    "NOTIFY_ON_TRIGGER": True,         # whether to send chat messages on triggers
+    "TRIGGERS": []                     # list of {"message": "...", "points": int, "mode": optional}
+}
+
+class GuildRuntime:
+    """Read-only view of a guild's config, compiled for the event handlers.
+
+    Built from the stored config dict by `from_config`, with defaults already
+    resolved, numbers already converted and triggers already compiled.  It is
+    never modified: admin commands save the config and build a new one."""
+
+    __slots__ = ("guild_id", "version", "channels", "matcher", "daily_reward",
+                 "daily_cooldown_hours", "gamble_win_chance", "leaderboard_top", "notify_on_trigger")
+
+    def __init__(self, guild_id: int, version: int, channels: frozenset, matcher: TriggerMatcher,
+                 daily_reward: int, daily_cooldown_hours: int, gamble_win_chance: int,
+                 leaderboard_top: int, notify_on_trigger: bool):
+        init = object.__setattr__     # the only writes: __setattr__ below refuses the rest
+        init(self, "guild_id", guild_id)
+        init(self, "version", version)
+        init(self, "channels", channels)
+        init(self, "matcher", matcher)
+        init(self, "daily_reward", daily_reward)
+        init(self, "daily_cooldown_hours", daily_cooldown_hours)
+        init(self, "gamble_win_chance", gamble_win_chance)
+        init(self, "leaderboard_top", leaderboard_top)
+        init(self, "notify_on_trigger", notify_on_trigger)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"GuildRuntime is read-only: save the guild config to change {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"GuildRuntime is read-only: save the guild config to change {name}")
+
+    @classmethod
+    def from_config(cls, guild_id: int, cfg: dict, defaults: dict, version: int = 0):
+        def opt(key):
+            value = cfg.get(key)
+            return defaults[key] if value is None else value
+        return cls(
+            guild_id=guild_id,
+            version=version,
+            channels=config_channels(cfg),
+            matcher=TriggerMatcher(cfg.get("TRIGGERS") or []),
+            daily_reward=int(opt("DAILY_REWARD")),
+            daily_cooldown_hours=int(opt("DAILY_COOLDOWN_HOURS")),
+            gamble_win_chance=int(opt("GAMBLE_WIN_CHANCE")),
+            leaderboard_top=int(opt("LEADERBOARD_TOP")),
+            notify_on_trigger=bool(opt("NOTIFY_ON_TRIGGER")),
+        )
+
+def config_channels(cfg: dict) -> frozenset:
+    """Allowed channel ids: CHANNEL_IDS plus the older single CHANNEL_ID"""
+    channels = set(int(c) for c in cfg.get("CHANNEL_IDS") or ())
+    if cfg.get("CHANNEL_ID"):
+        channels.add(int(cfg["CHANNEL_ID"]))
+    return frozenset(channels)
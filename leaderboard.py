@@ -0,0 +1,162 @@
+# leaderboard.py
+from collections import OrderedDict
+
+from sortedcontainers import SortedList
+
+PAGE_CACHE_LIMIT = 64      # rendered pages kept per guild before the cache is emptied
+
+class Board:
+    """What /leaderboard and /rank read: len(), top(), rank() and around().
+
+    `version` goes up with every change, so rendered pages cached with
+    `cache_page` are only reused while the board still looks the same."""
+
+    __slots__ = ()
+
+    def cached_page(self, key):
+        """The page cached under key if nothing changed since, else None"""
+        entry = self.pages.get(key)
+        if entry is not None and entry[0] == self.version:
+            return entry[1]
+        return None
+
+    def cache_page(self, key, page):
+        if len(self.pages) >= PAGE_CACHE_LIMIT:
+            self.pages.clear()
+        self.pages[key] = (self.version, page)
+
+    def around(self, user_id: int, radius: int = 2) -> list:
+        """[(rank, user_id, points), ...] for the user and up to radius neighbours each side"""
+        pos = self.rank(user_id)
+        if pos is None:
+            return []
+        start = max(0, pos - 1 - radius)
+        rows = self.top(pos - start + radius, start)
+        return [(start + i + 1, uid, pts) for i, (uid, pts) in enumerate(rows)]
+
+class GuildLeaderboard(Board):
+    """Balances of one guild kept in rank order.
+
+    Entries are (-points, user_id), so index 0 is the top of the board and
+    ties are broken by user id.  Updates and rank lookups are O(log n),
+    top(k, start) is O(log n + k)."""
+
+    __slots__ = ("points", "order", "version", "pages")
+
+    def __init__(self, rows=()):
+        self.points = {}                 # user_id -> points
+        for uid, pts in rows:
+            self.points[int(uid)] = int(pts)
+        self.order = SortedList((-pts, uid) for uid, pts in self.points.items())
+        self.version = 0
+        self.pages = {}                  # key -> (version, rendered page)
+
+    def __len__(self):
+        return len(self.points)
+
+    def update(self, user_id: int, points: int):
+        old = self.points.get(user_id)
+        if old == points:
+            return
+        if old is not None:
+            self.order.remove((-old, user_id))
+        self.points[user_id] = points
+        self.order.add((-points, user_id))
+        self.version += 1
+
+    def top(self, n: int, start: int = 0) -> list:
+        """[(user_id, points), ...] for ranks start+1 .. start+n"""
+        return [(uid, -neg) for neg, uid in self.order.islice(start, start + n)]
+
+    def rank(self, user_id: int):
+        """1-based position of the user, or None if they have no balance"""
+        pts = self.points.get(user_id)
+        if pts is None:
+            return None
+        return self.order.index((-pts, user_id)) + 1
+
+class StorageLeaderboard(Board):
+    """A guild's board read from a storage backend with ranked queries
+    (SQLite's points_rank index), so no balances are held in memory; only
+    the version, the member count, rendered pages and page cursors are kept.
+
+    The last row of each page read is kept as the cursor for the page after
+    it, so paging through the board is a keyset seek per page rather than an
+    OFFSET over every row before it.  rank() still counts the rows above the
+    user in the index, which is O(rank)."""
+
+    __slots__ = ("storage", "guild_id", "version", "pages", "count", "cursors")
+
+    def __init__(self, storage, guild_id: int):
+        self.storage = storage
+        self.guild_id = guild_id
+        self.version = 0
+        self.pages = {}
+        self.count = None                # (version, members): COUNT(*) walks the guild's rows
+        self.cursors = (0, {})           # (version, {start: (user_id, points) at rank start})
+
+    def __len__(self):
+        if self.count is None or self.count[0] != self.version:
+            self.count = (self.version, self.storage.count_points(self.guild_id))
+        return self.count[1]
+
+    def update(self, user_id: int, points: int):
+        self.version += 1
+
+    def top(self, n: int, start: int = 0) -> list:
+        version, cursors = self.cursors
+        if version != self.version:
+            # ranks moved: a cursor no longer marks the same position
+            cursors = {}
+            self.cursors = (self.version, cursors)
+        rows = self.storage.top(self.guild_id, n, start, after=cursors.get(start) if start else None)
+        if rows:
+            if len(cursors) >= PAGE_CACHE_LIMIT:
+                cursors.clear()
+            cursors[start + len(rows)] = rows[-1]
+        return rows
+
+    def rank(self, user_id: int):
+        return self.storage.rank(self.guild_id, user_id)
+
+class Leaderboards:
+    """Per-guild boards, built the first time a guild's board is needed and
+    kept current by the points helpers.
+
+    Backends with ranked queries get a StorageLeaderboard; the others get an
+    in-memory GuildLeaderboard loaded with every balance of the guild.  At
+    most `size` boards are kept, least recently used first out."""
+
+    def __init__(self, storage, size: int = 256):
+        self.storage = storage
+        self.size = max(1, size)
+        self.guilds = OrderedDict()      # guild_id -> board
+        self.evictions = 0
+
+    def get(self, guild_id: int) -> Board:
+        board = self.guilds.get(guild_id)
+        if board is not None:
+            self.guilds.move_to_end(guild_id)
+            return board
+        if self.storage.ranked_queries:
+            board = StorageLeaderboard(self.storage, guild_id)
+        else:
+            board = GuildLeaderboard(self.storage.guild_points(guild_id))
+        self.guilds[guild_id] = board
+        while len(self.guilds) > self.size:
+            self.guilds.popitem(last=False)
+            self.evictions += 1
+        return board
+
+    def update(self, guild_id: int, user_id: int, points: int):
+        # guilds nobody asked about yet are built from storage when first needed
+        board = self.guilds.get(guild_id)
+        if board is not None:
+            board.update(user_id, points)
+
+    def forget(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
+
+    def entries(self) -> int:
+        """Balances held in memory over all boards"""
+        return sum(len(board.points) for board in self.guilds.values() if isinstance(board, GuildLeaderboard))
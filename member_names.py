@@ -0,0 +1,87 @@
+# member_names.py
+# Display names for the leaderboard without discord.py's member cache: in
+# lean member mode (LEAN_MEMBERS=1) guilds are not chunked, so names are
+# fetched on demand, up to 100 per gateway request, and kept here for a while.
+import time
+from collections import OrderedDict
+
+QUERY_BATCH = 100          # user ids per member query, the gateway's limit
+
+class DisplayNameCache:
+    """(guild_id, user_id) -> display name, least recently used first.
+
+    Entries expire after `ttl` seconds so renamed members show up again.
+    Users that are no longer members are cached as None, so a board full of
+    former members does not query them again on every page."""
+
+    def __init__(self, size: int = 50000, ttl: float = 600):
+        self.size = max(1, size)
+        self.ttl = ttl
+        self.names = OrderedDict()      # (guild_id, user_id) -> (name or None, expires)
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        self.query_errors = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def get(self, guild_id: int, user_id: int):
+        """(found, name): found is False when the name has to be fetched"""
+        key = (guild_id, user_id)
+        entry = self.names.get(key)
+        if entry is None:
+            return False, None
+        if entry[1] < time.monotonic():
+            del self.names[key]
+            return False, None
+        self.names.move_to_end(key)
+        return True, entry[0]
+
+    def put(self, guild_id: int, user_id: int, name):
+        key = (guild_id, user_id)
+        self.names[key] = (name, time.monotonic() + self.ttl)
+        self.names.move_to_end(key)
+        while len(self.names) > self.size:
+            self.names.popitem(last=False)
+
+    async def resolve(self, guild, user_ids) -> dict:
+        """{user_id: display name or None} for the guild's members among user_ids.
+
+        Uses the member cache when discord.py has one, then this cache, then
+        batched member queries; a failed query leaves its users as None."""
+        names = {}
+        missing = []
+        for uid in user_ids:
+            member = guild.get_member(uid)
+            if member is not None:
+                names[uid] = member.display_name
+                continue
+            found, name = self.get(guild.id, uid)
+            if found:
+                self.hits += 1
+                names[uid] = name
+            else:
+                self.misses += 1
+                missing.append(uid)
+        for i in range(0, len(missing), QUERY_BATCH):
+            batch = missing[i:i + QUERY_BATCH]
+            self.queries += 1
+            try:
+                members = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+            except Exception as e:
+                # timeouts too: names are cosmetic, show the fallback now and try again next time
+                self.query_errors += 1
+                print("Warning: member query:", e)
+                for uid in batch:
+                    names[uid] = None
+                continue
+            found = {m.id: m.display_name for m in members}
+            for uid in batch:
+                names[uid] = found.get(uid)
+                self.put(guild.id, uid, names[uid])
+        return names
+
+    def stats(self) -> dict:
+        return {"entries": len(self.names), "hits": self.hits, "misses": self.misses,
+                "queries": self.queries, "query_errors": self.query_errors}
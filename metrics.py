@@ -0,0 +1,155 @@
+# metrics.py
+import asyncio
+import functools
+import threading
+import time
+
+# latency buckets in seconds (upper bounds); +Inf is implied
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _format(value) -> str:
+    # Prometheus spells these NaN / +Inf / -Inf
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (float("inf"), float("-inf")):
+            return "+Inf" if value > 0 else "-Inf"
+    return str(value)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def render(self, name: str, labels: str = "") -> list:
+        sep = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+class Metrics:
+    """Counters and histograms updated on the event loop, rendered in the
+    Prometheus text format by the HTTP thread.
+
+    Values that need walking bot state (table sizes, storage stats) are
+    gathered on the loop by `collect` and only read by the HTTP thread."""
+
+    def __init__(self):
+        self.handlers = {}              # handler name -> Histogram
+        self.handler_errors = {}        # handler name -> count
+        self.trigger_hits = {}          # guild id -> count
+        self.flushes = {}               # store path -> Histogram
+        self.flush_bytes = {}           # store path -> bytes
+        self.loop_lag = Histogram()
+        self.gauges = {}                # metric name -> [(labels, value), ...]
+        self.collectors = []            # callables returning {name: [(labels, value), ...]}
+
+    def timed(self, name: str):
+        """Decorator recording the latency of an async handler under `name`"""
+        def decorator(fn):
+            hist = self.handlers.setdefault(name, Histogram())
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    self.handler_errors[name] = self.handler_errors.get(name, 0) + 1
+                    raise
+                finally:
+                    hist.observe(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def trigger_hit(self, guild_id: int):
+        self.trigger_hits[guild_id] = self.trigger_hits.get(guild_id, 0) + 1
+
+    def flushed(self, store, seconds: float, nbytes: int):
+        hist = self.flushes.get(store.path)
+        if hist is None:
+            hist = self.flushes[store.path] = Histogram()
+        hist.observe(seconds)
+        self.flush_bytes[store.path] = self.flush_bytes.get(store.path, 0) + max(0, nbytes)
+
+    def collect(self):
+        gauges = {}
+        for collector in self.collectors:
+            try:
+                gauges.update(collector())
+            except Exception as e:
+                print("Warning: metrics collector:", e)
+        self.gauges = gauges
+
+    async def watch_loop(self, interval: float = 0.5, collect_every: int = 10):
+        """Measure event-loop lag (how late a sleep wakes up) and refresh gauges"""
+        loop = asyncio.get_running_loop()
+        ticks = 0
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(0.0, loop.time() - start - interval))
+            if ticks % collect_every == 0:
+                self.collect()
+            ticks += 1
+
+    def render(self) -> str:
+        lines = ["# HELP bot_handler_seconds Handler latency", "# TYPE bot_handler_seconds histogram"]
+        for name, hist in list(self.handlers.items()):
+            lines += hist.render("bot_handler_seconds", f'handler="{name}"')
+        lines += ["# HELP bot_handler_errors_total Handler exceptions", "# TYPE bot_handler_errors_total counter"]
+        for name, n in list(self.handler_errors.items()):
+            lines.append(f'bot_handler_errors_total{{handler="{name}"}} {n}')
+        lines += ["# HELP bot_trigger_hits_total Trigger matches per guild", "# TYPE bot_trigger_hits_total counter"]
+        for gid, n in list(self.trigger_hits.items()):
+            lines.append(f'bot_trigger_hits_total{{guild="{gid}"}} {n}')
+        lines += ["# HELP bot_storage_flush_seconds Storage flush duration", "# TYPE bot_storage_flush_seconds histogram"]
+        for path, hist in list(self.flushes.items()):
+            lines += hist.render("bot_storage_flush_seconds", f'store="{path}"')
+        lines += ["# HELP bot_storage_flush_bytes_total Bytes written by storage flushes", "# TYPE bot_storage_flush_bytes_total counter"]
+        for path, n in list(self.flush_bytes.items()):
+            lines.append(f'bot_storage_flush_bytes_total{{store="{path}"}} {n}')
+        lines += ["# HELP bot_event_loop_lag_seconds Event loop scheduling delay", "# TYPE bot_event_loop_lag_seconds histogram"]
+        lines += self.loop_lag.render("bot_event_loop_lag_seconds")
+        for name, samples in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}{suffix} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+def serve_metrics(metrics: Metrics, host: str, port: int):
+    """Serve /metrics from a daemon thread, away from the bot's event loop"""
+    import logging
+    from flask import Flask, Response
+
+    # one access log line per scrape is just noise in the bot's output
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    app = Flask("bot-metrics")
+
+    @app.route("/metrics")
+    def metrics_route():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    thread = threading.Thread(target=app.run, kwargs={"host": host, "port": port, "use_reloader": False},
+                              name="metrics-http", daemon=True)
+    thread.start()
+    return thread
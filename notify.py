@@ -0,0 +1,134 @@
+# notify.py
+import asyncio
+import time
+
+class _ChannelQueue:
+    __slots__ = ("channel", "pending", "task", "tokens", "refilled")
+
+    def __init__(self, channel, budget: int):
+        self.channel = channel
+        self.pending = {}               # user_id -> [mention, delta, total]
+        self.task = None
+        self.tokens = float(budget)
+        self.refilled = time.monotonic()
+
+class TriggerNotifier:
+    """Outbound queue for trigger notifications, one per channel.
+
+    `push` never awaits: hits are collected for `window` seconds and sent as
+    one summary message.  Each channel may send at most `budget` messages per
+    `budget_seconds`; while it waits, further hits keep merging into the next
+    message instead of piling up as separate sends."""
+
+    def __init__(self, window: float = 1.0, budget: int = 4, budget_seconds: float = 5.0,
+                 max_pending: int = 200, max_length: int = 1900):
+        if budget < 1 or budget_seconds <= 0:
+            raise ValueError("notification budget needs at least 1 message per a positive number of seconds")
+        self.window = window
+        self.budget = budget
+        self.budget_seconds = budget_seconds
+        self.max_pending = max_pending  # users waiting per channel before new ones are dropped
+        self.max_length = max_length    # stay under Discord's 2000 character limit
+        self.channels = {}
+        self.hits = 0
+        self.merged = 0                 # hits folded into a pending entry for the same user
+        self.dropped = 0                # hits discarded because the channel queue was full
+        self.sent = 0
+        self.send_errors = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q.pending) for q in self.channels.values())
+
+    def stats(self) -> dict:
+        return {"depth": self.depth, "hits": self.hits, "merged": self.merged, "dropped": self.dropped,
+                "sent": self.sent, "send_errors": self.send_errors}
+
+    def push(self, channel, user_id: int, mention: str, delta: int, total: int):
+        self.hits += 1
+        queue = self.channels.get(channel.id)
+        if queue is None:
+            queue = self.channels[channel.id] = _ChannelQueue(channel, self.budget)
+        entry = queue.pending.get(user_id)
+        if entry is not None:
+            entry[1] += delta
+            entry[2] = total
+            self.merged += 1
+        elif len(queue.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        else:
+            queue.pending[user_id] = [mention, delta, total]
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._drain(queue))
+
+    def _refill(self, queue: _ChannelQueue) -> float:
+        """Top up the channel's tokens for the time since the last refill; returns the rate"""
+        now = time.monotonic()
+        rate = self.budget / self.budget_seconds
+        queue.tokens = min(float(self.budget), queue.tokens + (now - queue.refilled) * rate)
+        queue.refilled = now
+        return rate
+
+    def _take_token(self, queue: _ChannelQueue) -> float:
+        """Spend one send token; returns 0, or how long to wait for one"""
+        rate = self._refill(queue)
+        if queue.tokens >= 1:
+            queue.tokens -= 1
+            return 0.0
+        return (1 - queue.tokens) / rate
+
+    def _render(self, queue: _ChannelQueue) -> str:
+        if len(queue.pending) == 1:
+            mention, pts, total = next(iter(queue.pending.values()))
+            queue.pending.clear()
+            if pts >= 0:
+                return f"{mention} gained {pts} point{'s' if pts!=1 else ''}! Total: **{total}**"
+            return f"{mention} lost {abs(pts)} point{'s' if pts!=-1 else ''}! Total: **{total}**"
+        parts = []
+        length = 0
+        for user_id, (mention, pts, total) in list(queue.pending.items()):
+            part = f"{mention} {pts:+d} (total {total})"
+            if parts and length + len(part) + 2 > self.max_length:
+                break   # the rest goes out in the next message
+            parts.append(part)
+            length += len(part) + 2
+            del queue.pending[user_id]
+        return ", ".join(parts)
+
+    async def _drain(self, queue: _ChannelQueue):
+        try:
+            await asyncio.sleep(self.window)
+            while queue.pending:
+                wait = self._take_token(queue)
+                if wait:
+                    await asyncio.sleep(wait)
+                    continue
+                text = self._render(queue)
+                try:
+                    await queue.channel.send(text)
+                    self.sent += 1
+                except Exception as e:
+                    self.send_errors += 1
+                    print("Warning: trigger notification:", e)
+        finally:
+            queue.task = None
+            if not queue.pending:
+                self._forget(queue)
+
+    def _forget(self, queue: _ChannelQueue):
+        # an idle channel keeps its queue, and so its spent tokens, until the
+        # bucket is full again; otherwise the next burst would get a fresh budget
+        if queue.task is not None or queue.pending or self.channels.get(queue.channel.id) is not queue:
+            return
+        rate = self._refill(queue)
+        if queue.tokens >= self.budget - 1e-9:
+            del self.channels[queue.channel.id]
+        else:
+            asyncio.get_running_loop().call_later((self.budget - queue.tokens) / rate, self._forget, queue)
+
+    async def close(self):
+        for queue in list(self.channels.values()):
+            if queue.task is not None:
+                queue.task.cancel()
+        self.channels.clear()
@@ -0,0 +1,363 @@
+# partitions.py
+# JSON storage split into one folder per guild (guilds/<guild_id>/), loaded
+# on first access and dropped again once the guild goes quiet, so startup
+# time and memory follow the active guilds rather than every guild ever seen.
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+from storage import EconomyStore, JsonStorage, dump_json, ledger_history, ledger_segments, read_ledger, write_atomic
+
+CONFIG_NAME = "config.json"
+POINTS_NAME = "points.json"
+DAILY_NAME = "daily.json"
+LEDGER_NAME = "ledger.jsonl"
+
+def read_config(path):
+    """The guild config stored at path, or None if there is none (never creates the file)"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cfg if isinstance(cfg, dict) and cfg else None
+
+class GuildPartition:
+    """One guild's config plus its points/daily snapshots and ledger.
+
+    The config is read when the partition is opened; the economy files
+    only when points are first needed, so a guild whose messages are all
+    outside the bot's channels never loads (or creates) them."""
+
+    __slots__ = ("cache", "guild_id", "folder", "config", "config_dirty", "_economy", "used", "in_flight")
+
+    def __init__(self, cache, guild_id: int):
+        self.cache = cache
+        self.guild_id = guild_id
+        self.folder = os.path.join(cache.root, str(guild_id))
+        self.config = read_config(os.path.join(self.folder, CONFIG_NAME))
+        self.config_dirty = False
+        self._economy = None
+        self.used = time.monotonic()
+        self.in_flight = 0      # flushes still writing: their changes are no longer pending but not on disk yet
+
+    @property
+    def economy(self) -> EconomyStore:
+        if self._economy is None:
+            self._install_economy(self._read_economy())
+        return self._economy
+
+    def _read_economy(self) -> EconomyStore:
+        # reads the snapshots and replays the ledger; touches nothing shared, so it can run in a thread
+        if not self.cache.read_only:
+            os.makedirs(self.folder, exist_ok=True)
+        return EconomyStore(os.path.join(self.folder, POINTS_NAME), os.path.join(self.folder, DAILY_NAME),
+                            os.path.join(self.folder, LEDGER_NAME), compact_after=self.cache.compact_after,
+                            archive=self.cache.archive, read_only=self.cache.read_only)
+
+    def _install_economy(self, economy: EconomyStore):
+        economy.writer = self.cache
+        self._economy = economy
+        self.cache.economy_loads += 1
+
+    @property
+    def dirty(self) -> int:
+        return self.in_flight + int(self.config_dirty) + (self._economy.dirty if self._economy is not None else 0)
+
+    def set_config(self, cfg: dict):
+        self.config = cfg
+        self.config_dirty = True
+        self.cache.notify(self)
+
+    def _write_config(self, cfg: dict) -> int:
+        os.makedirs(self.folder, exist_ok=True)
+        payload = dump_json(cfg)
+        write_atomic(os.path.join(self.folder, CONFIG_NAME), payload)
+        return len(payload)
+
+    async def flush(self) -> int:
+        """Write pending changes; returns the bytes written"""
+        written = 0
+        self.in_flight += 1
+        try:
+            if self.config_dirty:
+                self.config_dirty = False
+                try:
+                    written += await asyncio.to_thread(self._write_config, self.config)
+                except Exception:
+                    self.config_dirty = True
+                    raise
+            if self._economy is not None:
+                before = self._economy.bytes_written
+                await self._economy.flush()
+                written += self._economy.bytes_written - before
+        finally:
+            self.in_flight -= 1
+        return written
+
+    def flush_sync(self):
+        if self.config_dirty:
+            self._write_config(self.config)
+            self.config_dirty = False
+        if self._economy is not None:
+            self._economy.flush_sync()
+
+class PartitionCache:
+    """Open GuildPartitions, least recently used first, at most `size` of them.
+
+    WriteBehind sees the cache as a single store: each flush writes every
+    dirty partition and then closes partitions unused for `idle_seconds`.
+    A partition pushed out while it still has unsaved changes waits in
+    `evicting` until the next flush has written it; using it again before
+    then simply brings it back.
+
+    `get` reads a cold guild on the spot; `load` reads it in a worker thread
+    first, once however many callers wait for it, and the guild is never
+    evicted while that read runs."""
+
+    def __init__(self, root, size: int = 256, idle_seconds: float = 900, compact_after: int = 50000,
+                 archive: bool = True, on_evict=None, read_only: bool = False):
+        self.root = root
+        self.path = root
+        self.size = max(1, size)
+        self.idle_seconds = idle_seconds
+        self.compact_after = compact_after
+        self.archive = archive
+        self.read_only = read_only      # open partitions without creating their folders or files
+        self.on_evict = on_evict        # called with the guild id once a partition is closed
+        self.open = OrderedDict()       # guild_id -> GuildPartition, least recently used first
+        self.evicting = {}              # guild_id -> GuildPartition with changes still to write
+        self.loading = {}               # guild_id -> Task reading the guild's files in a thread
+        self.pending = 0                # changes since the last flush
+        self.loads = 0
+        self.economy_loads = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.bytes_written = 0
+        self.last_flush_seconds = 0.0
+        self.writer = None              # set by WriteBehind
+        self._flush_lock = None
+
+    @property
+    def dirty(self) -> int:
+        return self.pending
+
+    def notify(self, store):
+        # partitions and their ledgers report each change here
+        self.pending += 1
+        if self.writer is not None:
+            self.writer.notify(self)
+
+    def get(self, guild_id: int) -> GuildPartition:
+        part = self.open.get(guild_id)
+        if part is not None:
+            self.open.move_to_end(guild_id)
+        else:
+            part = self.evicting.pop(guild_id, None)
+            if part is None:
+                part = GuildPartition(self, guild_id)
+                self.loads += 1
+            self._insert(guild_id, part)
+        part.used = time.monotonic()
+        return part
+
+    def _insert(self, guild_id: int, part: GuildPartition):
+        self.open[guild_id] = part
+        if len(self.open) > self.size:
+            # least recently used first, but not a guild whose files are being read
+            for old_id in [gid for gid in self.open if gid not in self.loading][:len(self.open) - self.size]:
+                self._evict(old_id)
+
+    async def load(self, guild_id: int, economy: bool = True) -> GuildPartition:
+        """get(), with the guild's files read in a worker thread when it is cold"""
+        while True:
+            part = self.open.get(guild_id) or self.evicting.get(guild_id)
+            if part is not None and (part._economy is not None or not economy):
+                return self.get(guild_id)
+            task = self.loading.get(guild_id)
+            if task is None:
+                task = self.loading[guild_id] = asyncio.create_task(self._load(guild_id, part, economy))
+            # shielded: one caller giving up does not cancel the read for the others
+            await asyncio.shield(task)
+
+    async def _load(self, guild_id: int, part, economy: bool):
+        fresh = part is None
+        try:
+            if fresh:
+                part = await asyncio.to_thread(GuildPartition, self, guild_id)
+            read = await asyncio.to_thread(part._read_economy) if economy and part._economy is None else None
+        finally:
+            del self.loading[guild_id]
+        # a get() on the loop may have opened the guild meanwhile: keep that one
+        current = self.open.get(guild_id) or self.evicting.pop(guild_id, None)
+        if current is None:
+            current = part
+            if fresh:
+                self.loads += 1
+        if read is not None and current._economy is None:
+            current._install_economy(read)
+        if guild_id not in self.open:
+            self._insert(guild_id, current)
+        current.used = time.monotonic()
+
+    def _evict(self, guild_id: int):
+        part = self.open.pop(guild_id)
+        if part.dirty:
+            self.evicting[guild_id] = part
+        else:
+            self._closed(guild_id)
+
+    def _closed(self, guild_id: int):
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(guild_id)
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            start = time.perf_counter()
+            now = time.monotonic()
+            for guild_id, part in list(self.open.items()):
+                if now - part.used < self.idle_seconds:
+                    break
+                if guild_id not in self.loading:
+                    self._evict(guild_id)
+            parts = [p for p in list(self.open.values()) + list(self.evicting.values()) if p.dirty]
+            # changes made while these are written count towards the next flush
+            self.pending = 0
+            written = 0
+            for part in parts:
+                try:
+                    written += await part.flush()
+                except Exception:
+                    self.pending += part.dirty
+                    raise
+            for guild_id, part in list(self.evicting.items()):
+                if not part.dirty:
+                    del self.evicting[guild_id]
+                    self._closed(guild_id)
+            if parts:
+                self.flushes += 1
+                self.bytes_written += written
+                self.last_flush_seconds = time.perf_counter() - start
+
+    def flush_sync(self):
+        for part in list(self.open.values()) + list(self.evicting.values()):
+            part.flush_sync()
+        self.pending = 0
+
+class PartitionedStorage(JsonStorage):
+    """The JSON backend with one folder per guild under `root`.
+
+    Same files and ledger format as JsonStorage, but each guild has its own
+    set, opened through a PartitionCache; nothing is read at startup."""
+
+    def __init__(self, root, cache_size: int = 256, idle_seconds: float = 900,
+                 compact_after: int = 50000, archive: bool = True, read_only: bool = False):
+        if not read_only:
+            os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.partitions = PartitionCache(root, size=cache_size, idle_seconds=idle_seconds, compact_after=compact_after,
+                                         archive=archive, on_evict=self._evicted, read_only=read_only)
+        self.stores = (self.partitions,)
+
+    def _evicted(self, guild_id: int):
+        if self.on_evict is not None:
+            self.on_evict(guild_id)
+
+    async def load_guild(self, guild_id: int, economy: bool = True):
+        await self.partitions.load(guild_id, economy)
+
+    def economy_for(self, guild_id: int) -> EconomyStore:
+        return self.partitions.get(guild_id).economy
+
+    def get_config(self, guild_id: int):
+        return self.partitions.get(guild_id).config
+
+    def set_config(self, guild_id: int, cfg: dict):
+        self.partitions.get(guild_id).set_config(cfg)
+
+    def configs(self):
+        # reads every guild's config file; meant for tools, the bot itself never calls it
+        found = []
+        for name in sorted(os.listdir(self.root)):
+            if not name.isdigit():
+                continue
+            part = self.partitions.open.get(int(name)) or self.partitions.evicting.get(int(name))
+            cfg = part.config if part is not None else read_config(os.path.join(self.root, name, CONFIG_NAME))
+            if cfg is not None:
+                found.append((int(name), cfg))
+        return found
+
+    def history(self, guild_id: int, user_id: int, limit: int) -> list:
+        # reads the files only, so it is safe from a worker thread
+        path = os.path.join(self.root, str(guild_id), LEDGER_NAME)
+        return ledger_history(ledger_segments(path), guild_id, user_id, limit)
+
+    def selfcheck(self) -> list:
+        if not os.path.isdir(self.root):
+            return [(self.root, FileNotFoundError(self.root))]
+        if not os.access(self.root, os.W_OK):
+            return [(self.root, PermissionError(f"{self.root} is not writable"))]
+        return [(self.root, None)]
+
+    def memory_stats(self) -> dict:
+        cache = self.partitions
+        tables = [p._economy.tables.get(gid) for gid, p in cache.open.items() if p._economy is not None]
+        tables = [t for t in tables if t is not None]
+        return {"partitions_open": len(cache.open), "partitions_evicting": len(cache.evicting),
+                "partition_loads": cache.loads, "partition_evictions": cache.evictions,
+                "guild_tables": len(tables), "user_rows": sum(len(t) for t in tables),
+                "table_bytes": sum(t.nbytes() for t in tables)}
+
+    async def close(self):
+        await self.flush()
+        # leave short ledgers behind, as JsonStorage does
+        for part in list(self.partitions.open.values()):
+            if part._economy is not None and part._economy.segment_records:
+                await part._economy.compact()
+
+def migrate_json_to_partitions(source: JsonStorage, root) -> dict:
+    """Split the single-file JSON data into one folder per guild under root"""
+    counts = {"guilds": 0, "configs": 0, "points": 0, "daily": 0, "ledger": 0, "skipped": len(source.economy.legacy)}
+    folders = set()
+
+    def folder(gid) -> str:
+        path = os.path.join(root, str(gid))
+        if path not in folders:
+            os.makedirs(path, exist_ok=True)
+            folders.add(path)
+        return path
+
+    for gid, cfg in source.configs():
+        write_atomic(os.path.join(folder(gid), CONFIG_NAME), dump_json(cfg))
+        counts["configs"] += 1
+    for gid, table in source.economy.tables.items():
+        points, daily = table.to_json()
+        write_atomic(os.path.join(folder(gid), POINTS_NAME), dump_json({str(gid): points}))
+        write_atomic(os.path.join(folder(gid), DAILY_NAME), dump_json({str(gid): daily}))
+        counts["points"] += len(points)
+        counts["daily"] += len(daily)
+    # the old ledger becomes each guild's first archived segment: /history keeps
+    # working, and the snapshots above already contain its effects
+    stamp = int(time.time() * 1000)
+    archives = {}
+    try:
+        for path in source.economy.segments():
+            for rec in read_ledger(path):
+                gid = rec.get("g")
+                if gid is None:
+                    continue
+                out = archives.get(gid)
+                if out is None:
+                    out = archives[gid] = open(os.path.join(folder(gid), f"{LEDGER_NAME}.{stamp}"), "ab")
+                out.write(dump_json(rec) + b"\n")
+                counts["ledger"] += 1
+    finally:
+        for out in archives.values():
+            out.close()
+    counts["guilds"] = len(folders)
+    return counts
@@ -0,0 +1,255 @@
+# simulate.py
+# Offline Monte Carlo simulation of a guild's economy, for tuning rewards and
+# gamble odds before changing them on live users.
+#
+#   python simulate.py --guild 123456789012345678 --users 1000000 --days 28
+#   python simulate.py --users 100000 --win-chance 45 --daily-reward 20
+#
+# With --guild the config and balances come from the bot's storage (run it in
+# the bot's data directory, with the same STORAGE_BACKEND); without it the
+# default config is used and everyone starts at 0.  All users are simulated
+# at once with NumPy arrays, one day per step:
+#   triggers  messages ~ Poisson(user activity), each hitting a trigger with
+#             --hit-rate; the trigger is picked uniformly from the config
+#   daily     claimed with --daily-rate whenever the cooldown allows
+#   gamble    ~ Poisson(--gambles-per-day) bets of --bet-fraction of the
+#             balance, won with GAMBLE_WIN_CHANCE
+# Balances are clamped at 0 once per day rather than after every change.
+import argparse
+import json
+import math
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from guild_runtime import DEFAULT_GUILD_CONFIG
+from storage import open_storage
+
+TOP_N = 10      # leaderboard size used for the churn figures
+
+def load_guild(guild_id):
+    """(config dict, [points, ...]) for the guild from the bot's storage in the current directory"""
+    backend = os.getenv("STORAGE_BACKEND", "json")
+    address, authkey = None, b""
+    if backend == "remote":
+        from cluster import DEFAULT_ADDRESS, parse_address
+        address = parse_address(os.getenv("STORAGE_ADDRESS", DEFAULT_ADDRESS))
+        authkey = bytes.fromhex(os.getenv("STORAGE_AUTHKEY", ""))
+    # read only: pointed at the wrong directory, it should find nothing rather than leave empty data files there
+    try:
+        storage = open_storage(backend, address=address, authkey=authkey, read_only=True)
+    except sqlite3.OperationalError as e:
+        raise SystemExit(f"cannot open the {backend} storage in {os.getcwd()}: {e}")
+    stored = storage.get_config(guild_id)
+    balances = [pts for _, pts in storage.guild_points(guild_id)]
+    if stored is None and not balances:
+        raise SystemExit(f"guild {guild_id} has no config or balances in the {backend} storage in {os.getcwd()}")
+    cfg = dict(DEFAULT_GUILD_CONFIG)
+    cfg.update(stored or {})
+    return cfg, balances
+
+def default_config():
+    return dict(DEFAULT_GUILD_CONFIG, TRIGGERS=[])
+
+def gini(ordered) -> float:
+    """Gini coefficient of balances sorted ascending (0 = all equal, 1 = one user has everything)"""
+    n = len(ordered)
+    total = ordered.sum()
+    if not n or total <= 0:
+        return 0.0
+    ranks = np.arange(1, n + 1)
+    return float((2 * (ranks * ordered).sum()) / (n * total) - (n + 1) / n)
+
+def top_set(balance, n: int):
+    n = min(n, len(balance))
+    return set(np.argpartition(-balance, n - 1)[:n].tolist())
+
+class EconomySimulation:
+    """The simulated users of one guild as arrays, advanced a day at a time"""
+
+    def __init__(self, cfg: dict, users: int, start_balances=(), seed: int = 1, messages_per_day: float = 20,
+                 hit_rate: float = 0.05, daily_rate: float = 0.6, gambles_per_day: float = 0.5,
+                 bet_fraction: float = 0.1):
+        self.rng = np.random.default_rng(seed)
+        self.users = users
+        self.daily_reward = int(cfg["DAILY_REWARD"])
+        self.cooldown_hours = max(int(cfg["DAILY_COOLDOWN_HOURS"]), 1)
+        self.win_chance = min(max(int(cfg["GAMBLE_WIN_CHANCE"]), 0), 100) / 100
+        self.hit_rate = hit_rate
+        self.daily_rate = daily_rate
+        self.gambles_per_day = gambles_per_day
+        self.bet_fraction = bet_fraction
+        lam = max(gambles_per_day, 1e-9)
+        pmf = [math.exp(k * math.log(lam) - lam - math.lgamma(k + 1)) for k in range(int(lam * 3) + 30)]
+        self.gamble_cdf = np.cumsum(pmf)[:-1]     # for drawing the gambles per user per day
+        # distinct trigger values and the cumulative chance a hit lands on each
+        points = [int(t.get("points", 0)) for t in cfg.get("TRIGGERS") or [] if "message" in t]
+        values, counts = np.unique(points, return_counts=True) if points else (np.zeros(0, np.int64), np.zeros(0))
+        self.trigger_values = values.astype(np.int64)
+        self.trigger_cdf = (np.cumsum(counts) / counts.sum())[:-1] if points else counts
+        # activity is heavy-tailed: a few members write most of the messages
+        sigma = 1.0
+        self.activity = self.rng.lognormal(math.log(messages_per_day) - sigma ** 2 / 2, sigma, users)
+        start = np.asarray(start_balances, dtype=np.int64)
+        if len(start) >= users:
+            self.balance = self.rng.permutation(start)[:users].copy()
+        elif len(start):
+            # real members first, the rest resampled from their balances
+            self.balance = np.concatenate([start, self.rng.choice(start, users - len(start))])
+        else:
+            self.balance = np.zeros(users, dtype=np.int64)
+        self.next_claim = np.zeros(users, dtype=np.float64)   # hour of the next allowed claim
+        self.hour = 0.0
+        self.minted = {"triggers": 0, "daily": 0, "gamble": 0}
+
+    def _triggers(self):
+        if not len(self.trigger_values):
+            return
+        # messages are Poisson, so trigger hits are too; then each hit picks a trigger,
+        # one pass per hit rank so the work follows the number of hits
+        hits = self.rng.poisson(self.activity * self.hit_rate)
+        hitters = np.flatnonzero(hits)
+        gained = 0
+        while len(hitters):
+            picked = np.searchsorted(self.trigger_cdf, self.rng.random(len(hitters)), side="right")
+            points = self.trigger_values[picked]
+            self.balance[hitters] += points
+            gained += int(points.sum())
+            hits[hitters] -= 1
+            hitters = hitters[hits[hitters] > 0]
+        self.minted["triggers"] += gained
+
+    def _daily(self):
+        end = self.hour + 24
+        claims = np.zeros(self.users, dtype=np.int64)
+        # a cooldown under a day allows several claims; each chance is taken with daily_rate
+        for _ in range(max(1, 24 // self.cooldown_hours)):
+            ready = self.next_claim < end
+            take = ready & (self.rng.random(self.users) < self.daily_rate)
+            when = np.maximum(self.next_claim[take], self.hour)
+            self.next_claim[take] = when + self.cooldown_hours
+            claims += take
+        gained = claims * self.daily_reward
+        self.balance += gained
+        self.minted["daily"] += int(gained.sum())
+
+    def _gambles(self):
+        # Poisson by inverse CDF: a lookup in a short table beats rng.poisson at this size
+        rounds = np.searchsorted(self.gamble_cdf, self.rng.random(self.users), side="right")
+        players = np.flatnonzero(rounds)
+        while len(players):
+            players = players[self.balance[players] > 0]
+            bet = np.maximum((self.balance[players] * self.bet_fraction).astype(np.int64), 1)
+            won = self.rng.random(len(players)) < self.win_chance
+            change = np.where(won, bet, -bet)
+            self.balance[players] += change
+            self.minted["gamble"] += int(change.sum())
+            rounds[players] -= 1
+            players = players[rounds[players] > 0]
+
+    def step(self):
+        self._triggers()
+        self._daily()
+        self._gambles()
+        np.maximum(self.balance, 0, out=self.balance)
+        self.hour += 24
+
+    def snapshot(self) -> dict:
+        ordered = np.sort(self.balance)
+        n = len(ordered)
+        p50, p90, p99 = (float(ordered[min(int(n * q), n - 1)]) for q in (0.5, 0.9, 0.99))
+        return {"supply": int(ordered.sum()), "mean": float(ordered.mean()), "median": p50, "p90": p90, "p99": p99,
+                "max": int(ordered[-1]), "zero_share": float(np.searchsorted(ordered, 0, side="right") / n),
+                "gini": gini(ordered)}
+
+def run(sim: EconomySimulation, days: int, top_n: int = TOP_N) -> dict:
+    start = time.perf_counter()
+    first = sim.snapshot()
+    daily = []
+    top = top_set(sim.balance, top_n)
+    churn = []
+    for _ in range(days):
+        supply = int(sim.balance.sum())
+        sim.step()
+        snap = sim.snapshot()
+        snap["inflation"] = (snap["supply"] - supply) / supply if supply else None
+        new_top = top_set(sim.balance, top_n)
+        churn.append(len(new_top - top) / max(len(new_top), 1))
+        top = new_top
+        daily.append(snap)
+    return {"users": sim.users, "days": days, "seconds": round(time.perf_counter() - start, 3), "start": first,
+            "days_detail": daily, "minted": dict(sim.minted), "top_churn": churn}
+
+def print_report(report: dict, top_n: int = TOP_N):
+    print(f"{report['users']} users over {report['days']} days, simulated in {report['seconds']}s")
+    print(f"{'day':>4} {'supply':>14} {'infl %':>8} {'mean':>10} {'median':>9} {'p90':>9} {'p99':>10} "
+          f"{'max':>10} {'at 0 %':>7} {'gini':>6} {'top churn':>9}")
+    s = report["start"]
+    print(f"{0:>4} {s['supply']:>14} {'':>8} {s['mean']:>10.1f} {s['median']:>9.0f} {s['p90']:>9.0f} {s['p99']:>10.0f} "
+          f"{s['max']:>10} {s['zero_share'] * 100:>7.1f} {s['gini']:>6.3f} {'':>9}")
+    rows = report["days_detail"]
+    for day, (d, churn) in enumerate(zip(rows, report["top_churn"]), start=1):
+        # every day for short runs, otherwise weekly
+        if len(rows) > 14 and day % 7 and day != len(rows):
+            continue
+        infl = f"{d['inflation'] * 100:.2f}" if d["inflation"] is not None else "-"
+        print(f"{day:>4} {d['supply']:>14} {infl:>8} {d['mean']:>10.1f} {d['median']:>9.0f} {d['p90']:>9.0f} "
+              f"{d['p99']:>10.0f} {d['max']:>10} {d['zero_share'] * 100:>7.1f} {d['gini']:>6.3f} {churn * 100:>8.0f}%")
+    m = report["minted"]
+    total = m["triggers"] + m["daily"] + m["gamble"]
+    print(f"points created: triggers {m['triggers']}, daily {m['daily']}, gambles {m['gamble']} (net {total})")
+    churn = report["top_churn"]
+    if churn:
+        print(f"top {top_n} churn: {sum(churn) / len(churn) * 100:.0f}% of places change hands per day on average")
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of a guild's points economy")
+    parser.add_argument("--guild", type=int, help="start from this guild's config and balances")
+    parser.add_argument("--users", type=int, help="users to simulate (default: the guild's members with points, or 100000)")
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--messages-per-day", type=float, default=20, help="mean messages per user per day")
+    parser.add_argument("--hit-rate", type=float, default=0.05, help="share of messages that match a trigger")
+    parser.add_argument("--daily-rate", type=float, default=0.6, help="chance a user claims /daily when they can")
+    parser.add_argument("--gambles-per-day", type=float, default=0.5)
+    parser.add_argument("--bet-fraction", type=float, default=0.1, help="share of the balance bet per gamble")
+    # overrides, to try new values without changing the guild
+    parser.add_argument("--daily-reward", type=int)
+    parser.add_argument("--cooldown-hours", type=int)
+    parser.add_argument("--win-chance", type=int, help="GAMBLE_WIN_CHANCE in percent")
+    parser.add_argument("--trigger-scale", type=float, help="multiply every trigger's points")
+    parser.add_argument("--json", help="also write the full report to this file")
+    args = parser.parse_args()
+
+    if args.guild:
+        cfg, balances = load_guild(args.guild)
+        print(f"guild {args.guild}: {len(balances)} members with points, {len(cfg.get('TRIGGERS') or [])} triggers")
+    else:
+        cfg, balances = default_config(), []
+    users = args.users or len(balances) or 100000
+    if args.daily_reward is not None:
+        cfg["DAILY_REWARD"] = args.daily_reward
+    if args.cooldown_hours is not None:
+        cfg["DAILY_COOLDOWN_HOURS"] = args.cooldown_hours
+    if args.win_chance is not None:
+        cfg["GAMBLE_WIN_CHANCE"] = args.win_chance
+    if args.trigger_scale is not None:
+        cfg["TRIGGERS"] = [dict(t, points=round(int(t.get("points", 0)) * args.trigger_scale)) for t in cfg.get("TRIGGERS") or []]
+    if not cfg.get("TRIGGERS"):
+        print("no triggers configured: only /daily and /gamble are simulated")
+
+    sim = EconomySimulation(cfg, users, balances, seed=args.seed, messages_per_day=args.messages_per_day,
+                            hit_rate=args.hit_rate, daily_rate=args.daily_rate,
+                            gambles_per_day=args.gambles_per_day, bet_fraction=args.bet_fraction)
+    report = run(sim, args.days)
+    print(f"DAILY_REWARD={sim.daily_reward} DAILY_COOLDOWN_HOURS={sim.cooldown_hours} "
+          f"GAMBLE_WIN_CHANCE={sim.win_chance * 100:.0f}")
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
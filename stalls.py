@@ -0,0 +1,133 @@
+# stalls.py
+# Opt-in watchdog for event-loop stalls (STALL_THRESHOLD_MS).  A task on the
+# loop bumps a heartbeat; a separate thread notices when it stops, takes the
+# loop thread's stack with sys._current_frames() while it is still stuck,
+# and adds the stall to a per call site summary once the loop is back.
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def in_project(filename) -> bool:
+    path = os.path.abspath(filename)
+    return path.startswith(PROJECT_DIR + os.sep) and "site-packages" not in path
+
+def call_site(stack) -> str:
+    """'file:line in function' of the innermost frame in this project's code
+    (the innermost frame of all if none is)"""
+    if not stack:
+        return "(no stack)"
+    frame = next((f for f in reversed(stack) if in_project(f.filename)), stack[-1])
+    name = os.path.relpath(frame.filename, PROJECT_DIR) if in_project(frame.filename) else frame.filename
+    return f"{name}:{frame.lineno} in {frame.name}"
+
+class StallSite:
+    __slots__ = ("count", "total", "worst", "last", "stack")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.last = 0.0         # wall clock of the latest stall
+        self.stack = []         # formatted stack of the worst stall
+
+class StallWatchdog:
+    """Reports event-loop stalls longer than `threshold` seconds.
+
+    The stack is taken when the watchdog thread notices the stall, so it
+    shows what the loop was doing at least `threshold` into it.  Code that
+    holds the GIL the whole time (one long C call) delays the sample until
+    it returns; such stalls are counted but the stack may show the next line."""
+
+    def __init__(self, threshold: float, log_path=None, max_sites: int = 200):
+        self.threshold = threshold
+        self.interval = max(threshold / 4, 0.01)
+        self.log_path = log_path
+        self.max_sites = max_sites
+        self.sites = {}                 # call site -> StallSite
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+        self.last_beat = time.monotonic()
+        self.loop_thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._task = None
+
+    def start(self):
+        """Start watching the running loop; call from a coroutine on it"""
+        self.loop_thread = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _beat(self):
+        while True:
+            self.last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        pending = None          # (heartbeat the stall started after, stack)
+        while not self._stop.wait(self.interval):
+            beat = self.last_beat
+            if pending is not None and beat != pending[0]:
+                # the loop is back: the beats were `interval` plus the stall apart
+                self._record(max(beat - pending[0] - self.interval, 0.0), pending[1])
+                pending = None
+            if pending is None and time.monotonic() - beat > self.threshold:
+                frame = sys._current_frames().get(self.loop_thread)
+                pending = (beat, traceback.extract_stack(frame) if frame is not None else [])
+                del frame
+
+    def _record(self, seconds: float, stack):
+        site = call_site(stack)
+        lines = traceback.format_list(stack)
+        with self._lock:
+            self.stalls += 1
+            self.stalled_seconds += seconds
+            entry = self.sites.get(site)
+            if entry is None:
+                if len(self.sites) >= self.max_sites:
+                    site = "(other call sites)"
+                entry = self.sites.setdefault(site, StallSite())
+            entry.count += 1
+            entry.total += seconds
+            entry.last = time.time()
+            if seconds >= entry.worst:
+                entry.worst = seconds
+                entry.stack = lines
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(f"{datetime.now().isoformat(timespec='seconds')} stall {seconds * 1000:.0f}ms at {site}\n")
+                    f.write("".join(lines) + "\n")
+            except OSError as e:
+                print("Warning: stall log:", e)
+
+    def report(self, limit: int = 10, stacks: bool = False) -> str:
+        """Call sites by total stalled time, worst first"""
+        with self._lock:
+            rows = sorted(self.sites.items(), key=lambda kv: -kv[1].total)[:limit]
+            lines = [f"{self.stalls} stalls over {self.threshold * 1000:.0f}ms, {self.stalled_seconds:.2f}s in total"]
+            for site, s in rows:
+                lines.append(f"{s.count:>5}x  total {s.total * 1000:>8.0f}ms  worst {s.worst * 1000:>6.0f}ms  {site}")
+                if stacks:
+                    lines.append("".join(s.stack[-6:]).rstrip())
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self.sites.clear()
+            self.stalls = 0
+            self.stalled_seconds = 0.0
@@ -0,0 +1,1143 @@
+# storage.py
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from bulk import SQLITE_BULK_CHUNK
+from tables import GuildTable, to_epoch
+
+# ---------- UTIL: JSON LOAD/SAVE ----------
+def load_json(path, create: bool = True):
+    if not os.path.exists(path):
+        if not create:
+            return {}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({}, f)
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except:
+            return {}
+
+def dump_json(data) -> bytes:
+    # compact separators: the files are read by the bot, not by people
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+def write_atomic(path, payload: bytes):
+    """Write payload to a temp file next to path, fsync it, then rename over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def save_json(path, data):
+    write_atomic(path, dump_json(data))
+
+# ---------- WRITE-BEHIND STORE ----------
+class JsonStore:
+    """A JSON file kept in memory; changes are marked dirty and written back later."""
+
+    def __init__(self, path, read_only: bool = False):
+        self.path = path
+        self.data = load_json(path, create=not read_only)
+        self.dirty = 0                 # number of changes not yet on disk
+        self.flushes = 0
+        self.bytes_written = 0
+        self.last_flush_seconds = 0.0
+        self.writer = None             # set by WriteBehind
+        self._write_lock = threading.Lock()
+        self._flush_lock = None        # asyncio.Lock, created on first async flush
+
+    def mark_dirty(self, count: int = 1):
+        self.dirty += count
+        if self.writer is not None:
+            self.writer.notify(self)
+
+    def _snapshot(self) -> dict:
+        # copy two levels (guild -> entries) so the event loop can keep mutating
+        # while the copy is serialized in a worker thread; values are replaced,
+        # never mutated in place, so deeper levels can be shared.
+        return {k: (dict(v) if isinstance(v, dict) else v) for k, v in self.data.items()}
+
+    def _write(self, snapshot: dict) -> int:
+        start = time.perf_counter()
+        payload = dump_json(snapshot)
+        with self._write_lock:
+            write_atomic(self.path, payload)
+        self.flushes += 1
+        self.bytes_written += len(payload)
+        self.last_flush_seconds = time.perf_counter() - start
+        return len(payload)
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        # the lock keeps an older snapshot from landing on disk after a newer one
+        async with self._flush_lock:
+            if not self.dirty:
+                return
+            pending = self.dirty
+            snapshot = self._snapshot()
+            self.dirty = 0
+            try:
+                await asyncio.to_thread(self._write, snapshot)
+            except Exception:
+                self.dirty += pending
+                raise
+
+    def flush_sync(self):
+        if not self.dirty:
+            return
+        pending = self.dirty
+        self.dirty = 0
+        try:
+            self._write(self._snapshot())
+        except Exception:
+            self.dirty += pending
+            raise
+
+class WriteBehind:
+    """Background task flushing dirty stores every `interval` seconds, or
+    sooner once a store collects `max_dirty` unsaved changes."""
+
+    def __init__(self, stores, interval: float = 5.0, max_dirty: int = 1000, on_flush=None):
+        self.stores = list(stores)
+        self.interval = interval
+        self.max_dirty = max_dirty
+        self.on_flush = on_flush        # called with (store, seconds, bytes) after each flush
+        self._wake = None
+        self._task = None
+        for store in self.stores:
+            store.writer = self
+
+    def notify(self, store: JsonStore):
+        if store.dirty >= self.max_dirty and self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush_all()
+
+    async def flush_all(self):
+        for store in self.stores:
+            flushes, written = store.flushes, store.bytes_written
+            start = time.perf_counter()
+            try:
+                await store.flush()
+            except Exception as e:
+                print(f"Warning: could not save {store.path}:", e)
+                continue
+            if self.on_flush is not None and store.flushes != flushes:
+                self.on_flush(store, time.perf_counter() - start, store.bytes_written - written)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_all()
+
+    def flush_all_sync(self):
+        # last resort at interpreter exit, when the event loop is already gone
+        for store in self.stores:
+            try:
+                store.flush_sync()
+            except Exception as e:
+                print(f"Warning: could not save {store.path}:", e)
+
+# ---------- POINTS LEDGER ----------
+def read_ledger(path):
+    """Yield ledger records from path in order, skipping a torn last line"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def user_records(rec: dict):
+    """The per-user changes in a ledger record: the record itself, or one per row of a bulk record"""
+    if rec.get("op") != "bulk":
+        yield rec
+        return
+    for uid, value, delta in zip(rec["u"], rec["v"], rec["d"]):
+        yield {"ts": rec["ts"], "op": "points", "g": rec["g"], "u": str(uid), "v": value, "d": delta, "r": rec.get("r", "bulk")}
+
+def ledger_segments(path) -> list:
+    """All ledger files, oldest first: archived segments, the one being compacted, the live one"""
+    folder = os.path.dirname(os.path.abspath(path))
+    base = os.path.basename(path)
+    if not os.path.isdir(folder):
+        return []
+    archives = sorted((n for n in os.listdir(folder)
+                       if n.startswith(base + ".") and n[len(base) + 1:].isdigit()),
+                      key=lambda n: int(n[len(base) + 1:]))
+    return [os.path.join(folder, n) for n in archives] + [path + ".old", path]
+
+def ledger_history(segments, guild_id: int, user_id: int, limit: int = 20) -> list:
+    """Most recent ledger records for one user, newest first (reads files: call off the loop)"""
+    gid = str(guild_id)
+    uid = str(user_id)
+    found = []
+    for path in reversed(segments):
+        matches = [r for rec in read_ledger(path) if rec.get("g") == gid
+                   for r in user_records(rec) if r.get("u") == uid]
+        found.extend(reversed(matches))
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+class EconomyStore:
+    """Points and daily claims as snapshot files plus an append-only ledger.
+
+    Every change is appended to the ledger as a small record holding the new
+    value (and the delta, for auditing).  Because records carry absolute
+    values, replaying a record that is already part of the snapshot is
+    harmless, so startup simply loads the snapshots and replays the ledger.
+    Once the ledger grows past `compact_after` records it is rotated and the
+    snapshots are rewritten in the background.
+
+    In memory each guild is a GuildTable (typed arrays); the snapshot files
+    keep the original { guild_id: { user_id: ... } } JSON layout."""
+
+    def __init__(self, points_path, daily_path, ledger_path, compact_after: int = 50000, archive: bool = True,
+                 read_only: bool = False):
+        self.points_path = points_path
+        self.daily_path = daily_path
+        self.tables = {}                        # guild_id -> GuildTable
+        self.legacy = {}                        # old flat points.json entries, written back untouched
+        self.path = ledger_path
+        self.old_path = ledger_path + ".old"    # segment being compacted
+        self.compact_after = compact_after
+        self.archive = archive                  # keep compacted segments as an audit trail
+        self.pending = []                       # encoded records not yet appended
+        self.bulks = {}                         # guild_id -> users changed while a bulk write is open
+        self.segment_records = 0                # records in the ledger since the last compaction
+        self.flushes = 0
+        self.compactions = 0
+        self.bytes_written = 0
+        self.last_flush_seconds = 0.0
+        self.writer = None
+        self._flush_lock = None
+        self._load_snapshot(create=not read_only)
+        self._replay()
+
+    @property
+    def dirty(self) -> int:
+        # an open bulk write has changed the tables but is not in the ledger yet
+        return len(self.pending) + len(self.bulks)
+
+    def _load_snapshot(self, create: bool = True):
+        points = load_json(self.points_path, create)
+        daily = load_json(self.daily_path, create)
+        for gid in set(points) | set(daily):
+            guild_points = points.get(gid, {})
+            guild_daily = daily.get(gid, {})
+            if not isinstance(guild_points, dict):
+                # pre-guild layout ({user_id: points}); it cannot be assigned to a guild
+                self.legacy[gid] = guild_points
+                guild_points = {}
+            if not isinstance(guild_daily, dict):
+                guild_daily = {}
+            self.tables[int(gid)] = GuildTable.from_json(guild_points, guild_daily)
+
+    def _replay(self):
+        # the .old segment only survives a crash during compaction; it predates the live one
+        for path in (self.old_path, self.path):
+            for rec in read_ledger(path):
+                self._apply(rec)
+                self.segment_records += 1
+
+    def table(self, guild_id: int) -> GuildTable:
+        table = self.tables.get(guild_id)
+        if table is None:
+            table = self.tables[guild_id] = GuildTable()
+        return table
+
+    def _apply(self, rec: dict):
+        table = self.table(int(rec["g"]))
+        if rec.get("op") == "bulk":
+            for uid, value in zip(rec["u"], rec["v"]):
+                table.set_points(int(uid), int(value))
+            return
+        uid = int(rec["u"])
+        if rec.get("op") == "points":
+            table.set_points(uid, int(rec["v"]))
+            if "claim" in rec:
+                # points record that also carries a daily claim (one transaction)
+                table.set_claim(uid, to_epoch(rec["claim"]))
+        else:
+            table.set_claim(uid, to_epoch(rec["v"]))
+
+    def _append(self, rec: dict):
+        self.pending.append(dump_json(rec) + b"\n")
+        if self.writer is not None:
+            self.writer.notify(self)
+
+    # ----- mutations -----
+    def set_points(self, guild_id: int, user_id: int, value: int, reason: str, claim: int = None):
+        if self.bulks and guild_id in self.bulks:
+            self.bulks[guild_id].add(user_id)
+        table = self.table(guild_id)
+        old = table.get_points(user_id)
+        table.set_points(user_id, value)
+        rec = {"ts": round(time.time(), 3), "op": "points", "g": str(guild_id), "u": str(user_id),
+               "v": value, "d": value - old, "r": reason}
+        if claim is not None:
+            table.set_claim(user_id, claim)
+            rec["claim"] = claim
+        self._append(rec)
+
+    def begin_bulk(self, guild_id: int):
+        self.bulks[guild_id] = set()
+
+    def bulk_written(self, guild_id: int, user_ids):
+        # changes from here on come after the bulk row, so they win over it
+        self.bulks[guild_id].difference_update(user_ids)
+
+    def end_bulk(self, guild_id: int, rows: dict, reason: str):
+        """Log a finished bulk write ({user_id: [value, delta]}) as a single ledger record"""
+        changed = self.bulks.pop(guild_id)
+        table = self.table(guild_id)
+        # users changed again after their row was written: their own records come
+        # first in the ledger, so the batch must carry their latest value
+        for uid in changed & rows.keys():
+            rows[uid][0] = table.get_points(uid)
+        # one line, so a crash leaves either the whole batch or none of it; parallel
+        # lists of ints keep it cheap to encode for large guilds
+        self._append({"ts": round(time.time(), 3), "op": "bulk", "g": str(guild_id), "r": reason, "u": list(rows),
+                      "v": [row[0] for row in rows.values()], "d": [row[1] for row in rows.values()]})
+
+    def abort_bulk(self, guild_id: int, old: dict):
+        """Put back the balances a bulk write replaced ({user_id: points or None});
+        users changed again after their row was written keep that change"""
+        changed = self.bulks.pop(guild_id)
+        table = self.table(guild_id)
+        for uid, pts in old.items():
+            if uid in changed:
+                continue
+            if pts is None:
+                table.clear_points(uid)
+            else:
+                table.set_points(uid, pts)
+
+    def set_daily(self, guild_id: int, user_id: int, epoch: int):
+        self.table(guild_id).set_claim(user_id, epoch)
+        self._append({"ts": round(time.time(), 3), "op": "daily", "g": str(guild_id), "u": str(user_id),
+                      "v": epoch, "r": "daily"})
+
+    # ----- persistence -----
+    def _write_lines(self, lines) -> int:
+        start = time.perf_counter()
+        payload = b"".join(lines)
+        with open(self.path, "ab") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.flushes += 1
+        self.bytes_written += len(payload)
+        self.last_flush_seconds = time.perf_counter() - start
+        return len(payload)
+
+    def _take_pending(self):
+        lines = self.pending
+        self.pending = []
+        self.segment_records += len(lines)
+        return lines
+
+    def _restore_pending(self, lines):
+        self.pending[:0] = lines
+        self.segment_records -= len(lines)
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self.pending:
+                lines = self._take_pending()
+                try:
+                    await asyncio.to_thread(self._write_lines, lines)
+                except Exception:
+                    self._restore_pending(lines)
+                    raise
+            if self.segment_records >= self.compact_after and not self.bulks:
+                await self._compact()
+
+    async def compact(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self.pending:
+                lines = self._take_pending()
+                try:
+                    await asyncio.to_thread(self._write_lines, lines)
+                except Exception:
+                    self._restore_pending(lines)
+                    raise
+            if not self.bulks:
+                await self._compact()
+
+    async def _compact(self):
+        # rotate and copy the tables with no await in between, so the snapshot
+        # covers exactly the records in the rotated segment
+        if not os.path.exists(self.old_path) and os.path.exists(self.path):
+            os.replace(self.path, self.old_path)
+            self.segment_records = 0
+        snapshot = {gid: table.copy() for gid, table in self.tables.items()}
+        await asyncio.to_thread(self._finish_compaction, snapshot)
+
+    def _finish_compaction(self, snapshot: dict):
+        points = dict(self.legacy)
+        daily = {}
+        for gid, table in snapshot.items():
+            guild_points, guild_daily = table.to_json()
+            if guild_points:
+                points[str(gid)] = guild_points
+            if guild_daily:
+                daily[str(gid)] = guild_daily
+        for path, data in ((self.points_path, points), (self.daily_path, daily)):
+            payload = dump_json(data)
+            write_atomic(path, payload)
+            self.bytes_written += len(payload)
+        if os.path.exists(self.old_path):
+            if self.archive:
+                stamp = int(time.time() * 1000)
+                while os.path.exists(f"{self.path}.{stamp}"):
+                    stamp += 1
+                os.replace(self.old_path, f"{self.path}.{stamp}")
+            else:
+                os.unlink(self.old_path)
+        self.compactions += 1
+
+    def flush_sync(self):
+        if self.pending:
+            lines = self._take_pending()
+            try:
+                self._write_lines(lines)
+            except Exception:
+                self._restore_pending(lines)
+                raise
+
+    # ----- audit -----
+    def segments(self) -> list:
+        return ledger_segments(self.path)
+
+    def history(self, guild_id: int, user_id: int, limit: int = 20) -> list:
+        return ledger_history(self.segments(), guild_id, user_id, limit)
+
+# ---------- STORAGE BACKENDS ----------
+class Storage:
+    """What the bot needs from a storage engine.
+
+    Guild/user ids are ints; daily claims are epoch seconds.  Writes may
+    be buffered; `stores` lists the objects WriteBehind should flush."""
+
+    stores = ()
+    on_evict = None         # called with a guild id when a lazy backend drops the guild from memory
+    ranked_queries = False  # top/rank/count_points are indexed queries, so boards need not be held in memory
+
+    async def load_guild(self, guild_id: int, economy: bool = True):
+        """Read the guild's data into memory off the event loop, if this backend
+        loads guilds lazily, so the calls below do not block on it; with
+        economy=False only the config.  Backends that hold everything do nothing."""
+
+    def get_config(self, guild_id: int):
+        """Stored config dict for the guild, or None if it has none yet"""
+        raise NotImplementedError
+
+    def set_config(self, guild_id: int, cfg: dict):
+        raise NotImplementedError
+
+    def configs(self):
+        """(guild_id, config dict) for every guild that has a stored config"""
+        raise NotImplementedError
+
+    def get_points(self, guild_id: int, user_id: int) -> int:
+        raise NotImplementedError
+
+    def set_points(self, guild_id: int, user_id: int, value: int, reason: str):
+        raise NotImplementedError
+
+    def get_daily(self, guild_id: int, user_id: int):
+        """Epoch seconds of the user's last daily claim, or None"""
+        raise NotImplementedError
+
+    def set_daily(self, guild_id: int, user_id: int, epoch: int):
+        raise NotImplementedError
+
+    def commit_user(self, guild_id: int, user_id: int, points, daily, reason: str):
+        """Write a new balance and/or daily claim (either may be None) as one change"""
+        if points is not None:
+            self.set_points(guild_id, user_id, points, reason)
+        if daily is not None:
+            self.set_daily(guild_id, user_id, daily)
+
+    def change_points(self, guild_id: int, user_id: int, delta: int, reason: str, claim=None) -> int:
+        """Add delta to the balance (never below 0), plus an optional daily claim, as one
+        change; returns the new balance.  Nothing else runs in between, so this is
+        atomic wherever the backend is only used from one thread."""
+        points = max(0, self.get_points(guild_id, user_id) + int(delta))
+        self.commit_user(guild_id, user_id, points, claim, reason)
+        return points
+
+    def apply_bulk(self, guild_id: int, rows, reason: str):
+        """Write new balances [(user_id, points), ...] for one guild as one batch"""
+        for user_id, value in rows:
+            self.set_points(guild_id, user_id, value, reason)
+
+    def bulk(self, guild_id: int, reason: str) -> "BulkWrite":
+        """A BulkWrite for the guild, for batches too large to write in one go"""
+        return BulkWrite(self, guild_id, reason)
+
+    def top(self, guild_id: int, n: int, start: int = 0, after=None) -> list:
+        """[(user_id, points), ...] for ranks start+1 .. start+n, best first, ties by
+        user id (backends with ranked_queries only).  `after` is the (user_id,
+        points) row at rank `start`, when the caller knows it: the page is then
+        read on from that row instead of by skipping `start` rows."""
+        raise NotImplementedError
+
+    def rank(self, guild_id: int, user_id: int):
+        """1-based position of the user, or None if they have no balance (ranked_queries only)"""
+        raise NotImplementedError
+
+    def count_points(self, guild_id: int) -> int:
+        """Users of the guild with a balance (ranked_queries only)"""
+        raise NotImplementedError
+
+    def guild_points(self, guild_id: int) -> list:
+        """[(user_id, points), ...] for every user of the guild, in no particular order"""
+        raise NotImplementedError
+
+    def history(self, guild_id: int, user_id: int, limit: int) -> list:
+        """Recent change records for one user, newest first (may block: call off the loop)"""
+        raise NotImplementedError
+
+    def selfcheck(self) -> list:
+        """[(name, error or None), ...] for the selftest report (may block)"""
+        raise NotImplementedError
+
+    def memory_stats(self) -> dict:
+        """Cheap size figures for what the backend holds in memory, for metrics"""
+        return {}
+
+    async def flush(self):
+        for store in self.stores:
+            await store.flush()
+
+    def flush_sync(self):
+        for store in self.stores:
+            store.flush_sync()
+
+    async def close(self):
+        await self.flush()
+
+class JsonStorage(Storage):
+    """config.json plus the points/daily snapshots and ledger, all held in memory"""
+
+    def __init__(self, config_path, points_path, daily_path, ledger_path, compact_after: int = 50000, archive: bool = True,
+                 read_only: bool = False):
+        self.config_store = JsonStore(config_path, read_only=read_only)
+        self.economy = EconomyStore(points_path, daily_path, ledger_path,
+                                    compact_after=compact_after, archive=archive, read_only=read_only)
+        self.stores = (self.config_store, self.economy)
+
+    def economy_for(self, guild_id: int) -> EconomyStore:
+        """The EconomyStore holding the guild's points and claims"""
+        return self.economy
+
+    def get_config(self, guild_id: int):
+        return self.config_store.data.get(str(guild_id))
+
+    def set_config(self, guild_id: int, cfg: dict):
+        self.config_store.data[str(guild_id)] = cfg
+        self.config_store.mark_dirty()
+
+    def configs(self):
+        return [(int(gid), cfg) for gid, cfg in self.config_store.data.items()]
+
+    def get_points(self, guild_id: int, user_id: int) -> int:
+        table = self.economy_for(guild_id).tables.get(guild_id)
+        return table.get_points(user_id) if table is not None else 0
+
+    def set_points(self, guild_id: int, user_id: int, value: int, reason: str):
+        self.economy_for(guild_id).set_points(guild_id, user_id, int(value), reason)
+
+    def get_daily(self, guild_id: int, user_id: int):
+        table = self.economy_for(guild_id).tables.get(guild_id)
+        return (table.get_claim(user_id) or None) if table is not None else None
+
+    def commit_user(self, guild_id: int, user_id: int, points, daily, reason: str):
+        if points is None:
+            if daily is not None:
+                self.set_daily(guild_id, user_id, daily)
+            return
+        # a single ledger record, so the balance and the claim land together
+        self.economy_for(guild_id).set_points(guild_id, user_id, int(points), reason, claim=daily)
+
+    def set_daily(self, guild_id: int, user_id: int, epoch: int):
+        self.economy_for(guild_id).set_daily(guild_id, user_id, int(epoch))
+
+    def apply_bulk(self, guild_id: int, rows, reason: str):
+        with self.bulk(guild_id, reason) as batch:
+            batch.write(rows)
+
+    def bulk(self, guild_id: int, reason: str) -> "BulkWrite":
+        return JsonBulkWrite(self, guild_id, reason)
+
+    def guild_points(self, guild_id: int) -> list:
+        table = self.economy_for(guild_id).tables.get(guild_id)
+        return list(table.points_items()) if table is not None else []
+
+    def history(self, guild_id: int, user_id: int, limit: int) -> list:
+        return self.economy.history(guild_id, user_id, limit)
+
+    def selfcheck(self) -> list:
+        results = []
+        for path in (self.config_store.path, self.economy.points_path, self.economy.daily_path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    json.load(f)
+                results.append((path, None))
+            except Exception as e:
+                results.append((path, e))
+        return results
+
+    def memory_stats(self) -> dict:
+        tables = list(self.economy.tables.values())
+        return {"guild_tables": len(tables), "user_rows": sum(len(t) for t in tables),
+                "table_bytes": sum(t.nbytes() for t in tables), "ledger_pending": len(self.economy.pending)}
+
+    async def close(self):
+        # leave a short ledger behind so the next start has little to replay
+        await self.flush()
+        await self.economy.compact()
+
+class BulkWrite:
+    """New balances for many users of one guild, written a chunk at a time so
+    the caller can yield to the event loop in between, and persisted as one
+    batch when closed.  Use it with `async with` where closing may take a
+    while; leaving the block with an exception (or a cancellation) aborts
+    the batch instead.  This generic version stores each
+    chunk through apply_bulk as it is written, and on abort writes back the
+    old balance of every user still holding the batch's value."""
+
+    def __init__(self, storage: Storage, guild_id: int, reason: str):
+        self.storage = storage
+        self.guild_id = guild_id
+        self.reason = reason
+        self.written = {}   # user_id -> (old points, new points)
+
+    def write(self, rows):
+        """Store [(user_id, points), ...]"""
+        rows = [(int(u), int(v)) for u, v in rows]
+        for uid, value in rows:
+            old = self.written[uid][0] if uid in self.written else self.storage.get_points(self.guild_id, uid)
+            self.written[uid] = (old, value)
+        self.storage.apply_bulk(self.guild_id, rows, self.reason)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        rows = [(uid, old) for uid, (old, new) in self.written.items()
+                if self.storage.get_points(self.guild_id, uid) == new]
+        if rows:
+            self.storage.apply_bulk(self.guild_id, rows, self.reason + "-aborted")
+
+    async def close_async(self):
+        """close(), for backends that can yield to the event loop while finishing"""
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.close_async()
+        else:
+            self.abort()
+
+class JsonBulkWrite(BulkWrite):
+    """Chunks go straight into the guild's table; the ledger gets one record on
+    close, and an abort puts the replaced balances back without one"""
+
+    def __init__(self, storage: JsonStorage, guild_id: int, reason: str):
+        super().__init__(storage, guild_id, reason)
+        self.rows = {}      # user_id -> [value, delta]
+        self.old = {}       # user_id -> balance before the batch, None if there was none
+        storage.economy_for(guild_id).begin_bulk(guild_id)
+
+    def write(self, rows):
+        # looked up per chunk so a partitioned guild counts as in use
+        economy = self.storage.economy_for(self.guild_id)
+        table = economy.table(self.guild_id)
+        written = []
+        for uid, value in rows:
+            uid, value = int(uid), int(value)
+            if uid not in self.old:
+                self.old[uid] = table.get_points(uid) if table.has_points(uid) else None
+            self.rows[uid] = [value, value - table.get_points(uid)]
+            table.set_points(uid, value)
+            written.append(uid)
+        economy.bulk_written(self.guild_id, written)
+
+    def close(self):
+        self.storage.economy_for(self.guild_id).end_bulk(self.guild_id, self.rows, self.reason)
+
+    def abort(self):
+        self.storage.economy_for(self.guild_id).abort_bulk(self.guild_id, self.old)
+
+class SqliteBulkWrite(BulkWrite):
+    """Chunks are collected here and only written on close, so an unfinished or
+    aborted bulk never reaches the database and WriteBehind keeps committing
+    other writes meanwhile.  Closed with `async with`, the rows go in a chunk
+    at a time with yields in between; commits wait until the last chunk is in,
+    so the batch is committed whole.  A user changed directly after their row
+    was collected keeps that change (SqliteStorage drops the row), and an
+    abort while writing puts back what was written."""
+
+    def __init__(self, storage: "SqliteStorage", guild_id: int, reason: str):
+        super().__init__(storage, guild_id, reason)
+        self.rows = {}          # user_id -> new points
+        self.applying = False   # rows are being written: WriteBehind commits wait
+        self.ts = None
+        if guild_id in storage.bulks:
+            raise RuntimeError(f"a bulk write is already open for guild {guild_id}")
+        storage.bulks[guild_id] = self
+
+    def write(self, rows):
+        self.rows.update((int(u), int(v)) for u, v in rows)
+
+    def _apply(self, user_ids):
+        db = self.storage
+        rows = [(uid, self.rows[uid]) for uid in user_ids if uid in self.rows]
+        with db._lock:
+            # old balances of the whole chunk in one query
+            found = dict(db.conn.execute(sql_guild_points_in(len(rows)), (self.guild_id, *(uid for uid, _ in rows))))
+            logged = []
+            for uid, value in rows:
+                old = found.get(uid)
+                self.written[uid] = (old, value)
+                logged.append((self.ts, self.guild_id, uid, "points", str(value), value - (old or 0), self.reason))
+            db.conn.executemany(SQL_SET_POINTS, [(self.guild_id, uid, value) for uid, value in rows])
+            db.conn.executemany(SQL_LOG, logged)
+
+    def _undo(self):
+        # only users still holding the batch's value: later changes stay
+        db = self.storage
+        with db._lock:
+            for uid, (old, new) in self.written.items():
+                row = db.conn.execute(SQL_GET_POINTS, (self.guild_id, uid)).fetchone()
+                if row is None or int(row[0]) != new:
+                    continue
+                if old is None:
+                    db.conn.execute(SQL_DELETE_POINTS, (self.guild_id, uid))
+                else:
+                    db.conn.execute(SQL_SET_POINTS, (self.guild_id, uid, old))
+            if self.written:
+                db.conn.execute(SQL_DELETE_BULK_LOG, (self.guild_id, self.ts, self.reason))
+        self.written.clear()
+
+    def _finish(self):
+        db = self.storage
+        self.applying = False
+        if db.bulks.get(self.guild_id) is self:
+            del db.bulks[self.guild_id]
+        db._changed()
+
+    def close(self):
+        self.ts = round(time.time(), 3)
+        self.applying = True
+        try:
+            user_ids = list(self.rows)
+            for start in range(0, len(user_ids), SQLITE_BULK_CHUNK):
+                self._apply(user_ids[start:start + SQLITE_BULK_CHUNK])
+        except BaseException:
+            self._undo()
+            raise
+        finally:
+            self._finish()
+
+    async def close_async(self):
+        self.ts = round(time.time(), 3)
+        self.applying = True
+        try:
+            user_ids = list(self.rows)
+            for start in range(0, len(user_ids), SQLITE_BULK_CHUNK):
+                self._apply(user_ids[start:start + SQLITE_BULK_CHUNK])
+                await asyncio.sleep(0)
+        except BaseException:
+            self._undo()
+            raise
+        finally:
+            self._finish()
+
+    def abort(self):
+        self.rows.clear()
+        self._undo()
+        self._finish()
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS guild_config (
+    guild_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS points (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    points INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS points_rank ON points (guild_id, points DESC);
+CREATE TABLE IF NOT EXISTS daily (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    last_claim INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ledger (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    value TEXT NOT NULL,
+    delta INTEGER,
+    reason TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ledger_user ON ledger (guild_id, user_id, id);
+"""
+
+# statement text is fixed so sqlite3's statement cache reuses the prepared statements
+SQL_SET_CONFIG = "INSERT INTO guild_config (guild_id, data) VALUES (?, ?) ON CONFLICT (guild_id) DO UPDATE SET data = excluded.data"
+SQL_GET_POINTS = "SELECT points FROM points WHERE guild_id = ? AND user_id = ?"
+SQL_SET_POINTS = "INSERT INTO points (guild_id, user_id, points) VALUES (?, ?, ?) ON CONFLICT (guild_id, user_id) DO UPDATE SET points = excluded.points"
+SQL_GET_DAILY = "SELECT last_claim FROM daily WHERE guild_id = ? AND user_id = ?"
+SQL_SET_DAILY = "INSERT INTO daily (guild_id, user_id, last_claim) VALUES (?, ?, ?) ON CONFLICT (guild_id, user_id) DO UPDATE SET last_claim = excluded.last_claim"
+SQL_LOG = "INSERT INTO ledger (ts, guild_id, user_id, op, value, delta, reason) VALUES (?, ?, ?, ?, ?, ?, ?)"
+# ordered by the points_rank index; ties come out by user id, the table's key
+SQL_TOP = "SELECT user_id, points FROM points WHERE guild_id = ? ORDER BY points DESC, user_id LIMIT ? OFFSET ?"
+# rows after (points, user_id) in that order; only ties with the cursor's balance are filtered, not skipped over
+SQL_TOP_AFTER = ("SELECT user_id, points FROM points WHERE guild_id = ? AND points <= ? AND NOT (points = ? AND user_id <= ?)"
+                 " ORDER BY points DESC, user_id LIMIT ?")
+SQL_RANK = ("SELECT (SELECT COUNT(*) FROM points WHERE guild_id = ? AND points > ?)"
+            " + (SELECT COUNT(*) FROM points WHERE guild_id = ? AND points = ? AND user_id < ?)")
+SQL_COUNT_POINTS = "SELECT COUNT(*) FROM points WHERE guild_id = ?"
+SQL_DELETE_POINTS = "DELETE FROM points WHERE guild_id = ? AND user_id = ?"
+SQL_DELETE_BULK_LOG = "DELETE FROM ledger WHERE guild_id = ? AND ts = ? AND reason = ? AND op = 'points'"
+SQL_GUILD_POINTS = "SELECT user_id, points FROM points WHERE guild_id = ?"
+SQL_HISTORY = "SELECT ts, op, value, delta, reason FROM ledger WHERE guild_id = ? AND user_id = ? ORDER BY id DESC LIMIT ?"
+
+def sql_guild_points_in(n: int) -> str:
+    # one text per chunk size, so full chunks share a prepared statement
+    return f"SELECT user_id, points FROM points WHERE guild_id = ? AND user_id IN ({', '.join('?' * n)})"
+
+class SqliteStorage(Storage):
+    """Local SQLite database in WAL mode.  Writes go into an open transaction
+    that WriteBehind commits, so each change is one indexed upsert."""
+
+    ranked_queries = True
+
+    def __init__(self, path, read_only: bool = False):
+        self.path = path
+        if read_only:
+            # fails instead of creating the database when there is none
+            self.conn = sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro", uri=True,
+                                        check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SQLITE_SCHEMA)
+            self.conn.commit()
+        # configs are tiny and read on every event, so they are cached
+        self.configs_cache = {gid: json.loads(data) for gid, data in self.conn.execute("SELECT guild_id, data FROM guild_config")}
+        self.dirty = 0
+        self.flushes = 0
+        self.bytes_written = 0
+        self.last_flush_seconds = 0.0
+        self.writer = None
+        self.stores = (self,)
+        self.bulks = {}                 # guild_id -> open SqliteBulkWrite, written when it closes
+        self._lock = threading.Lock()   # the worker thread commits on the same connection
+
+    def _changed(self):
+        self.dirty += 1
+        if self.writer is not None:
+            self.writer.notify(self)
+
+    def _log(self, guild_id, user_id, op, value, delta, reason):
+        self.conn.execute(SQL_LOG, (round(time.time(), 3), guild_id, user_id, op, str(value), delta, reason))
+
+    def get_config(self, guild_id: int):
+        return self.configs_cache.get(guild_id)
+
+    def set_config(self, guild_id: int, cfg: dict):
+        self.configs_cache[guild_id] = cfg
+        with self._lock:
+            self.conn.execute(SQL_SET_CONFIG, (guild_id, json.dumps(cfg, separators=(",", ":"))))
+        self._changed()
+
+    def configs(self):
+        return list(self.configs_cache.items())
+
+    def get_points(self, guild_id: int, user_id: int) -> int:
+        with self._lock:
+            row = self.conn.execute(SQL_GET_POINTS, (guild_id, user_id)).fetchone()
+        return int(row[0]) if row else 0
+
+    def _supersede_bulk(self, guild_id: int, user_id: int):
+        # a direct change after the user's bulk row was written wins over the row
+        bulk = self.bulks.get(guild_id)
+        if bulk is not None:
+            bulk.rows.pop(user_id, None)
+
+    def set_points(self, guild_id: int, user_id: int, value: int, reason: str):
+        self._supersede_bulk(guild_id, user_id)
+        with self._lock:
+            row = self.conn.execute(SQL_GET_POINTS, (guild_id, user_id)).fetchone()
+            old = int(row[0]) if row else 0
+            self.conn.execute(SQL_SET_POINTS, (guild_id, user_id, int(value)))
+            self._log(guild_id, user_id, "points", int(value), int(value) - old, reason)
+        self._changed()
+
+    def get_daily(self, guild_id: int, user_id: int):
+        with self._lock:
+            row = self.conn.execute(SQL_GET_DAILY, (guild_id, user_id)).fetchone()
+        # older databases stored ISO strings here
+        return (to_epoch(row[0]) or None) if row else None
+
+    def set_daily(self, guild_id: int, user_id: int, epoch: int):
+        with self._lock:
+            self.conn.execute(SQL_SET_DAILY, (guild_id, user_id, int(epoch)))
+            self._log(guild_id, user_id, "daily", int(epoch), None, "daily")
+        self._changed()
+
+    def commit_user(self, guild_id: int, user_id: int, points, daily, reason: str):
+        if points is not None:
+            self._supersede_bulk(guild_id, user_id)
+        # hold the lock across both statements so a background commit can't split them
+        with self._lock:
+            if points is not None:
+                row = self.conn.execute(SQL_GET_POINTS, (guild_id, user_id)).fetchone()
+                old = int(row[0]) if row else 0
+                self.conn.execute(SQL_SET_POINTS, (guild_id, user_id, int(points)))
+                self._log(guild_id, user_id, "points", int(points), int(points) - old, reason)
+            if daily is not None:
+                self.conn.execute(SQL_SET_DAILY, (guild_id, user_id, int(daily)))
+                self._log(guild_id, user_id, "daily", int(daily), None, "daily")
+        self._changed()
+
+    def apply_bulk(self, guild_id: int, rows, reason: str):
+        with self.bulk(guild_id, reason) as batch:
+            batch.write(rows)
+
+    def bulk(self, guild_id: int, reason: str) -> "BulkWrite":
+        return SqliteBulkWrite(self, guild_id, reason)
+
+    def top(self, guild_id: int, n: int, start: int = 0, after=None) -> list:
+        if after is not None:
+            # keyset: a seek in points_rank, where OFFSET walks every row before the page
+            uid, pts = after
+            query, args = SQL_TOP_AFTER, (guild_id, pts, pts, uid, n)
+        else:
+            query, args = SQL_TOP, (guild_id, n, start)
+        with self._lock:
+            return [(int(uid), int(pts)) for uid, pts in self.conn.execute(query, args)]
+
+    def rank(self, guild_id: int, user_id: int):
+        with self._lock:
+            row = self.conn.execute(SQL_GET_POINTS, (guild_id, user_id)).fetchone()
+            if row is None:
+                return None
+            pts = int(row[0])
+            return self.conn.execute(SQL_RANK, (guild_id, pts, guild_id, pts, user_id)).fetchone()[0] + 1
+
+    def count_points(self, guild_id: int) -> int:
+        with self._lock:
+            return self.conn.execute(SQL_COUNT_POINTS, (guild_id,)).fetchone()[0]
+
+    def guild_points(self, guild_id: int) -> list:
+        with self._lock:
+            return [(int(uid), int(pts)) for uid, pts in self.conn.execute(SQL_GUILD_POINTS, (guild_id,))]
+
+    def history(self, guild_id: int, user_id: int, limit: int) -> list:
+        with self._lock:
+            rows = self.conn.execute(SQL_HISTORY, (guild_id, user_id, limit)).fetchall()
+        records = []
+        for ts, op, value, delta, reason in rows:
+            rec = {"ts": ts, "op": op, "g": str(guild_id), "u": str(user_id), "v": value, "r": reason}
+            if op == "points":
+                rec["v"] = int(value)
+                rec["d"] = delta
+            records.append(rec)
+        return records
+
+    def selfcheck(self) -> list:
+        try:
+            with self._lock:
+                result = self.conn.execute("PRAGMA quick_check").fetchone()[0]
+            return [(self.path, None if result == "ok" else RuntimeError(result))]
+        except Exception as e:
+            return [(self.path, e)]
+
+    def memory_stats(self) -> dict:
+        return {"configs_cached": len(self.configs_cache)}
+
+    def _commit(self):
+        start = time.perf_counter()
+        with self._lock:
+            self.conn.commit()
+        self.flushes += 1
+        self.last_flush_seconds = time.perf_counter() - start
+
+    def _bulk_applying(self) -> bool:
+        # a bulk batch half written: committing now would split it
+        return any(bulk.applying for bulk in self.bulks.values())
+
+    async def flush(self):
+        if not self.dirty or self._bulk_applying():
+            return
+        pending = self.dirty
+        self.dirty = 0
+        try:
+            await asyncio.to_thread(self._commit)
+        except Exception:
+            self.dirty += pending
+            raise
+
+    def flush_sync(self):
+        if self.dirty and not self._bulk_applying():
+            self.dirty = 0
+            self._commit()
+
+    def abort_bulks(self):
+        for guild_id, bulk in list(self.bulks.items()):
+            print(f"Warning: bulk write ({bulk.reason}) for guild {guild_id} still open at shutdown; discarded")
+            bulk.abort()
+
+    async def close(self):
+        self.abort_bulks()
+        await self.flush()
+        with self._lock:
+            self.conn.close()
+
+def migrate_json_to_sqlite(source: JsonStorage, db_path) -> dict:
+    """Copy configs, balances, daily claims and the ledger history into a SQLite database"""
+    target = SqliteStorage(db_path)
+    economy = source.economy
+    counts = {"configs": 0, "points": 0, "daily": 0, "ledger": 0, "skipped": 0}
+    with target._lock, target.conn:
+        for gid, cfg in source.config_store.data.items():
+            target.conn.execute(SQL_SET_CONFIG, (int(gid), json.dumps(cfg, separators=(",", ":"))))
+            counts["configs"] += 1
+        # old flat {user_id: points} entries have no guild to belong to
+        counts["skipped"] = len(economy.legacy)
+        for gid, table in economy.tables.items():
+            rows = [(gid, uid, pts) for uid, pts in table.points_items()]
+            target.conn.executemany(SQL_SET_POINTS, rows)
+            counts["points"] += len(rows)
+            rows = [(gid, uid, claim) for uid, claim in zip(table.ids, table.claims) if claim]
+            target.conn.executemany(SQL_SET_DAILY, rows)
+            counts["daily"] += len(rows)
+        for path in economy.segments():
+            rows = [(r["ts"], int(r["g"]), int(r["u"]), r["op"], str(r["v"]), r.get("d"), r.get("r", ""))
+                    for rec in read_ledger(path) for r in user_records(rec)]
+            target.conn.executemany(SQL_LOG, rows)
+            counts["ledger"] += len(rows)
+    target.conn.close()
+    return counts
+
+# ---------- OPENING A BACKEND ----------
+def open_storage(backend: str = "json", *, config_file="config.json", points_file="points.json",
+                 daily_file="daily.json", ledger_file="ledger.jsonl", sqlite_file="bot.db", partitions_dir="guilds",
+                 cache_size: int = 256, idle_seconds: float = 900, compact_after: int = 50000, archive: bool = True,
+                 address=None, authkey: bytes = b"", timeout: float = 5.0, read_only: bool = False) -> Storage:
+    """The backend named by STORAGE_BACKEND: "json", "partitioned", "sqlite" or
+    "remote" (a cluster.py storage owner at `address`).  Opening a local one
+    creates its files when they are missing, unless `read_only` is set: then
+    missing files read as empty (a missing SQLite database is an error) and
+    nothing is written until the caller writes."""
+    if backend == "remote":
+        # a worker of `python cluster.py`; the storage owner process holds the data
+        from cluster import RemoteStorage
+        return RemoteStorage(address, authkey, cache_size=cache_size, timeout=timeout)
+    if backend == "partitioned":
+        # split existing JSON data first with: python storage.py migrate-partitions
+        from partitions import PartitionedStorage
+        return PartitionedStorage(partitions_dir, cache_size=cache_size, idle_seconds=idle_seconds,
+                                  compact_after=compact_after, archive=archive, read_only=read_only)
+    if backend == "sqlite":
+        # migrate existing JSON data first with: python storage.py migrate-sqlite
+        return SqliteStorage(sqlite_file, read_only=read_only)
+    # points/daily files are snapshots; recent changes are replayed from the ledger
+    return JsonStorage(config_file, points_file, daily_file, ledger_file, compact_after=compact_after, archive=archive,
+                       read_only=read_only)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bot storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mig = sub.add_parser("migrate-sqlite", help="copy the JSON files into a SQLite database")
+    mig.add_argument("--config", default="config.json")
+    mig.add_argument("--points", default="points.json")
+    mig.add_argument("--daily", default="daily.json")
+    mig.add_argument("--ledger", default="ledger.jsonl")
+    mig.add_argument("--db", default="bot.db")
+    part = sub.add_parser("migrate-partitions", help="split the JSON files into one folder per guild")
+    part.add_argument("--config", default="config.json")
+    part.add_argument("--points", default="points.json")
+    part.add_argument("--daily", default="daily.json")
+    part.add_argument("--ledger", default="ledger.jsonl")
+    part.add_argument("--root", default="guilds")
+    args = parser.parse_args()
+
+    if args.command == "migrate-sqlite":
+        source = JsonStorage(args.config, args.points, args.daily, args.ledger)
+        counts = migrate_json_to_sqlite(source, args.db)
+        print(f"Migrated into {args.db}: " + ", ".join(f"{v} {k}" for k, v in counts.items()))
+    elif args.command == "migrate-partitions":
+        from partitions import migrate_json_to_partitions
+        source = JsonStorage(args.config, args.points, args.daily, args.ledger)
+        counts = migrate_json_to_partitions(source, args.root)
+        print(f"Migrated into {args.root}/: " + ", ".join(f"{v} {k}" for k, v in counts.items()))
@@ -0,0 +1,126 @@
+# tables.py
+import sys
+from array import array
+from datetime import datetime, timezone
+
+NO_POINTS = -1   # the user has a row (e.g. only a daily claim) but no balance entry
+
+def iso_to_epoch(iso: str) -> int:
+    """Epoch seconds for an ISO datetime; naive values are UTC (datetime.utcnow())"""
+    dt = datetime.fromisoformat(iso)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def epoch_to_iso(epoch: int) -> str:
+    """Naive UTC ISO datetime, the format daily.json has always used"""
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None).isoformat()
+
+def to_epoch(value) -> int:
+    """Epoch seconds from an int, a numeric string or an ISO datetime; 0 if unknown"""
+    if not value:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    try:
+        return iso_to_epoch(value)
+    except:
+        return 0
+
+class GuildTable:
+    """One guild's users in parallel typed arrays.
+
+    `slots` maps an int user id to its row; `points` and `claims` hold the
+    balance (NO_POINTS if none) and the last daily claim in epoch seconds
+    (0 if never).  Rows are never removed."""
+
+    __slots__ = ("slots", "ids", "points", "claims")
+
+    def __init__(self):
+        self.slots = {}
+        self.ids = array("q")
+        self.points = array("q")
+        self.claims = array("q")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _slot(self, user_id: int) -> int:
+        slot = self.slots.get(user_id)
+        if slot is None:
+            slot = self.slots[user_id] = len(self.ids)
+            self.ids.append(user_id)
+            self.points.append(NO_POINTS)
+            self.claims.append(0)
+        return slot
+
+    def get_points(self, user_id: int) -> int:
+        slot = self.slots.get(user_id)
+        if slot is None:
+            return 0
+        pts = self.points[slot]
+        return pts if pts != NO_POINTS else 0
+
+    def set_points(self, user_id: int, value: int):
+        self.points[self._slot(user_id)] = value
+
+    def has_points(self, user_id: int) -> bool:
+        slot = self.slots.get(user_id)
+        return slot is not None and self.points[slot] != NO_POINTS
+
+    def clear_points(self, user_id: int):
+        """Drop the balance entry (the row stays, as rows are never removed)"""
+        slot = self.slots.get(user_id)
+        if slot is not None:
+            self.points[slot] = NO_POINTS
+
+    def get_claim(self, user_id: int) -> int:
+        slot = self.slots.get(user_id)
+        return self.claims[slot] if slot is not None else 0
+
+    def set_claim(self, user_id: int, epoch: int):
+        self.claims[self._slot(user_id)] = epoch
+
+    def points_items(self):
+        """(user_id, points) for every user with a balance entry"""
+        for uid, pts in zip(self.ids, self.points):
+            if pts != NO_POINTS:
+                yield uid, pts
+
+    def copy(self):
+        other = GuildTable()
+        other.slots = self.slots.copy()
+        other.ids = array("q", self.ids)
+        other.points = array("q", self.points)
+        other.claims = array("q", self.claims)
+        return other
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the table; O(1), so it is cheap enough for metrics"""
+        size = sys.getsizeof(self.slots) + sum(sys.getsizeof(a) for a in (self.ids, self.points, self.claims))
+        # plus the int objects for each user id key and slot value
+        return size + len(self.ids) * (sys.getsizeof(1 << 62) + sys.getsizeof(1 << 20))
+
+    # ----- JSON layout: { user_id: points } and { user_id: iso_datetime } -----
+    @classmethod
+    def from_json(cls, points: dict, daily: dict):
+        table = cls()
+        for uid, pts in points.items():
+            table.set_points(int(uid), int(pts))
+        for uid, iso in daily.items():
+            table.set_claim(int(uid), to_epoch(iso))
+        return table
+
+    def to_json(self):
+        points = {}
+        daily = {}
+        for uid, pts, claim in zip(self.ids, self.points, self.claims):
+            if pts != NO_POINTS:
+                points[str(uid)] = pts
+            if claim:
+                daily[str(uid)] = epoch_to_iso(claim)
+        return points, daily
@@ -0,0 +1,32 @@
+# tests/conftest.py
+# The modules live at the repo root; run the tests from there with python -m pytest.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def bot_module(tmp_path_factory):
+    """bot.py imported inside a scratch directory: importing it opens the data files there"""
+    folder = tmp_path_factory.mktemp("bot")
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        import bot
+        yield bot
+        bot.writer.flush_all_sync()
+    finally:
+        os.chdir(cwd)
+
+@pytest.fixture
+def json_storage(tmp_path):
+    """Opens a JsonStorage on config.json, points.json, daily.json and ledger.jsonl
+    in a folder (the test's tmp_path unless given); call it again to reopen"""
+    from storage import JsonStorage
+
+    def open_json(folder=tmp_path, **kwargs):
+        return JsonStorage(*(str(folder / name) for name in ("config.json", "points.json", "daily.json", "ledger.jsonl")),
+                           **kwargs)
+    return open_json
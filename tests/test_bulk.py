@@ -0,0 +1,128 @@
+# tests/test_bulk.py
+import asyncio
+import sqlite3
+
+import pytest
+
+from benchmarks.fakes import FakeAttachment, FakeChannel, FakeGuild, FakeInteraction, FakeUser
+from bulk import parse_csv
+from partitions import PartitionedStorage
+from storage import BulkWrite, SqliteStorage
+
+GUILD = 10**17 + 1
+USERS = [3 * 10**17 + u for u in range(4)]
+
+@pytest.fixture
+def open_backend(tmp_path, json_storage):
+    def open_kind(kind):
+        if kind == "json":
+            return json_storage()
+        if kind == "partitioned":
+            return PartitionedStorage(str(tmp_path / "guilds"))
+        return SqliteStorage(str(tmp_path / "bot.db"))
+    return open_kind
+
+def balances(storage):
+    return [storage.get_points(GUILD, uid) for uid in USERS]
+
+@pytest.mark.parametrize("kind", ["json", "partitioned", "sqlite"])
+def test_exception_in_bulk_aborts_it(kind, open_backend):
+    async def run():
+        storage = open_backend(kind)
+        for uid in USERS[:3]:
+            storage.set_points(GUILD, uid, 10, "set")
+        with pytest.raises(ValueError):
+            with storage.bulk(GUILD, "import") as batch:
+                batch.write([(USERS[0], 50), (USERS[1], 60), (USERS[3], 70)])
+                # changed after its row was written: the change stays
+                storage.set_points(GUILD, USERS[1], 11, "trigger")
+                raise ValueError("bad row")
+        assert balances(storage) == [10, 11, 10, 0]
+        if kind != "sqlite":
+            assert dict(storage.guild_points(GUILD)).keys() == set(USERS[:3])
+        await storage.close()
+        return balances(open_backend(kind))
+    assert asyncio.run(run()) == [10, 11, 10, 0]
+
+def test_generic_bulk_abort_restores_old_balances(open_backend):
+    storage = open_backend("json")
+    storage.set_points(GUILD, USERS[0], 10, "set")
+    with pytest.raises(asyncio.CancelledError):
+        with BulkWrite(storage, GUILD, "decay") as batch:
+            batch.write([(USERS[0], 5), (USERS[1], 5), (USERS[2], 5)])
+            storage.set_points(GUILD, USERS[2], 7, "trigger")
+            raise asyncio.CancelledError
+    assert balances(storage)[:3] == [10, 0, 7]
+
+def test_sqlite_writes_commit_while_a_bulk_is_open(open_backend, tmp_path):
+    async def run():
+        storage = open_backend("sqlite")
+        reader = sqlite3.connect(tmp_path / "bot.db")
+        committed = lambda uid: reader.execute("SELECT points FROM points WHERE user_id = ?", (uid,)).fetchone()
+        with storage.bulk(GUILD, "season") as batch:
+            batch.write([(USERS[0], 0), (USERS[1], 0)])
+            storage.set_points(GUILD, USERS[2], 30, "trigger")
+            await storage.flush()
+            assert committed(USERS[2]) == (30,)
+            assert committed(USERS[0]) is None
+        await storage.flush()
+        assert committed(USERS[0]) == (0,)
+        reader.close()
+        await storage.close()
+    asyncio.run(run())
+
+def test_sqlite_close_discards_an_open_bulk(open_backend, capsys):
+    async def run():
+        storage = open_backend("sqlite")
+        storage.set_points(GUILD, USERS[0], 10, "set")
+        batch = storage.bulk(GUILD, "import").__enter__()
+        batch.write([(USERS[0], 99), (USERS[1], 99)])
+        storage.set_points(GUILD, USERS[2], 5, "trigger")
+        await storage.close()
+        return balances(open_backend("sqlite"))
+    assert asyncio.run(run()) == [10, 0, 5, 0]
+    assert "still open at shutdown" in capsys.readouterr().out
+
+def test_sqlite_bulk_cancelled_while_writing_puts_rows_back(open_backend, monkeypatch):
+    monkeypatch.setattr("storage.SQLITE_BULK_CHUNK", 2)
+
+    async def run():
+        storage = open_backend("sqlite")
+        storage.set_points(GUILD, USERS[0], 10, "set")
+        await storage.flush()
+
+        async def bulk():
+            async with storage.bulk(GUILD, "decay") as batch:
+                batch.write([(uid, 1) for uid in USERS])
+
+        task = asyncio.create_task(bulk())
+        await asyncio.sleep(0)      # the first chunk is written, the batch is not committed
+        assert storage.get_points(GUILD, USERS[0]) == 1
+        storage.set_points(GUILD, USERS[1], 42, "trigger")
+        await storage.flush()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert balances(storage) == [10, 42, 0, 0]
+        assert storage.history(GUILD, USERS[0], 5)[0]["r"] == "set"
+        await storage.close()
+        return balances(open_backend("sqlite"))
+    assert asyncio.run(run()) == [10, 42, 0, 0]
+
+def test_csv_rejects_non_ascii_digits_and_values_past_int64():
+    rows, errors = parse_csv("user_id,points\n5,²\n6,99999999999999999999\n²,1\n7,9223372036854775807\n".encode())
+    assert rows == [(7, 2**63 - 1)]
+    assert [e.split(":")[0] for e in errors] == ["line 2", "line 3", "line 4"]
+
+def test_import_failure_still_answers_the_interaction(bot_module, monkeypatch):
+    guild = FakeGuild(GUILD + 50)
+    channel = guild.add_channel(FakeChannel(GUILD + 51))
+    interaction = FakeInteraction(guild, channel, FakeUser(1, administrator=True))
+
+    async def broken(*args, **kwargs):
+        raise OverflowError("int too big to convert")
+
+    monkeypatch.setattr(bot_module, "run_bulk", broken)
+    asyncio.run(bot_module.importpoints_cmd.callback(interaction, FakeAttachment(b"5,10\n")))
+    content, _ = interaction.edits[-1]
+    assert content.startswith("Import failed, nothing changed")
@@ -0,0 +1,81 @@
+# tests/test_cluster.py
+import asyncio
+import os
+import threading
+
+import pytest
+
+from cluster import RemoteStorage, StorageServer
+
+GUILD = 10**17 + 1
+USER = 3 * 10**17
+
+@pytest.fixture
+def owner(json_storage):
+    """A StorageServer on its own loop in a thread, serving a JsonStorage"""
+    storage = json_storage()
+    authkey = os.urandom(16)
+    server = StorageServer(storage, ("127.0.0.1", 0), authkey)
+    thread = threading.Thread(target=asyncio.run, args=(server.serve(),), daemon=True)
+    thread.start()
+    yield storage, server.address, authkey
+    RemoteStorage(server.address, authkey).shutdown_owner()
+    thread.join(5)
+
+def test_change_points_from_two_workers_adds_up(owner):
+    storage, address, authkey = owner
+    first = RemoteStorage(address, authkey)
+    second = RemoteStorage(address, authkey)
+    assert first.change_points(GUILD, USER, 5, "trigger") == 5
+    # the second client's first sight of the user goes to the owner, so it sees the 5
+    assert second.change_points(GUILD, USER, 3, "trigger") == 8
+    for _ in range(100):
+        first.change_points(GUILD, USER, 1, "trigger")
+    assert first.calls == 2     # config and the first change; the rest were sent without waiting
+    second.configs()            # a round trip on each connection: everything sent before it is applied
+    first.configs()
+    assert storage.get_points(GUILD, USER) == 108
+
+def test_config_is_cached_until_set(owner):
+    storage, address, authkey = owner
+    client = RemoteStorage(address, authkey)
+    assert client.get_config(GUILD) is None
+    calls = client.calls
+    assert client.get_config(GUILD) is None
+    assert client.calls == calls
+    client.set_config(GUILD, {"DAILY_REWARD": 7})
+    assert client.get_config(GUILD) == {"DAILY_REWARD": 7}
+    assert storage.get_config(GUILD) == {"DAILY_REWARD": 7}
+
+def test_evicted_guilds_are_reported(owner):
+    _, address, authkey = owner
+    evicted = []
+    client = RemoteStorage(address, authkey, cache_size=1)
+    client.on_evict = evicted.append
+    client.get_points(GUILD, USER)
+    client.get_points(GUILD + 1, USER)
+    assert evicted == [GUILD]
+    assert list(client.guilds) == [GUILD + 1]
+
+def test_slow_owner_times_out_instead_of_freezing_the_worker(owner, monkeypatch):
+    storage, address, authkey = owner
+    client = RemoteStorage(address, authkey, timeout=0.2)
+    client.get_config(GUILD)
+    answered = threading.Event()
+    get_points = storage.get_points
+
+    def stuck(guild_id, user_id):
+        answered.wait(5)
+        return get_points(guild_id, user_id)
+
+    monkeypatch.setattr(storage, "get_points", stuck)
+    with pytest.raises(TimeoutError):
+        client.get_points(GUILD, USER)
+    # no second wait while the owner has not answered anything
+    with pytest.raises(TimeoutError, match="not answering"):
+        client.get_points(GUILD, USER + 1)
+    assert client.memory_stats()["remote_timeouts"] == 1
+    answered.set()
+    asyncio.run(client.flush())     # the late answers came back: the owner is usable again
+    assert not client.unresponsive
+    assert client.get_points(GUILD, USER + 2) == 0
@@ -0,0 +1,13 @@
+# tests/test_guild_runtime.py
+import pytest
+
+from guild_runtime import DEFAULT_GUILD_CONFIG, GuildRuntime
+
+def test_runtime_cannot_be_changed_in_place():
+    rt = GuildRuntime.from_config(10**17, {"GAMBLE_WIN_CHANCE": "40", "CHANNEL_ID": 5}, DEFAULT_GUILD_CONFIG)
+    assert rt.gamble_win_chance == 40 and rt.channels == frozenset({5})
+    with pytest.raises(AttributeError):
+        rt.gamble_win_chance = 100
+    with pytest.raises(AttributeError):
+        del rt.daily_reward
+    assert rt.gamble_win_chance == 40
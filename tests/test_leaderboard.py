@@ -0,0 +1,154 @@
+# tests/test_leaderboard.py
+import asyncio
+import itertools
+import random
+
+import pytest
+
+from benchmarks.fakes import FakeChannel, FakeGuild, FakeInteraction, FakeUser
+from leaderboard import GuildLeaderboard, Leaderboards, StorageLeaderboard
+from storage import SqliteStorage
+
+GUILD = 10**17 + 1
+guild_ids = itertools.count(10**17 + 100)
+
+class SlowGuild(FakeGuild):
+    """Member queries take a while, and record whether the interaction was answered first"""
+
+    def __init__(self, guild_id):
+        super().__init__(guild_id)
+        self.interaction = None
+        self.answered_first = []
+
+    async def query_members(self, user_ids=None, limit=5, cache=True, **kwargs):
+        self.answered_first.append(self.interaction.response.is_done())
+        await asyncio.sleep(0.05)
+        return await super().query_members(user_ids=user_ids, limit=limit, cache=cache)
+
+def make_guild(bot, users: int):
+    guild = SlowGuild(next(guild_ids))
+    channel = guild.add_channel(FakeChannel(guild.id + 1))
+    cfg = bot.get_guild_config(guild.id)
+    cfg["CHANNEL_ID"] = channel.id
+    cfg["CHANNEL_IDS"] = [channel.id]
+    bot.save_guild_config(guild.id, cfg)
+    members = [guild.add_member(FakeUser(3 * 10**17 + u)) for u in range(users)]
+    for points, member in enumerate(members, start=1):
+        bot.set_user_points(guild.id, member.id, points, "test")
+    # lean mode: no member cache, members are only found through query_members
+    guild.get_member = lambda user_id: None
+    return guild, channel, members
+
+def interact(guild, channel, user):
+    interaction = FakeInteraction(guild, channel, user)
+    guild.interaction = interaction
+    return interaction
+
+@pytest.fixture
+def lean(bot_module, monkeypatch):
+    monkeypatch.setattr(bot_module, "LEAN_MEMBERS", True)
+    bot_module.member_names.names.clear()
+    return bot_module
+
+def test_leaderboard_defers_before_fetching_names(lean):
+    guild, channel, members = make_guild(lean, 30)
+    interaction = interact(guild, channel, members[0])
+    asyncio.run(lean.leaderboard_cmd.callback(interaction, 10, None))
+    assert guild.answered_first == [True]
+    assert not interaction.response.messages
+    _, embed, _ = interaction.followup.messages[0]
+    assert embed.fields[0].name == f"1. {members[-1].display_name}"
+    assert interaction.followup.view is not None
+
+def test_page_turn_defers_before_fetching_names(lean):
+    guild, channel, members = make_guild(lean, 30)
+    interaction = interact(guild, channel, members[0])
+    asyncio.run(lean.leaderboard_cmd.callback(interaction, 10, None))
+    view = interaction.followup.view
+    click = interact(guild, channel, members[0])
+    asyncio.run(view.turn(click, 1))
+    assert guild.answered_first == [True, True]
+    _, embed = click.edits[0]
+    assert embed.fields[0].name == f"11. {members[19].display_name}"
+    assert view.page == 2
+
+def test_rank_defers_before_fetching_names(lean):
+    guild, channel, members = make_guild(lean, 10)
+    interaction = interact(guild, channel, members[0])
+    asyncio.run(lean.rank_cmd.callback(interaction, members[4]))
+    assert guild.answered_first == [True]
+    content, _, ephemeral = interaction.followup.messages[0]
+    assert "ranked **#6** of 10" in content and ephemeral
+
+def test_names_without_lean_mode_answer_at_once(bot_module):
+    guild, channel, members = make_guild(bot_module, 5)
+    del guild.get_member
+    interaction = interact(guild, channel, members[0])
+    asyncio.run(bot_module.leaderboard_cmd.callback(interaction, None, None))
+    assert guild.answered_first == []
+    _, embed, _ = interaction.response.messages[0]
+    assert embed.fields[0].name == f"1. {members[-1].display_name}"
+
+def test_sqlite_board_matches_the_in_memory_one(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "bot.db"))
+    rng = random.Random(5)
+    for uid in range(300):
+        # few distinct balances, so ties have to come out by user id too
+        storage.set_points(GUILD, uid, rng.randrange(20), "test")
+    storage.set_points(GUILD + 1, 7, 1000, "test")
+    board = Leaderboards(storage).get(GUILD)
+    memory = GuildLeaderboard(storage.guild_points(GUILD))
+    assert isinstance(board, StorageLeaderboard)
+    assert len(board) == len(memory) == 300
+    for start in (0, 25, 290):
+        assert board.top(25, start) == memory.top(25, start)
+    for uid in (0, 13, 299):
+        assert board.rank(uid) == memory.rank(uid)
+        assert board.around(uid) == memory.around(uid)
+    assert board.rank(1234) is None
+
+def test_boards_are_capped(json_storage):
+    storage = json_storage()
+    for gid in range(3):
+        storage.set_points(GUILD + gid, 1, 10, "test")
+    boards = Leaderboards(storage, size=2)
+    for gid in range(3):
+        assert boards.get(GUILD + gid).top(1) == [(1, 10)]
+    assert list(boards.guilds) == [GUILD + 1, GUILD + 2]
+    assert boards.evictions == 1
+    assert boards.entries() == 2
+
+def test_sqlite_board_counts_once_per_change(tmp_path, monkeypatch):
+    storage = SqliteStorage(str(tmp_path / "bot.db"))
+    for uid in range(3):
+        storage.set_points(GUILD, uid, 10, "test")
+    counts = []
+    count_points = storage.count_points
+    monkeypatch.setattr(storage, "count_points", lambda gid: counts.append(gid) or count_points(gid))
+    board = Leaderboards(storage).get(GUILD)
+    assert len(board) == len(board) == 3
+    storage.set_points(GUILD, 3, 10, "test")
+    board.update(3, 10)
+    assert len(board) == len(board) == 4
+    assert counts == [GUILD, GUILD]
+
+def test_sqlite_pages_read_on_from_the_previous_page(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "bot.db"))
+    rng = random.Random(7)
+    for uid in range(300):
+        # few balances: ties run across page boundaries
+        storage.set_points(GUILD, uid, rng.randrange(5), "test")
+    memory = GuildLeaderboard(storage.guild_points(GUILD))
+    board = Leaderboards(storage).get(GUILD)
+    seeks = []
+    top = storage.top
+    storage.top = lambda gid, n, start=0, after=None: seeks.append(after is not None) or top(gid, n, start, after)
+    for start in range(0, 300, 25):
+        assert board.top(25, start) == memory.top(25, start)
+    assert seeks == [False] + [True] * 11
+    # after a change the old cursors mark other ranks: the next page is read by offset
+    storage.set_points(GUILD, 0, 100, "test")
+    board.update(0, 100)
+    memory.update(0, 100)
+    assert board.top(25, 25) == memory.top(25, 25)
+    assert seeks[-1] is False
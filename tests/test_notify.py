@@ -0,0 +1,44 @@
+# tests/test_notify.py
+import asyncio
+import time
+
+import pytest
+
+from notify import TriggerNotifier
+
+class Channel:
+    def __init__(self, channel_id=1):
+        self.id = channel_id
+        self.sent = []
+
+    async def send(self, text):
+        self.sent.append((time.monotonic(), text))
+
+def test_second_burst_does_not_get_a_fresh_budget():
+    async def run():
+        notifier = TriggerNotifier(window=0.01, budget=2, budget_seconds=1.0)
+        channel = Channel()
+        # first burst spends the whole budget
+        for uid in (1, 2):
+            notifier.push(channel, uid, f"<@{uid}>", 1, 1)
+            await asyncio.sleep(0.05)
+        assert len(channel.sent) == 2
+        # second burst inside the same window has to wait for a token
+        notifier.push(channel, 3, "<@3>", 1, 1)
+        await asyncio.sleep(0.1)
+        assert len(channel.sent) == 2
+        await asyncio.sleep(0.5)
+        assert len(channel.sent) == 3
+        first, third = channel.sent[0][0], channel.sent[2][0]
+        assert third - first >= 0.45
+        # the idle channel is dropped once its bucket is full again
+        await asyncio.sleep(1.1)
+        assert notifier.channels == {}
+        await notifier.close()
+
+    asyncio.run(run())
+
+@pytest.mark.parametrize("budget, seconds", [(0, 5.0), (4, 0), (4, -1.0)])
+def test_budget_must_allow_sending(budget, seconds):
+    with pytest.raises(ValueError):
+        TriggerNotifier(budget=budget, budget_seconds=seconds)
@@ -0,0 +1,93 @@
+# tests/test_partitions.py
+import asyncio
+import time
+
+from partitions import PartitionedStorage
+from storage import EconomyStore
+
+A, B = 10**17 + 1, 10**17 + 2
+USER = 3 * 10**17
+
+def test_evicted_during_flush_keeps_unwritten_changes(tmp_path, monkeypatch):
+    root = tmp_path / "guilds"
+    write_lines = EconomyStore._write_lines
+
+    def slow_write(self, lines):
+        time.sleep(0.2)
+        return write_lines(self, lines)
+
+    async def run():
+        storage = PartitionedStorage(root, cache_size=1)
+        storage.set_points(A, USER, 100, "set")
+        await storage.flush()
+        storage.set_points(A, USER, 105, "adjust")
+        monkeypatch.setattr(EconomyStore, "_write_lines", slow_write)
+        flushing = asyncio.create_task(storage.flush())
+        await asyncio.sleep(0.05)
+        # guild B pushes A out of the cache while A's ledger write is still running
+        assert storage.get_points(B, USER) == 0
+        assert A not in storage.partitions.open
+        assert A in storage.partitions.evicting
+        assert storage.get_points(A, USER) == 105
+        await flushing
+        monkeypatch.setattr(EconomyStore, "_write_lines", write_lines)
+        await storage.close()
+
+    asyncio.run(run())
+    reopened = PartitionedStorage(root, cache_size=1)
+    assert reopened.get_points(A, USER) == 105
+
+def test_idle_partition_is_closed_after_flush(tmp_path):
+    async def run():
+        evicted = []
+        storage = PartitionedStorage(tmp_path / "guilds", cache_size=1)
+        storage.on_evict = evicted.append
+        storage.set_points(A, USER, 7, "set")
+        storage.get_points(B, USER)
+        assert A in storage.partitions.evicting
+        await storage.flush()
+        assert A not in storage.partitions.evicting
+        assert evicted == [A]
+
+    asyncio.run(run())
+
+def test_cold_guild_is_read_once_off_the_loop(tmp_path, monkeypatch):
+    root = tmp_path / "guilds"
+    seed = PartitionedStorage(root)
+    seed.set_points(A, USER, 42, "set")
+    seed.flush_sync()
+    init = EconomyStore.__init__
+    reads = []
+
+    def slow_read(self, *args, **kwargs):
+        reads.append(1)
+        time.sleep(0.2)     # a long ledger replay
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(EconomyStore, "__init__", slow_read)
+
+    async def run():
+        storage = PartitionedStorage(root, cache_size=1)
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        await storage.load_guild(A, economy=False)
+        ticker = asyncio.create_task(tick())
+        loads = [asyncio.create_task(storage.load_guild(A)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        # another guild comes into the one-guild cache while A's ledger is read: A stays
+        assert storage.get_config(B) is None
+        assert list(storage.partitions.open) == [A]
+        await asyncio.gather(*loads)
+        ticker.cancel()
+        assert reads == [1]
+        assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+        assert A in storage.partitions.open
+        assert storage.get_points(A, USER) == 42
+        assert reads == [1]
+
+    asyncio.run(run())
@@ -0,0 +1,41 @@
+# tests/test_shutdown.py
+import os
+import signal
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUILD = 10**17 + 1
+USER = 3 * 10**17
+
+# the bot without a gateway connection: setup_hook as login() would run it,
+# one change waiting for the writer, then nothing until the process is stopped
+CHILD = f"""
+import asyncio
+import bot
+
+async def main():
+    async with bot.bot:
+        await bot.bot.setup_hook()
+        bot.set_user_points({GUILD}, {USER}, 42, "test")
+        print("ready", flush=True)
+        while not bot.bot.is_closed():
+            await asyncio.sleep(0.05)
+
+asyncio.run(main())
+"""
+
+def test_sigterm_flushes_pending_writes(tmp_path, json_storage):
+    # far longer than the test: only the shutdown can write the change
+    env = dict(os.environ, FLUSH_INTERVAL_SECONDS="3600", COMMAND_SYNC="off", STORAGE_BACKEND="json",
+               PYTHONPATH=os.pathsep.join(filter(None, (REPO, os.environ.get("PYTHONPATH")))))
+    child = subprocess.Popen([sys.executable, "-c", CHILD], cwd=tmp_path, env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        assert child.stdout.readline().strip() == "ready"
+        child.send_signal(signal.SIGTERM)
+        _, err = child.communicate(timeout=30)
+    finally:
+        child.kill()
+    assert child.returncode == 0, err
+    assert json_storage().get_points(GUILD, USER) == 42
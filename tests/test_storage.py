@@ -0,0 +1,72 @@
+# tests/test_storage.py
+import asyncio
+import sqlite3
+
+import pytest
+
+from storage import open_storage
+
+GUILD = 10**17 + 1
+USER = 3 * 10**17
+
+@pytest.mark.parametrize("backend", ["json", "partitioned"])
+def test_read_only_open_creates_nothing(backend, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = open_storage(backend, read_only=True)
+    assert storage.get_config(GUILD) is None
+    assert storage.guild_points(GUILD) == []
+    assert storage.get_points(GUILD, USER) == 0
+    assert list(tmp_path.iterdir()) == []
+
+def test_read_only_sqlite_needs_the_database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(sqlite3.OperationalError):
+        open_storage("sqlite", read_only=True)
+    writer = open_storage("sqlite")
+    writer.set_points(GUILD, USER, 7, "set")
+    writer.flush_sync()
+    assert open_storage("sqlite", read_only=True).guild_points(GUILD) == [(USER, 7)]
+
+def test_ledger_is_replayed_on_reopen(json_storage, tmp_path):
+    storage = json_storage()
+    storage.set_points(GUILD, USER, 10, "set")
+    storage.change_points(GUILD, USER, 5, "trigger", claim=1_700_000_000)
+    with storage.bulk(GUILD, "import") as batch:
+        batch.write([(USER + 1, 30), (USER + 2, 40)])
+    storage.set_points(GUILD, USER + 2, 41, "adjust")
+    storage.flush_sync()
+    # nothing compacted yet: everything above is only in the ledger
+    assert not (tmp_path / "points.json").read_text().strip("{}\n")
+    reopened = json_storage()
+    assert sorted(reopened.guild_points(GUILD)) == [(USER, 15), (USER + 1, 30), (USER + 2, 41)]
+    assert reopened.get_daily(GUILD, USER) == 1_700_000_000
+
+def test_crash_during_compaction_loses_nothing(json_storage, tmp_path, monkeypatch):
+    storage = json_storage(archive=False)
+    storage.set_points(GUILD, USER, 10, "set")
+    storage.set_points(GUILD, USER + 2, 30, "set")     # only ever in the rotated segment
+
+    def crash(snapshot):
+        raise OSError("killed while writing the snapshots")
+
+    async def run():
+        await storage.flush()
+        monkeypatch.setattr(storage.economy, "_finish_compaction", crash)
+        with pytest.raises(OSError):
+            await storage.economy.compact()
+        # the ledger was rotated but no snapshot covers it; later changes go to a new segment
+        assert (tmp_path / "ledger.jsonl.old").exists()
+        storage.set_points(GUILD, USER + 1, 20, "set")
+        storage.set_points(GUILD, USER, 11, "adjust")
+        await storage.flush()
+
+    asyncio.run(run())
+    reopened = json_storage(archive=False)
+    assert sorted(reopened.guild_points(GUILD)) == [(USER, 11), (USER + 1, 20), (USER + 2, 30)]
+
+    async def finish():
+        await reopened.close()
+
+    asyncio.run(finish())
+    assert not (tmp_path / "ledger.jsonl.old").exists()
+    assert sorted(json_storage().guild_points(GUILD)) == [(USER, 11), (USER + 1, 20), (USER + 2, 30)]
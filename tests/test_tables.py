@@ -0,0 +1,31 @@
+# tests/test_tables.py
+from tables import GuildTable, epoch_to_iso
+
+def test_json_round_trip():
+    points = {"300000000000000001": 15, "300000000000000002": 0, "300000000000000003": 2**62}
+    # a claim without a balance entry, an old naive ISO claim and an epoch one
+    daily = {"300000000000000002": "2024-05-01T12:30:00", "300000000000000004": "2024-05-02T00:00:00",
+             "300000000000000001": 1_700_000_000}
+    table = GuildTable.from_json(points, daily)
+    assert table.get_points(300000000000000004) == 0
+    assert not table.has_points(300000000000000004)
+    assert table.has_points(300000000000000002)
+    out_points, out_daily = table.to_json()
+    assert out_points == points
+    assert out_daily == {**daily, "300000000000000001": epoch_to_iso(1_700_000_000)}
+    again = GuildTable.from_json(out_points, out_daily)
+    assert again.to_json() == (out_points, out_daily)
+
+def test_copy_is_independent():
+    table = GuildTable.from_json({"1": 5}, {})
+    copy = table.copy()
+    table.set_points(1, 6)
+    table.set_points(2, 7)
+    assert copy.to_json() == ({"1": 5}, {})
+    assert len(copy) == 1
+
+def test_cleared_balance_is_left_out():
+    table = GuildTable.from_json({"1": 5, "2": 6}, {"1": 1_700_000_000})
+    table.clear_points(1)
+    assert table.to_json() == ({"2": 6}, {"1": epoch_to_iso(1_700_000_000)})
+    assert list(table.points_items()) == [(2, 6)]
@@ -0,0 +1,106 @@
+# tests/test_transactions.py
+import asyncio
+import itertools
+
+from benchmarks.fakes import FakeChannel, FakeChoice, FakeGuild, FakeInteraction, FakeUser
+from transactions import Transactions
+
+GUILD = 10**17 + 1
+USER = 3 * 10**17
+guild_ids = itertools.count(10**17 + 1000, 10)     # clear of the guilds other tests give bot_module
+
+def test_concurrent_bets_cannot_spend_a_balance_twice(json_storage):
+    storage = json_storage()
+    storage.set_points(GUILD, USER, 100, "set")
+    txns = Transactions(storage)
+    accepted = []
+
+    async def bet(amount):
+        async with txns.user(GUILD, USER, "gamble") as txn:
+            enough = amount <= txn.balance
+            await asyncio.sleep(0)      # another command for the user gets to run here
+            if enough:
+                txn.add(-amount)
+        accepted.append(enough)
+
+    async def run():
+        await asyncio.gather(*(bet(60) for _ in range(5)))
+
+    asyncio.run(run())
+    assert accepted.count(True) == 1
+    assert storage.get_points(GUILD, USER) == 40
+    assert txns.waits > 0
+
+def test_concurrent_daily_claims_pay_once(json_storage):
+    storage = json_storage()
+    txns = Transactions(storage)
+
+    async def claim():
+        async with txns.user(GUILD, USER, "daily") as txn:
+            await asyncio.sleep(0)
+            remain = txn.claim_daily(24)
+            if remain is None:
+                txn.add(50)
+        return remain is None
+
+    async def run():
+        return await asyncio.gather(*(claim() for _ in range(5)))
+
+    assert asyncio.run(run()).count(True) == 1
+    assert storage.get_points(GUILD, USER) == 50
+    assert storage.get_daily(GUILD, USER) is not None
+
+def test_claim_and_balance_survive_a_reopen_together(json_storage):
+    storage = json_storage()
+    txns = Transactions(storage)
+
+    async def run():
+        async with txns.user(GUILD, USER, "daily") as txn:
+            txn.claim_daily(24)
+            txn.add(50)
+        await storage.close()
+
+    asyncio.run(run())
+    reopened = Transactions(json_storage())
+    assert reopened.storage.get_points(GUILD, USER) == 50
+
+    async def again():
+        async with reopened.user(GUILD, USER, "daily") as txn:
+            return txn.claim_daily(24)
+
+    assert asyncio.run(again()) is not None
+
+def make_guild(bot, **config):
+    guild = FakeGuild(next(guild_ids))
+    channel = guild.add_channel(FakeChannel(guild.id + 1))
+    cfg = bot.get_guild_config(guild.id)
+    cfg.update(config, CHANNEL_ID=channel.id, CHANNEL_IDS=[channel.id])
+    bot.save_guild_config(guild.id, cfg)
+    return guild, channel
+
+def test_daily_command_pays_once_when_sent_together(bot_module):
+    guild, channel = make_guild(bot_module, DAILY_REWARD=50)
+    user = guild.add_member(FakeUser(USER))
+    interactions = [FakeInteraction(guild, channel, user) for _ in range(5)]
+
+    async def run():
+        await asyncio.gather(*(bot_module.daily_cmd.callback(i) for i in interactions))
+
+    asyncio.run(run())
+    replies = [i.response.messages[0] for i in interactions]
+    assert [ephemeral for _, _, ephemeral in replies].count(False) == 1
+    assert bot_module.get_user_points(guild.id, USER) == 50
+
+def test_gamble_commands_sent_together_spend_the_balance_once(bot_module):
+    guild, channel = make_guild(bot_module, GAMBLE_WIN_CHANCE=0)
+    user = guild.add_member(FakeUser(USER))
+    bot_module.set_user_points(guild.id, USER, 100, "test")
+    interactions = [FakeInteraction(guild, channel, user) for _ in range(5)]
+
+    async def run():
+        await asyncio.gather(*(bot_module.gamble_cmd.callback(i, FakeChoice("red"), 60) for i in interactions))
+
+    asyncio.run(run())
+    replies = [i.response.messages[0][0] for i in interactions]
+    assert sum("You lost" in text for text in replies) == 1
+    assert bot_module.get_user_points(guild.id, USER) == 40
@@ -0,0 +1,68 @@
+# tests/test_triggers.py
+import random
+import re
+
+import pytest
+
+from benchmarks.triggers import linear_find, make_workload, random_word
+from triggers import (AUTOMATON_MIN_PATTERNS, MODE_REGEX, MODE_SUBSTRING, MODE_WORD, TriggerMatcher,
+                      compile_trigger_regex)
+
+def linear_find_modes(cfg_triggers: list, message_text: str):
+    """The linear scan, one trigger at a time, with word and regex modes"""
+    low = message_text.lower()
+    for trig in cfg_triggers:
+        if "message" not in trig:
+            continue
+        mode = trig.get("mode", MODE_SUBSTRING)
+        text = str(trig["message"])
+        if mode == MODE_REGEX:
+            try:
+                if compile_trigger_regex(text).search(message_text):
+                    return trig
+            except re.error:
+                continue
+        elif mode == MODE_WORD:
+            if text and re.search(rf"(?<!\w){re.escape(text.lower())}(?!\w)", low):
+                return trig
+        elif text.lower() in low:
+            return trig
+    return None
+
+@pytest.mark.parametrize("count", [5, AUTOMATON_MIN_PATTERNS * 2])
+def test_matches_the_original_scan(count):
+    rng = random.Random(count)
+    triggers, messages = make_workload(rng, count, 500, 0.5)
+    matcher = TriggerMatcher(triggers)
+    for text in messages:
+        assert matcher.match(text) is linear_find(triggers, text), text
+
+@pytest.mark.parametrize("count", [12, AUTOMATON_MIN_PATTERNS * 2])
+def test_matches_a_scan_with_modes(count):
+    rng = random.Random(count)
+    words = [random_word(rng, 2, 5) for _ in range(count)]
+    triggers = []
+    for word in words:
+        mode = rng.choice((None, MODE_SUBSTRING, MODE_WORD, MODE_WORD, MODE_REGEX))
+        trig = {"message": word, "points": 1}
+        if mode == MODE_REGEX:
+            trig["message"] = rng.choice((f"^{word}", f"{word}\\d+", f"{word}("))    # the last one is invalid
+        if mode is not None:
+            trig["mode"] = mode
+        triggers.append(trig)
+    triggers.insert(count // 2, {"points": 1})                     # no message at all
+    triggers.insert(count // 3, {"message": "", "mode": MODE_WORD})  # matches nothing
+    matcher = TriggerMatcher(triggers)
+    for _ in range(500):
+        parts = [rng.choice(words) + rng.choice(("", "", "s", "7", "_x")) for _ in range(rng.randint(1, 6))]
+        text = rng.choice((" ", "", ", ")).join(parts)
+        text = text.upper() if rng.random() < 0.2 else text
+        assert matcher.match(text) is linear_find_modes(triggers, text), text
+
+def test_empty_substring_trigger_matches_everything_after_earlier_ones():
+    triggers = [{"message": "hello"}, {"message": ""}, {"message": "world"}]
+    matcher = TriggerMatcher(triggers)
+    assert matcher.match("hello world") is triggers[0]
+    assert matcher.match("world") is triggers[1]
+    assert matcher.match("") is triggers[1]
+    assert TriggerMatcher([]).match("anything") is None
@@ -0,0 +1,87 @@
+# transactions.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+def daily_remaining(last_claim, cooldown_hours: int):
+    """Time left before the next daily claim, or None if one can be claimed now"""
+    if not last_claim:
+        return None
+    remain = last_claim + cooldown_hours * 3600 - time.time()
+    if remain <= 0:
+        return None
+    return timedelta(seconds=remain)
+
+class UserTransaction:
+    """Pending changes to one user's balance and daily claim.
+
+    Changes are collected here and written by Transactions.user() as a
+    single storage write when the block exits without an exception."""
+
+    __slots__ = ("guild_id", "user_id", "reason", "start_balance", "balance", "last_claim", "claimed")
+
+    def __init__(self, guild_id: int, user_id: int, reason: str, balance: int, last_claim):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.reason = reason
+        self.start_balance = balance
+        self.balance = balance
+        self.last_claim = last_claim    # epoch seconds or None
+        self.claimed = None             # epoch seconds of a claim made in this transaction
+
+    @property
+    def delta(self) -> int:
+        return self.balance - self.start_balance
+
+    def add(self, delta: int) -> int:
+        self.balance = max(0, self.balance + int(delta))
+        return self.balance
+
+    def claim_daily(self, cooldown_hours: int):
+        """Claim the daily reward; returns the time left instead if still on cooldown"""
+        remain = daily_remaining(self.claimed or self.last_claim, cooldown_hours)
+        if remain is None:
+            self.claimed = int(time.time())
+        return remain
+
+class Transactions:
+    """Per-user atomic read-modify-write on top of a Storage.
+
+    Users are spread over a fixed set of asyncio locks (striping), so two
+    commands for the same user run one after the other while commands for
+    different users only rarely wait on each other."""
+
+    def __init__(self, storage, on_commit=None, stripes: int = 64):
+        self.storage = storage
+        self.on_commit = on_commit      # called with (guild_id, user_id, new_balance)
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+        self.commits = 0
+        self.waits = 0                  # transactions that had to wait for a lock
+
+    @asynccontextmanager
+    async def user(self, guild_id: int, user_id: int, reason: str):
+        lock = self._locks[hash((guild_id, user_id)) % len(self._locks)]
+        if lock.locked():
+            self.waits += 1
+        async with lock:
+            txn = UserTransaction(guild_id, user_id, reason,
+                                  self.storage.get_points(guild_id, user_id),
+                                  self.storage.get_daily(guild_id, user_id))
+            yield txn
+            self._commit(txn)
+
+    def _commit(self, txn: UserTransaction):
+        if not txn.delta and txn.claimed is None:
+            return
+        points = None
+        if txn.delta:
+            # apply the delta to the stored balance, so changes made outside a
+            # transaction (e.g. a trigger hit) while this one awaited are kept
+            points = txn.balance = self.storage.change_points(txn.guild_id, txn.user_id, txn.delta, txn.reason,
+                                                              claim=txn.claimed)
+        else:
+            self.storage.commit_user(txn.guild_id, txn.user_id, None, txn.claimed, txn.reason)
+        self.commits += 1
+        if points is not None and self.on_commit is not None:
+            self.on_commit(txn.guild_id, txn.user_id, points)
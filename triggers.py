@@ -0,0 +1,159 @@
+# triggers.py
+import re
+
+# trigger "mode" values; a trigger without a mode is a substring trigger
+MODE_SUBSTRING = "substring"   # case-insensitive substring (original behaviour)
+MODE_WORD = "word"             # case-insensitive, whole word only
+MODE_REGEX = "regex"           # Python regular expression, case-insensitive
+TRIGGER_MODES = (MODE_SUBSTRING, MODE_WORD, MODE_REGEX)
+
+# below this many literal triggers, a loop of C-level `in` checks beats
+# walking the automaton one character at a time in Python (see benchmarks/triggers.py)
+AUTOMATON_MIN_PATTERNS = 100
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+def compile_trigger_regex(pattern: str):
+    """Compile a regex trigger the way the matcher does (raises re.error if invalid)"""
+    return re.compile(pattern, re.IGNORECASE)
+
+class _Automaton:
+    """Aho-Corasick automaton over lowercased literal patterns"""
+
+    __slots__ = ("goto", "fail", "out")
+
+    def __init__(self, patterns):
+        # patterns: list of (pattern_text, pattern_id)
+        self.goto = [{}]
+        self.out = [()]
+        for text, pid in patterns:
+            state = 0
+            for ch in text:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.out.append(())
+                state = nxt
+            self.out[state] = self.out[state] + (pid,)
+        # breadth-first pass to fill failure links and merge outputs
+        self.fail = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def scan(self, text: str):
+        """Yield (end_index, pattern_ids) for every match in text"""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield i, out[state]
+
+class TriggerMatcher:
+    """A guild's TRIGGERS list compiled once for matching many messages.
+
+    `match(text)` returns the same trigger the old linear scan would: the
+    first one in list order that matches the message."""
+
+    __slots__ = ("triggers", "_literals", "_patterns", "_automaton", "_regexes", "_always")
+
+    def __init__(self, triggers: list):
+        self.triggers = list(triggers)
+        self._literals = []     # (index, lowered_text, whole_word) in list order
+        self._regexes = []      # (index, compiled) in list order
+        self._always = None     # index of the first empty substring trigger (matches everything)
+        for idx, trig in enumerate(self.triggers):
+            if "message" not in trig:
+                continue
+            mode = trig.get("mode", MODE_SUBSTRING)
+            text = str(trig["message"])
+            if mode == MODE_REGEX:
+                try:
+                    self._regexes.append((idx, compile_trigger_regex(text)))
+                except re.error:
+                    continue  # invalid patterns are rejected by /addtrigger; ignore stale ones
+            elif text == "":
+                if mode != MODE_WORD and self._always is None:
+                    self._always = idx
+            else:
+                self._literals.append((idx, text.lower(), mode == MODE_WORD))
+        # pattern id -> (pattern length, [(trigger index, whole_word), ...]) in list order
+        self._patterns = []
+        ids = {}
+        for idx, low, word in self._literals:
+            pid = ids.get(low)
+            if pid is None:
+                pid = ids[low] = len(self._patterns)
+                self._patterns.append((len(low), []))
+            self._patterns[pid][1].append((idx, word))
+        self._automaton = None
+        if len(self._literals) >= AUTOMATON_MIN_PATTERNS:
+            self._automaton = _Automaton((low, pid) for low, pid in ids.items())
+
+    def __len__(self):
+        return len(self.triggers)
+
+    @staticmethod
+    def _whole_word(low: str, start: int, end: int) -> bool:
+        # end is exclusive
+        if start > 0 and _is_word_char(low[start - 1]):
+            return False
+        if end < len(low) and _is_word_char(low[end]):
+            return False
+        return True
+
+    def _best_literal(self, low: str, limit: int) -> int:
+        """Lowest trigger index below limit whose literal occurs in low, else limit"""
+        best = limit
+        if self._automaton is None:
+            for idx, pat, word in self._literals:
+                if idx >= best:
+                    break
+                if word:
+                    start = low.find(pat)
+                    while start != -1:
+                        if self._whole_word(low, start, start + len(pat)):
+                            return idx
+                        start = low.find(pat, start + 1)
+                elif pat in low:
+                    return idx
+            return best
+        for end, pids in self._automaton.scan(low):
+            for pid in pids:
+                length, owners = self._patterns[pid]
+                for idx, word in owners:
+                    if idx >= best:
+                        break
+                    if not word or self._whole_word(low, end - length + 1, end + 1):
+                        best = idx
+                        break
+        return best
+
+    def match(self, message_text: str):
+        """Return the first trigger dict matching message_text, or None"""
+        if not self.triggers:
+            return None
+        limit = len(self.triggers) if self._always is None else self._always
+        best = self._best_literal(message_text.lower(), limit) if self._literals else limit
+        for idx, rx in self._regexes:
+            if idx >= best:
+                break
+            if rx.search(message_text):
+                best = idx
+                break
+        if best < len(self.triggers):
+            return self.triggers[best]
+        return None